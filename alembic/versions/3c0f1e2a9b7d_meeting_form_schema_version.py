@@ -0,0 +1,23 @@
+"""Add form schema version to meeting
+
+Revision ID: 3c0f1e2a9b7d
+Revises: 8bdd8fe4f960
+Create Date: 2026-10-18 12:30:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3c0f1e2a9b7d'
+down_revision = '8bdd8fe4f960'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('meeting', sa.Column('form_schema_version', sa.Integer(),
+                                       nullable=False, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('meeting', 'form_schema_version')
@@ -0,0 +1,37 @@
+"""Add composite indexes for the participant filters
+
+Revision ID: 4f8d2b6a1c97
+Revises: 9a6c3e5f2b41
+Create Date: 2026-10-18 18:20:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4f8d2b6a1c97'
+down_revision = '9a6c3e5f2b41'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_index('ix_participant_meeting_type_category', 'participant',
+                    ['meeting_id', 'participant_type', 'category_id'],
+                    postgresql_where=sa.text('deleted = false'))
+    op.create_index('ix_participant_meeting_type_registration',
+                    'participant',
+                    ['meeting_id', 'participant_type', 'registration_date',
+                     'id'],
+                    postgresql_where=sa.text('deleted = false'))
+    op.create_index('ix_custom_field_value_custom_field_participant',
+                    'custom_field_value',
+                    ['custom_field_id', 'participant_id'])
+
+
+def downgrade():
+    op.drop_index('ix_custom_field_value_custom_field_participant',
+                  table_name='custom_field_value')
+    op.drop_index('ix_participant_meeting_type_registration',
+                  table_name='participant')
+    op.drop_index('ix_participant_meeting_type_category',
+                  table_name='participant')
@@ -0,0 +1,22 @@
+"""Add progress to job
+
+Revision ID: 5d2a7c4e1f03
+Revises: 3c0f1e2a9b7d
+Create Date: 2026-10-18 15:10:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5d2a7c4e1f03'
+down_revision = '3c0f1e2a9b7d'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('job', sa.Column('progress', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('job', 'progress')
@@ -0,0 +1,23 @@
+"""Add participants version to meeting
+
+Revision ID: 7e4b9a2c6d18
+Revises: 5d2a7c4e1f03
+Create Date: 2026-10-18 16:20:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7e4b9a2c6d18'
+down_revision = '5d2a7c4e1f03'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('meeting', sa.Column('participants_version', sa.Integer(),
+                                       nullable=False, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('meeting', 'participants_version')
@@ -0,0 +1,42 @@
+"""Add trigram search index to participant
+
+Revision ID: 9a6c3e5f2b41
+Revises: 7e4b9a2c6d18
+Create Date: 2026-10-18 17:05:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '9a6c3e5f2b41'
+down_revision = '7e4b9a2c6d18'
+
+from alembic import op
+
+
+# unaccent() is only stable, an immutable wrapper can be used in indexes
+F_UNACCENT = """
+CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS
+$$ SELECT public.unaccent('public.unaccent', $1) $$
+LANGUAGE sql IMMUTABLE STRICT
+"""
+
+# must match mrt.models.participant_search_text
+SEARCH_TEXT = ("lower(coalesce(first_name, '') || ' ' || "
+               "coalesce(last_name, '') || ' ' || "
+               "coalesce(representing, ''))")
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+    op.execute(F_UNACCENT)
+    op.execute("CREATE INDEX ix_participant_search ON participant "
+               "USING gin (f_unaccent(%s) gin_trgm_ops)" % SEARCH_TEXT)
+    op.execute("CREATE INDEX ix_translation_english_search ON translation "
+               "USING gin (f_unaccent(lower(english)) gin_trgm_ops)")
+
+
+def downgrade():
+    op.drop_index('ix_translation_english_search', table_name='translation')
+    op.drop_index('ix_participant_search', table_name='participant')
+    op.execute("DROP FUNCTION f_unaccent(text)")
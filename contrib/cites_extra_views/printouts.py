@@ -7,10 +7,17 @@ from mrt.forms.meetings import FlagForm, CategoryTagForm
 from mrt.forms.meetings import MediaCategoriesForm
 from mrt.forms.meetings import ParticipantCategoriesForm
 from mrt.meetings.mixins import PermissionRequiredMixin
-from mrt.models import CustomField
+from mrt.models import CustomField, ParticipantRecords
 from mrt.models import Participant, Category, CategoryTag, Meeting
 from mrt.pdf import PdfRenderer
-from sqlalchemy.orm import joinedload
+
+
+# The added fields printed by the verification lists.
+_CONTACT_FIELD_SLUGS = ('telephone', 'mobile', 'fax')
+
+
+def _get_events():
+    return g.meeting.custom_fields.filter_by(field_type=CustomField.EVENT)
 
 
 class ObserversList(PermissionRequiredMixin, MethodView):
@@ -22,30 +29,19 @@ class ObserversList(PermissionRequiredMixin, MethodView):
                            'view_participant')
 
     @staticmethod
-    def _get_query(flag, category_tags, categories):
-        query = (
-            Participant.query.current_meeting().participants()
-            .join(Participant.category, Category.title)
-            .options(joinedload(Participant.category)
-                     .joinedload(Category.title))
-            .order_by(Category.sort)
-            .order_by(Participant.last_name)
-        )
-
+    def _get_query(flag, category_tags, categories, events):
         if category_tags and not categories:
             categories = (
                 g.meeting.categories
                 .filter(Category.tags.any(CategoryTag.id.in_(category_tags)))
                 .with_entities('id'))
 
-        if categories:
-            query = query.filter(Participant.category_id.in_(categories))
-
-        if flag:
-            attr = getattr(Participant, flag)
-            query = query.filter(attr == True)
-
-        return query
+        return (
+            ParticipantRecords(g.meeting, flag=flag, category_ids=categories,
+                               field_slugs=[event.slug for event in events],
+                               order_by=[Category.sort, Participant.last_name])
+            .filter(Participant.category_id != None)
+        )
 
     def get(self):
         flag = request.args.get('flag')
@@ -53,10 +49,8 @@ class ObserversList(PermissionRequiredMixin, MethodView):
         categories = request.args.getlist('categories')
         page = request.args.get('page', 1, type=int)
 
-        events = g.meeting.custom_fields.filter_by(
-            field_type=CustomField.EVENT)
-
-        query = self._get_query(flag, category_tags, categories)
+        events = _get_events()
+        query = self._get_query(flag, category_tags, categories, events)
         count = query.count()
         pagination = query.paginate(page, per_page=50)
         participants = pagination.items
@@ -93,10 +87,10 @@ class ObserversList(PermissionRequiredMixin, MethodView):
 
 def _process_observers(meeting_id, title, flag, category_tags, categories):
     g.meeting = Meeting.query.get(meeting_id)
-    query = ObserversList._get_query(flag, category_tags, categories)
+    events = _get_events()
+    query = ObserversList._get_query(flag, category_tags, categories, events)
     participants = query.all()
-    count = query.count()
-    events = g.meeting.custom_fields.filter_by(field_type=CustomField.EVENT)
+    count = len(participants)
     context = {'participants': participants,
                'count': count,
                'events': events,
@@ -119,30 +113,20 @@ class PartiesList(PermissionRequiredMixin, MethodView):
                            'view_participant')
 
     @staticmethod
-    def _get_query(flag, category_tags, categories):
-        query = (
-            Participant.query.current_meeting().participants()
-            .join(Participant.category, Category.title)
-            .options(joinedload(Participant.category)
-                     .joinedload(Category.title))
-            .order_by(Participant.represented_country)
-            .order_by(Participant.last_name)
-        )
-
+    def _get_query(flag, category_tags, categories, events):
         if category_tags and not categories:
             categories = (
                 g.meeting.categories
                 .filter(Category.tags.any(CategoryTag.id.in_(category_tags)))
                 .with_entities('id'))
 
-        if categories:
-            query = query.filter(Participant.category_id.in_(categories))
-
-        if flag:
-            attr = getattr(Participant, flag)
-            query = query.filter(attr == True)
-
-        return query
+        return (
+            ParticipantRecords(g.meeting, flag=flag, category_ids=categories,
+                               field_slugs=[event.slug for event in events],
+                               order_by=[Participant.represented_country,
+                                         Participant.last_name])
+            .filter(Participant.category_id != None)
+        )
 
     def get(self):
         flag = request.args.get('flag')
@@ -150,10 +134,8 @@ class PartiesList(PermissionRequiredMixin, MethodView):
         categories = request.args.getlist('categories')
         page = request.args.get('page', 1, type=int)
 
-        events = g.meeting.custom_fields.filter_by(
-            field_type=CustomField.EVENT)
-
-        query = self._get_query(flag, category_tags, categories)
+        events = _get_events()
+        query = self._get_query(flag, category_tags, categories, events)
         count = query.count()
         pagination = query.paginate(page, per_page=50)
         participants = pagination.items
@@ -190,10 +172,10 @@ class PartiesList(PermissionRequiredMixin, MethodView):
 
 def _process_parties(meeting_id, title, flag, category_tags, categories):
     g.meeting = Meeting.query.get(meeting_id)
-    query = PartiesList._get_query(flag, category_tags, categories)
+    events = _get_events()
+    query = PartiesList._get_query(flag, category_tags, categories, events)
     participants = query.all()
-    count = query.count()
-    events = g.meeting.custom_fields.filter_by(field_type=CustomField.EVENT)
+    count = len(participants)
     context = {'participants': participants,
                'count': count,
                'events': events,
@@ -217,24 +199,16 @@ class VerificationList(PermissionRequiredMixin, MethodView):
 
     @staticmethod
     def _get_query(category_ids):
-
-        query = (
-            Participant.query.current_meeting().participants()
-            .filter_by(attended=True)
-            .join(Participant.category, Category.title)
-            .options(joinedload(Participant.category)
-                     .joinedload(Category.title))
-            .order_by(Category.sort)
-            .order_by(Category.id)
-            .order_by(Participant.representing)
-            .order_by(Participant.last_name)
+        return (
+            ParticipantRecords(g.meeting, category_ids=category_ids,
+                               field_slugs=_CONTACT_FIELD_SLUGS,
+                               order_by=[Category.sort, Category.id,
+                                         Participant.representing,
+                                         Participant.last_name])
+            .filter(Participant.attended == True,
+                    Participant.category_id != None)
         )
 
-        if category_ids:
-            query = query.filter(Participant.category_id.in_(category_ids))
-
-        return query
-
     def get(self):
         category_ids = request.args.getlist('categories')
         page = request.args.get('page', 1, type=int)
@@ -263,9 +237,8 @@ class VerificationList(PermissionRequiredMixin, MethodView):
 
 def _process_verification(meeting_id, title, category_ids, template_name=None):
     g.meeting = Meeting.query.get(meeting_id)
-    query = VerificationList._get_query(category_ids)
-    count = query.count()
-    participants = query
+    participants = VerificationList._get_query(category_ids).all()
+    count = len(participants)
     template_name = template_name or 'printouts/_verification_table_pdf.html'
     context = {'participants': participants,
                'count': count,
@@ -291,14 +264,11 @@ class Credentials(PermissionRequiredMixin, MethodView):
     @staticmethod
     def _get_query(flag, category_tags):
         query = (
-            Participant.query.current_meeting().participants()
-            .join(Participant.category, Category.title)
-            .options(joinedload(Participant.category)
-                     .joinedload(Category.title))
-            .order_by(Category.sort)
-            .order_by(Category.id)
-            .order_by(Participant.representing)
-            .order_by(Participant.last_name)
+            ParticipantRecords(g.meeting, flag=flag, field_slugs=(),
+                               order_by=[Category.sort, Category.id,
+                                         Participant.representing,
+                                         Participant.last_name])
+            .filter(Participant.category_id != None)
         )
 
         category_ids = []
@@ -307,11 +277,8 @@ class Credentials(PermissionRequiredMixin, MethodView):
                              tag.categories.filter_by(meeting_id=g.meeting.id)]
 
         if category_tags:
-            query = query.filter(Participant.category_id.in_(category_ids))
-
-        if flag:
-            attr = getattr(Participant, flag)
-            query = query.filter(attr == True)
+            query = query.filter(
+                Participant.category_id.in_(category_ids or [None]))
 
         return query
 
@@ -383,26 +350,14 @@ class MediaList(PermissionRequiredMixin, MethodView):
 
     @staticmethod
     def _get_query(flag, category_ids):
-
-        query = (
-            Participant.query.current_meeting().media_participants()
-            .join(Participant.category, Category.title)
-            .options(joinedload(Participant.category)
-                     .joinedload(Category.title))
-            .order_by(Category.sort)
-            .order_by(Category.id)
-            .order_by(Participant.last_name)
+        return (
+            ParticipantRecords(g.meeting, Participant.MEDIA, flag=flag,
+                               category_ids=category_ids, field_slugs=(),
+                               order_by=[Category.sort, Category.id,
+                                         Participant.last_name])
+            .filter(Participant.category_id != None)
         )
 
-        if category_ids:
-            query = query.filter(Participant.category_id.in_(category_ids))
-
-        if flag:
-            attr = getattr(Participant, flag)
-            query = query.filter(attr == True)
-
-        return query
-
     def get(self):
         flag_slug = request.args.get('flag')
         category_ids = request.args.getlist('categories')
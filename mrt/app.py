@@ -32,12 +32,13 @@ from mrt.forms.fields import custom_upload
 from mrt.mail import mail
 from mrt.meetings.urls import meetings
 from mrt.models import db, redis_store, User, CustomField, Participant
+from mrt.profiling import init_profiling
 
 
 from mrt.template import convert_to_dict, has_perm, url_external
 from mrt.template import region_in
 from mrt.custom_country import country_in
-from mrt.template import inject_badge_context
+from mrt.template import inject_badge_context, BadgeAssets
 from mrt.template import nl2br, active, date_processor, countries, crop
 from mrt.template import no_image_cache, activity_map, inject_static_file
 from mrt.template import pluralize, clean_html, year_processor
@@ -117,6 +118,7 @@ def create_app(config={}, skip_logging=False):
     app.add_template_global(year_processor)
     app.add_template_global(inject_static_file)
     app.add_template_global(inject_badge_context)
+    app.add_template_global(BadgeAssets, name='badge_assets')
     app.add_template_global(has_perm)
     app.add_template_global(url_external)
     app.add_template_global(Logo, name='get_logo')
@@ -165,6 +167,7 @@ def create_app(config={}, skip_logging=False):
     if not skip_logging:
         _configure_logging(app)
     _configure_healthcheck(app)
+    init_profiling(app)
 
     app.wsgi_app = ProxyFix(app.wsgi_app)
     if not app.config.get('DEBUG') and app.config.get('SENTRY_DSN'):
@@ -0,0 +1,221 @@
+import pickle
+
+from flask import current_app as app, g
+from redis import RedisError
+from sqlalchemy import event, inspect, or_
+from sqlalchemy.orm import joinedload, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from mrt.models import db, redis_store, Meeting, Phrase, Translation
+
+
+_VERSION_KEY = 'mrt:meeting:%s:version'
+_MEETING_KEY = 'mrt:meeting:%s:%s'
+_ACRONYM_KEY = 'mrt:meeting-acronym:%s'
+_PAGE_KEY = 'mrt:registration-page:%s:%s:%s:%s:%s:%s'
+
+# Registrations change the participants version of the meeting on every
+# commit; it is not read by the pages served from the cache.
+_UNCACHED_ATTRIBUTES = ('participants_version',)
+
+
+def _columns(obj):
+    return {attr.key: getattr(obj, attr.key)
+            for attr in inspect(obj).mapper.column_attrs}
+
+
+def _restore(model, values):
+    """Attach an instance of `model` with the column `values` to the
+    session without querying the database.
+    """
+    instance = model.__mapper__.class_manager.new_instance()
+    for key, value in values.items():
+        set_committed_value(instance, key, value)
+    make_transient_to_detached(instance)
+    return db.session.merge(instance, load=False)
+
+
+def _snapshot(meeting):
+    phrases = (Phrase.query.filter_by(meeting=meeting)
+               .options(joinedload(Phrase.description)).all())
+    translations = [meeting.title, meeting.badge_header, meeting.venue_city]
+    translations += [phrase.description for phrase in phrases]
+    return {
+        'meeting': _columns(meeting),
+        'translations': [_columns(translation) for translation in translations
+                         if translation is not None],
+        'phrases': [_columns(phrase) for phrase in phrases],
+    }, phrases
+
+
+def _set_phrases(meeting, phrases):
+    g.meeting_phrases = (meeting.id, {
+        (phrase.group, phrase.name): phrase for phrase in phrases})
+
+
+def _get_version(meeting_id):
+    cached = g.get('meeting_cache_version')
+    if cached is not None and cached[0] == meeting_id:
+        return cached[1]
+    version = int(redis_store.get(_VERSION_KEY % meeting_id) or 0)
+    g.meeting_cache_version = (meeting_id, version)
+    return version
+
+
+def _load_cached(meeting_id):
+    version = _get_version(meeting_id)
+    data = redis_store.get(_MEETING_KEY % (meeting_id, version))
+    return pickle.loads(data) if data is not None else None
+
+
+def _store(meeting):
+    ttl = app.config['MEETING_CACHE_TTL']
+    # Read the version first, a change committed while the snapshot is
+    # taken then only writes to an outdated version.
+    version = _get_version(meeting.id)
+    snapshot, phrases = _snapshot(meeting)
+    pipe = redis_store.pipeline()
+    pipe.set(_MEETING_KEY % (meeting.id, version),
+             pickle.dumps(snapshot, pickle.HIGHEST_PROTOCOL), ex=ttl)
+    pipe.set(_ACRONYM_KEY % meeting.acronym, meeting.id, ex=ttl)
+    pipe.execute()
+    return phrases
+
+
+def get_meeting_by_acronym(acronym):
+    """The meeting of a public page, with its phrases and their
+    translations.
+
+    With `MEETING_CACHE_TTL` set, they are read from redis and attached to
+    the session without a query; the cache of a meeting is versioned and
+    a new version is started whenever the meeting, its phrases or its
+    form schema change.
+    """
+    if not app.config.get('MEETING_CACHE_TTL'):
+        return Meeting.query.filter_by(acronym=acronym).first_or_404()
+
+    try:
+        meeting_id = redis_store.get(_ACRONYM_KEY % acronym)
+        snapshot = _load_cached(int(meeting_id)) if meeting_id else None
+    except RedisError:
+        snapshot = None
+    if snapshot is not None and snapshot['meeting']['acronym'] == acronym:
+        for values in snapshot['translations']:
+            _restore(Translation, values)
+        meeting = _restore(Meeting, snapshot['meeting'])
+        _set_phrases(meeting, [_restore(Phrase, values)
+                               for values in snapshot['phrases']])
+        return meeting
+
+    meeting = Meeting.query.filter_by(acronym=acronym).first_or_404()
+    try:
+        _set_phrases(meeting, _store(meeting))
+    except RedisError:
+        pass
+    return meeting
+
+
+def get_meeting_phrase(meeting, group, name):
+    """The phrase of `meeting`, from the cache when the meeting was loaded
+    by `get_meeting_by_acronym`.
+    """
+    cached = g.get('meeting_phrases')
+    if cached is not None and cached[0] == meeting.id:
+        return cached[1].get((group, name))
+    return Phrase.query.filter_by(meeting=meeting, group=group,
+                                  name=name).first()
+
+
+def _page_key(meeting, form_type, language):
+    return _PAGE_KEY % (meeting.id, _get_version(meeting.id),
+                        meeting.form_schema_version, form_type, language,
+                        app.config.get('APP_VERSION') or '')
+
+
+def get_registration_page(meeting, form_type, language):
+    """The registration page rendered for anonymous visitors, when
+    `REGISTRATION_PAGE_CACHE_TTL` is set.
+
+    Pages are keyed by the meeting cache version, so they are dropped
+    along with the cached meeting, and by the form schema version.
+    """
+    if not app.config.get('REGISTRATION_PAGE_CACHE_TTL'):
+        return None
+    try:
+        page = redis_store.get(_page_key(meeting, form_type, language))
+    except RedisError:
+        return None
+    return page.decode('utf-8') if page is not None else None
+
+
+def set_registration_page(meeting, form_type, language, page):
+    ttl = app.config.get('REGISTRATION_PAGE_CACHE_TTL')
+    if not ttl:
+        return
+    try:
+        redis_store.set(_page_key(meeting, form_type, language),
+                        page.encode('utf-8'), ex=ttl)
+    except RedisError:
+        pass
+
+
+def invalidate_meeting_cache(meeting_id):
+    if not (app.config.get('MEETING_CACHE_TTL') or
+            app.config.get('REGISTRATION_PAGE_CACHE_TTL')):
+        return
+    g.pop('meeting_cache_version', None)
+    try:
+        redis_store.incr(_VERSION_KEY % meeting_id)
+    except RedisError:
+        pass
+
+
+def _meeting_changed(meeting):
+    state = inspect(meeting)
+    return any(state.attrs[attr.key].history.has_changes()
+               for attr in state.mapper.column_attrs
+               if attr.key not in _UNCACHED_ATTRIBUTES)
+
+
+@event.listens_for(db.session, 'before_flush')
+def collect_changed_meetings(session, flush_context, instances):
+    """Remember the meetings whose cached data is changed by this flush.
+
+    Changes of categories, custom fields and rules bump the form schema
+    version of their meeting, so they are seen as changes of the meeting
+    itself. The translations of the meetings and of their phrases are
+    looked up by id.
+    """
+    meeting_ids = session.info.setdefault('changed_meeting_ids', set())
+    translation_ids = []
+    for obj in list(session.new) + list(session.deleted) + \
+            list(session.dirty):
+        if isinstance(obj, Meeting) and obj.id is not None and \
+                (obj in session.deleted or _meeting_changed(obj)):
+            meeting_ids.add(obj.id)
+        elif isinstance(obj, Phrase):
+            meeting_ids.add(obj.meeting_id or
+                            (obj.meeting and obj.meeting.id))
+        elif isinstance(obj, Translation) and obj.id is not None:
+            translation_ids.append(obj.id)
+    if translation_ids:
+        with session.no_autoflush:
+            meetings = session.query(Meeting.id).filter(or_(
+                Meeting.title_id.in_(translation_ids),
+                Meeting.badge_header_id.in_(translation_ids),
+                Meeting.venue_city_id.in_(translation_ids)))
+            phrases = session.query(Phrase.meeting_id).filter(
+                Phrase.description_id.in_(translation_ids))
+            meeting_ids.update(row[0] for row in meetings.union(phrases))
+    meeting_ids.discard(None)
+
+
+@event.listens_for(db.session, 'after_commit')
+def invalidate_changed_meetings(session):
+    for meeting_id in session.info.pop('changed_meeting_ids', ()):
+        invalidate_meeting_cache(meeting_id)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_changed_meetings(session):
+    session.info.pop('changed_meeting_ids', None)
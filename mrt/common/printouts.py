@@ -3,7 +3,7 @@ from flask import g, url_for, flash
 from flask_login import current_user
 from mrt.models import Job
 from mrt.models import redis_store, db
-from rq import Queue
+from rq import Queue, get_current_job
 
 
 _PRINTOUT_MARGIN = {
@@ -14,8 +14,8 @@ _PRINTOUT_MARGIN = {
 }
 
 
-def _add_to_printout_queue(method, job_name, *args):
-    q = Queue(Job.PRINTOUTS_QUEUE, connection=redis_store._redis_client,
+def _add_to_queue(queue, method, job_name, *args):
+    q = Queue(queue, connection=redis_store._redis_client,
               default_timeout=3600)
     job_redis = q.enqueue(method, g.meeting.id, *args, result_ttl=86400)
     job = Job(id=job_redis.id,
@@ -24,10 +24,30 @@ def _add_to_printout_queue(method, job_name, *args):
               status=job_redis.get_status(),
               date=job_redis.enqueued_at,
               meeting_id=g.meeting.id,
-              queue=Job.PRINTOUTS_QUEUE)
+              queue=queue)
     db.session.add(job)
     db.session.commit()
     url = url_for('meetings.processing_file_list')
     flash('Started processing %s. You can see the progress in the '
           '<a href="%s">processing file list section</a>.' %
           (job_name, url), 'success')
+    return job
+
+
+def _add_to_printout_queue(method, job_name, *args):
+    return _add_to_queue(Job.PRINTOUTS_QUEUE, method, job_name, *args)
+
+
+def _set_job_progress(progress):
+    """Store the percent complete of the current rq job in its Job row.
+
+    The update runs on its own connection, so the objects loaded by the
+    job in the session are not expired by a commit.
+    """
+    job_redis = get_current_job()
+    if job_redis is None:
+        return
+    with db.engine.begin() as conn:
+        conn.execute(Job.__table__.update()
+                     .where(Job.__table__.c.id == job_redis.id)
+                     .values(progress=progress))
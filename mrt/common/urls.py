@@ -23,9 +23,12 @@ def add_meeting_id(endpoint, values):
 
 
 def add_meeting_global(endpoint, values):
+    from mrt.cache import get_meeting_by_acronym
     from mrt.models import Meeting
 
     g.meeting = None
+    g.meeting_phrases = None
+    g.meeting_cache_version = None
     if app.url_map.is_endpoint_expecting(endpoint, "meeting_id"):
         meeting_id = values.pop("meeting_id", None)
         if meeting_id:
@@ -33,7 +36,7 @@ def add_meeting_global(endpoint, values):
     if app.url_map.is_endpoint_expecting(endpoint, "meeting_acronym"):
         acronym = values.pop("meeting_acronym", None)
         if acronym:
-            g.meeting = Meeting.query.filter_by(acronym=acronym).first_or_404()
+            g.meeting = get_meeting_by_acronym(acronym)
 
 
 class ProtectedStaticFiles(PermissionRequiredMixin, MethodView):
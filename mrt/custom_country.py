@@ -1,3 +1,4 @@
+import collections
 import operator
 
 import six
@@ -11,36 +12,59 @@ from sqlalchemy_utils.types.scalar_coercible import ScalarCoercible
 from wtforms_components import SelectField
 
 
+CountryCatalogue = collections.namedtuple(
+    'CountryCatalogue', 'names choices codes_by_name')
+
+
+def _build_country_catalogue(locale, custom_countries):
+    custom_countries = custom_countries or {}
+    names = {
+        code: name
+        for code, name in six.iteritems(locale.territories)
+        if len(code) == 2 and code not in ('QO', 'QU', 'ZZ')
+    }
+    for code, custom_names in six.iteritems(custom_countries):
+        names[code] = custom_names.get(locale.language) or names.get(code)
+    choices = tuple(sorted(six.iteritems(names),
+                           key=operator.itemgetter(1)))
+    codes_by_name = {name.lower(): code for code, name in choices}
+    return CountryCatalogue(names, choices, codes_by_name)
+
+
+def get_country_catalogue(locale=None):
+    """The countries of `locale`, a `Locale` or a locale identifier and the
+    current locale by default: a code to name dict, the (code, name) choices
+    sorted by name and a lowercase name to code dict.
+
+    Catalogues are built once per locale and kept until the
+    `CUSTOMIZED_COUNTRIES` setting is replaced.
+    """
+    locale = locale or i18n.get_locale()
+    custom_countries = app.config.get('CUSTOMIZED_COUNTRIES')
+    cache = app.extensions.get('country_catalogues')
+    if cache is None or cache['custom_countries'] is not custom_countries:
+        cache = app.extensions['country_catalogues'] = {
+            'custom_countries': custom_countries,
+            'locales': {},
+        }
+    key = str(locale)
+    catalogue = cache['locales'].get(key)
+    if catalogue is None:
+        if not isinstance(locale, Locale):
+            locale = Locale.parse(locale)
+        catalogue = _build_country_catalogue(locale, custom_countries)
+        cache['locales'][key] = catalogue
+    return catalogue
+
+
 def get_all_countries():
-    if app.config.get('CUSTOMIZED_COUNTRIES'):
-        custom_countries = app.config.get('CUSTOMIZED_COUNTRIES')
-        custom_codes = tuple(custom_countries.keys())
-    else:
-        custom_countries = dict()
-        custom_codes = ()
-    territories = [
-        (code, name)
-        for code, name in six.iteritems(i18n.get_locale().territories)
-        if len(code) == 2 and code not in ('QO', 'QU', 'ZZ') + custom_codes
-        ]
-    for custom_code in custom_countries.keys():
-        territories.append(
-            (
-                custom_code,
-                custom_countries[custom_code][i18n.get_locale().language]
-            )
-        )
-    return sorted(territories, key=operator.itemgetter(1))
+    return list(get_country_catalogue().choices)
 
 
 def country_in(country, lang_code='en'):
     if not country:
         return ''
-    if app.config.get('CUSTOMIZED_COUNTRIES'):
-        custom_countries = app.config.get('CUSTOMIZED_COUNTRIES')
-        if country.code in custom_countries.keys():
-            return custom_countries[country.code][lang_code]
-    return Locale(lang_code).territories.get(country.code)
+    return get_country_catalogue(lang_code).names.get(country.code)
 
 
 class Country(object):
@@ -52,10 +76,7 @@ class Country(object):
 
     @property
     def name(self):
-        for code, name in get_all_countries():
-            if code == self.code:
-                return name
-        return ''
+        return get_country_catalogue().names.get(self.code, '')
 
     def __eq__(self, other):
         if isinstance(other, Country):
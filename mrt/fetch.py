@@ -0,0 +1,130 @@
+import mimetypes
+import shutil
+import uuid
+from multiprocessing.pool import ThreadPool
+
+import requests
+from flask import current_app as app
+from path import Path
+from werkzeug.datastructures import FileStorage
+
+from mrt.utils import parse_rfc6266_header
+
+
+_CHUNK_SIZE = 64 * 1024
+
+
+class FetchError(Exception):
+    pass
+
+
+class FetchedFile(FileStorage):
+    """A downloaded file, kept in a temporary file on disk.
+
+    The temporary file is only opened when the file is saved, so many of
+    them can be held at once without keeping their content in memory or a
+    file descriptor open.
+    """
+
+    def __init__(self, path, filename, content_type, content_length=None):
+        super(FetchedFile, self).__init__(filename=filename,
+                                          content_type=content_type,
+                                          content_length=content_length)
+        self.path = path
+
+    def save(self, dst, buffer_size=16384):
+        if isinstance(dst, basestring):
+            shutil.copyfile(self.path, dst)
+            return
+        with open(self.path, 'rb') as f:
+            shutil.copyfileobj(f, dst, buffer_size)
+
+
+def _fetch_dir():
+    fetch_dir = Path(app.config['UPLOADED_CUSTOM_DEST']) / 'fetched'
+    fetch_dir.makedirs_p()
+    return fetch_dir
+
+
+class FileFetcher(object):
+    """Download files in parallel into temporary files.
+
+    At most `concurrency` downloads run at once and they share the
+    connections of one session. Files larger than `max_size` bytes are
+    rejected. Each url is downloaded once, however many times it is asked
+    for. The temporary files are removed by `cleanup`.
+    """
+
+    def __init__(self, concurrency=None, max_size=None, timeout=30):
+        self.concurrency = concurrency or app.config.get(
+            'IMPORT_FETCH_CONCURRENCY', 8)
+        self.max_size = max_size or app.config.get(
+            'MAX_UPLOAD_SIZE', 1024 * 1024)
+        self.timeout = timeout
+        self.fetch_dir = _fetch_dir()
+        self.files = {}
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self.concurrency, pool_maxsize=self.concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def fetch_all(self, urls):
+        """Download the `urls` and return a dict of the downloaded files,
+        or the `FetchError` of each url that could not be downloaded.
+        """
+        urls = [url for url in set(urls) if url not in self.files]
+        if urls:
+            pool = ThreadPool(min(self.concurrency, len(urls)))
+            try:
+                results = pool.map(self._fetch, urls)
+            finally:
+                pool.close()
+                pool.join()
+            self.files.update(zip(urls, results))
+        return self.files
+
+    def _fetch(self, url):
+        path = self.fetch_dir / str(uuid.uuid4())
+        try:
+            return self._download(url, path)
+        except (requests.RequestException, FetchError) as e:
+            path.unlink_p()
+            return FetchError('Could not fetch %s: %s' % (url, e))
+
+    def _download(self, url, path):
+        resp = self.session.get(url, stream=True, timeout=self.timeout)
+        try:
+            resp.raise_for_status()
+            content_length = resp.headers.get('content-length')
+            if content_length and int(content_length) > self.max_size:
+                raise FetchError('file is larger than %d bytes' %
+                                 self.max_size)
+            size = 0
+            with open(path, 'wb') as f:
+                for chunk in resp.iter_content(_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > self.max_size:
+                        raise FetchError('file is larger than %d bytes' %
+                                         self.max_size)
+                    f.write(chunk)
+        finally:
+            resp.close()
+
+        content_type = resp.headers.get('content-type',
+                                        'application/octet-stream')
+        filename = parse_rfc6266_header(
+            resp.headers.get('content-disposition', '')).get('filename')
+        if not filename:
+            # Attempt to guess the extension of the file
+            ext = mimetypes.guess_extension(content_type.split(';')[0])
+            if ext:
+                filename = str(uuid.uuid4()) + ext
+        return FetchedFile(path, filename, content_type, size)
+
+    def cleanup(self):
+        for fetched in self.files.values():
+            if isinstance(fetched, FetchedFile):
+                Path(fetched.path).unlink_p()
+        self.files = {}
+        self.session.close()
@@ -145,10 +145,13 @@ class CustomBaseFieldMixin(object):
         return self.data or ''
 
     @classmethod
-    def provide_data(cls, cf, participant):
-        cfv = (cf.custom_field_values
-               .filter_by(participant=participant)
-               .first())
+    def provide_data(cls, cf, participant, values=None):
+        if values is None:
+            cfv = (cf.custom_field_values
+                   .filter_by(participant=participant)
+                   .first())
+        else:
+            cfv = values[0] if values else None
         return cfv.value if cfv else None
 
     def save(self, cf, participant):
@@ -158,6 +161,14 @@ class CustomBaseFieldMixin(object):
             db.session.add(cfv)
         return cfv
 
+    def value_rows(self, cf, choice_ids=None):
+        """The custom_field_value rows of a new participant, without the
+        participant id, for bulk inserts. `choice_ids` maps the choices of
+        `cf` to their ids.
+        """
+        return [{'custom_field_id': cf.id, 'value': self.data,
+                 'choice_id': None}]
+
 
 class BooleanField(fields.BooleanField):
 
@@ -192,11 +203,12 @@ class CustomMultiCheckboxField(CustomBaseFieldMixin, MultiCheckboxField):
         return Markup('<br>'.join(self.data or []))
 
     @classmethod
-    def provide_data(cls, cf, participant):
-        cfv = (cf.custom_field_values
-               .filter_by(participant=participant))
-        items = [i.choice for i in cfv.all()]
-        return items
+    def provide_data(cls, cf, participant, values=None):
+        if values is None:
+            values = (cf.custom_field_values
+                      .filter_by(participant=participant)
+                      .all())
+        return [i.choice for i in values]
 
     def save(self, cf, participant):
         choices = (
@@ -213,6 +225,11 @@ class CustomMultiCheckboxField(CustomBaseFieldMixin, MultiCheckboxField):
             cfv.choice = choice
             db.session.add(cfv)
 
+    def value_rows(self, cf, choice_ids=None):
+        return [{'custom_field_id': cf.id, 'value': None,
+                 'choice_id': choice_ids[value]}
+                for value in self.data if value in choice_ids]
+
 
 class CategoryField(CustomBaseFieldMixin, fields.RadioField):
 
@@ -274,31 +291,50 @@ class _BaseFileFieldMixin(object):
         return ''
 
     @classmethod
-    def provide_data(cls, cf, participant):
-        cfv = (cf.custom_field_values
-               .filter_by(participant=participant)
-               .first())
+    def provide_data(cls, cf, participant, values=None):
+        if values is None:
+            cfv = (cf.custom_field_values
+                   .filter_by(participant=participant)
+                   .first())
+        else:
+            cfv = values[0] if values else None
         return cfv.value if cfv else None
 
-    def save(self, cf, participant, cfv=None):
-        if not self.data:
-            return
-        cfv = cfv or cf.get_or_create_value(participant)
-        current_filename = cfv.value
+    def _save_upload(self):
+        """Save the uploaded file under a new name and return it, or None
+        if the file could not be saved.
+        """
         try:
-            cfv.value = custom_upload.save(self.data, name=str(uuid4()) + '.')
+            return custom_upload.save(self.data, name=str(uuid4()) + '.')
         except Exception as e:
             if app.config.get('SENTRY_DSN'):
                 capture_exception(e)
             else:
-                import traceback
-                print(traceback.format_exc())
+                app.logger.exception('Unable to save the uploaded file')
+            return None
+
+    def save(self, cf, participant, cfv=None):
+        if not self.data:
+            return
+        cfv = cfv or cf.get_or_create_value(participant)
+        current_filename = cfv.value
+        filename = self._save_upload()
+        if filename is None:
             return cfv
+        cfv.value = filename
         unlink_participant_custom_file(current_filename)
         if not cfv.id:
             db.session.add(cfv)
         return cfv
 
+    def value_rows(self, cf, choice_ids=None):
+        if not self.data:
+            return []
+        value = self._save_upload()
+        if value is None:
+            return []
+        return [{'custom_field_id': cf.id, 'value': value, 'choice_id': None}]
+
 
 class RegistrationImageField(_BaseFileFieldMixin, _FileField):
 
@@ -363,6 +399,10 @@ class CustomCountryField(CustomBaseFieldMixin, CountryField):
             db.session.add(cfv)
         return cfv
 
+    def value_rows(self, cf, choice_ids=None):
+        return [{'custom_field_id': cf.id, 'value': self.data.code,
+                 'choice_id': None}]
+
     def render_data(self):
         # check if it is a country code
         if isinstance(self.data, unicode):
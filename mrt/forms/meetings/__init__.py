@@ -3,4 +3,6 @@ from .settings import *
 from .participant import *
 from .registration import *
 from .custom_fields import *
+from .rules import *
+from .display import *
 from .email import *
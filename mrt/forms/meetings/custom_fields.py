@@ -4,9 +4,11 @@ from flask_babel import lazy_gettext as __
 from flask_uploads import IMAGES
 from flask_wtf.file import FileAllowed
 
+from sqlalchemy.orm import joinedload
 from sqlalchemy_utils import Choice
 
 from werkzeug import OrderedMultiDict
+from werkzeug.utils import cached_property
 from wtforms.fields.simple import HiddenField
 from wtforms.validators import DataRequired, Length, Optional
 
@@ -18,9 +20,11 @@ from mrt.forms.fields import CustomDocumentField, CustomDateField
 from mrt.forms.fields import LanguageField, CustomRadioField
 from mrt.forms.fields import EmailField, EmailRequired
 from mrt.forms.fields import DOCUMENTS
+from mrt.forms.meetings.rules import get_rule_set
 
 from mrt.models import CustomField, CustomFieldChoice, Rule
-from mrt.models import Category, Participant
+from mrt.models import Category, Participant, Translation
+from mrt.models import get_custom_field_values
 
 from mrt.utils import CustomFieldLabel
 
@@ -45,10 +49,68 @@ _CUSTOM_FIELDS_MAP = {
 }
 
 
+def _load_custom_fields(form):
+    if not form._custom_field_ids:
+        return OrderedMultiDict()
+    fields = (CustomField.query
+              .filter(CustomField.id.in_(form._custom_field_ids))
+              .order_by(CustomField.sort))
+    return OrderedMultiDict([(c.slug, c) for c in fields])
+
+
+def _load_rules(form):
+    rule_type = (getattr(g, 'rule_type', None) or
+                 getattr(form, 'CUSTOM_FIELDS_TYPE', None) or Rule.PARTICIPANT)
+    return get_rule_set(g.meeting, rule_type).for_fields(
+        form._custom_field_ids)
+
+
+def _copy_translation(translation):
+    if translation is None:
+        return None
+    return Translation(english=translation.english,
+                       french=translation.french,
+                       spanish=translation.spanish)
+
+
+def _copy_category(category):
+    return Category(id=category.id, title=_copy_translation(category.title),
+                    color=category.color, group=category.group,
+                    sort=category.sort, category_type=category.category_type)
+
+
+def _freeze(values):
+    return tuple(values) if values else None
+
+
 def custom_form_factory(form, field_types=None, field_slugs=None,
                         excluded_field_types=None,
                         registration_fields=False):
+    """Return the form class of the current meeting's custom fields.
+
+    The classes are cached per application and are rebuilt only when the
+    form schema version of the meeting changes.
+    """
+    cache = app.extensions.setdefault('custom_form_classes', {})
+    key = (form, g.meeting.id, _freeze(field_types), _freeze(field_slugs),
+           _freeze(excluded_field_types), registration_fields,
+           getattr(g, 'language_verbose', 'english'))
+    version = g.meeting.form_schema_version
+    cached = cache.get(key)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    form_class = _build_custom_form(form, field_types, field_slugs,
+                                    excluded_field_types, registration_fields)
+    cache[key] = (version, form_class)
+    return form_class
+
+
+def _build_custom_form(form, field_types, field_slugs, excluded_field_types,
+                       registration_fields):
     fields = (CustomField.query.filter_by(meeting_id=g.meeting.id)
+              .options(joinedload(CustomField.label),
+                       joinedload(CustomField.hint))
               .order_by(CustomField.sort))
 
     if field_types:
@@ -67,15 +129,32 @@ def custom_form_factory(form, field_types=None, field_slugs=None,
     if getattr(form, 'CUSTOM_FIELDS_TYPE', None):
         fields = fields.filter_by(custom_field_type=form.CUSTOM_FIELDS_TYPE)
 
+    fields = fields.all()
+    choices = {}
+    choice_fields = [f.id for f in fields if f.field_type.code in (
+        CustomField.SELECT, CustomField.MULTI_CHECKBOX, CustomField.RADIO)]
+    if choice_fields:
+        query = (CustomFieldChoice.query
+                 .filter(CustomFieldChoice.custom_field_id.in_(choice_fields))
+                 .options(joinedload(CustomFieldChoice.value))
+                 .order_by(CustomFieldChoice.id))
+        for c in query:
+            choices.setdefault(c.custom_field_id, []).append(c)
+
+    # ORM instances are copied or referenced by id so that the cached class
+    # does not keep objects bound to the session of the current request
     form_attrs = {
-        '_custom_fields': OrderedMultiDict({c.slug: c for c in fields}),
+        '_custom_field_ids': [c.id for c in fields],
+        '_custom_fields': cached_property(_load_custom_fields,
+                                          '_custom_fields'),
+        'rules': cached_property(_load_rules, 'rules'),
     }
 
     for f in fields:
         attrs = {'label': unicode(CustomFieldLabel(f.label)),
                  'validators': [],
                  'render_kw': {},
-                 'description': f.hint}
+                 'description': _copy_translation(f.hint)}
 
         data = _CUSTOM_FIELDS_MAP[f.field_type.code]
 
@@ -95,9 +174,8 @@ def custom_form_factory(form, field_types=None, field_slugs=None,
             attrs['validators'].append(Length(max=f.max_length))
 
         if f.field_type.code == CustomField.SELECT:
-            query = CustomFieldChoice.query.filter_by(custom_field=f)
             attrs['choices'] = [(unicode(c.value), __(c.value.english))
-                                for c in query]
+                                for c in choices.get(f.id, [])]
             if not f.required:
                 attrs['choices'] = [('', '---')] + attrs['choices']
             if f.slug == 'title':
@@ -114,16 +192,17 @@ def custom_form_factory(form, field_types=None, field_slugs=None,
             attrs['coerce'] = unicode
 
         if f.field_type.code == CustomField.CATEGORY:
-            query = Category.get_categories_for_meeting(
+            query = (Category.get_categories_for_meeting(
                 form.CUSTOM_FIELDS_TYPE)
+                .options(joinedload(Category.title)))
             if registration_fields:
                 query = query.filter_by(visible_on_registration_form=True)
-            attrs['choices'] = [(c.id, c) for c in query]
+            attrs['choices'] = [(c.id, _copy_category(c)) for c in query]
             attrs['coerce'] = int
 
         if f.field_type.code in (CustomField.MULTI_CHECKBOX, CustomField.RADIO):
-            query = CustomFieldChoice.query.filter_by(custom_field=f)
-            attrs['choices'] = [(unicode(c.value), c.value) for c in query]
+            attrs['choices'] = [(unicode(c.value), _copy_translation(c.value))
+                                for c in choices.get(f.id, [])]
             attrs['coerce'] = unicode
 
         if f.field_type.code == CustomField.IMAGE and f.photo_size and f.photo_size.code:
@@ -137,11 +216,17 @@ def custom_form_factory(form, field_types=None, field_slugs=None,
         setattr(field, 'field_type', f.field_type.code)
         form_attrs[f.slug] = field
 
-    form_attrs['rules'] = Rule.get_rules_for_fields(fields)
     return type(form)(form.__name__, (form,), form_attrs)
 
 
-def custom_object_factory(participant, field_type=None, obj=object):
+def custom_object_factory(participant, field_type=None, obj=object,
+                          values=None):
+    """Build an object holding the custom field values of the participant.
+
+    `values` can be provided as returned by `get_custom_field_values`, when
+    the values of several participants were already loaded in bulk.
+    Otherwise the values of the participant are loaded in a single query.
+    """
     object_attrs = {}
 
     if participant:
@@ -161,6 +246,10 @@ def custom_object_factory(participant, field_type=None, obj=object):
         if field_type:
             query = query.filter(CustomField.field_type.in_(field_type))
 
+        if values is None:
+            values = get_custom_field_values(
+                [participant.id] if participant.id else [])
+
         for cf in query:
             if cf.is_primary:
                 value = getattr(participant, cf.slug, None)
@@ -170,8 +259,6 @@ def custom_object_factory(participant, field_type=None, obj=object):
             else:
                 data = _CUSTOM_FIELDS_MAP[cf.field_type.code]
                 field = data['field']
-                # TODO: instead of triggering a single query for each value
-                #  of each field, we can easily provide all the data in a single
-                #  query.
-                object_attrs[cf.slug] = field.provide_data(cf, participant)
+                object_attrs[cf.slug] = field.provide_data(
+                    cf, participant, values.get((participant.id, cf.id), []))
     return type(obj)(obj.__name__, (obj,), object_attrs)
@@ -0,0 +1,62 @@
+from collections import namedtuple
+
+from flask import current_app as app, url_for
+from jinja2 import Markup
+from sqlalchemy.orm import joinedload
+from sqlalchemy_utils import Choice
+
+from mrt.custom_country import Country
+from mrt.models import CustomField, Participant
+from mrt.utils import CustomFieldLabel
+
+
+RenderedField = namedtuple('RenderedField', ['id', 'label', 'value'])
+
+
+class ParticipantRenderer(object):
+    """Render the display values of participant records the way the fields
+    of the participant form render their data, without building a form for
+    each participant.
+    """
+
+    def __init__(self, meeting, participant_type=Participant.PARTICIPANT):
+        fields = (
+            CustomField.query
+            .filter_by(meeting_id=meeting.id,
+                       custom_field_type=participant_type)
+            .options(joinedload(CustomField.label))
+            .order_by(CustomField.sort))
+        self.field_types = {}
+        self.labels = {}
+        for cf in fields:
+            self.field_types[cf.slug] = cf.field_type.code
+            self.labels[cf.slug] = unicode(CustomFieldLabel(cf.label))
+
+    def render(self, record, slug):
+        field_type = self.field_types.get(slug)
+        if field_type == CustomField.CATEGORY:
+            return record.category or ''
+
+        value = getattr(record, slug, None)
+        if not value:
+            return ''
+        if isinstance(value, Choice):
+            return unicode(value)
+        if field_type == CustomField.MULTI_CHECKBOX:
+            return Markup('<br>'.join(value))
+        if field_type == CustomField.COUNTRY:
+            return value.name if isinstance(value, Country) else \
+                Country(value).name
+        if field_type == CustomField.EMAIL:
+            return Markup('<a href="mailto:%s">%s</a>' % (value, value))
+        if field_type in (CustomField.IMAGE, CustomField.DOCUMENT):
+            filename = app.config['PATH_CUSTOM_KEY'] + '/' + value
+            url = url_for('files', filename=filename)
+            return Markup('<a href="%s">%s</a>' % (url, value))
+        return value
+
+    def fields(self, record, slugs):
+        """The rendered fields of the record, in the order of the slugs."""
+        return [RenderedField(slug, self.labels[slug],
+                              self.render(record, slug))
+                for slug in slugs if slug in self.labels]
@@ -38,6 +38,7 @@ class MeetingEditForm(BaseForm):
 
     class Meta:
         model = Meeting
+        exclude = ('form_schema_version', 'participants_version')
         field_args = {
             'venue_address': {
                 'widget': widgets.TextArea()
@@ -4,15 +4,14 @@ from collections import OrderedDict
 from flask import g
 from flask import current_app as app
 
-from sqlalchemy import and_
 from wtforms import fields, compat
 from wtforms.meta import DefaultMeta
 from wtforms.validators import DataRequired, ValidationError
 
-from mrt.custom_country import Country
 from mrt.definitions import PRINTOUT_TYPES
 from mrt.forms.base import BaseForm
-from mrt.models import db, Participant, Action, Condition
+from mrt.forms.meetings.rules import get_rule_set, normalize_rule_value
+from mrt.models import db, Participant, Rule
 from mrt.models import CustomField
 from mrt.models import CategoryTag, Category
 from mrt.utils import crop_file
@@ -22,29 +21,15 @@ from mrt.utils import unlink_uploaded_file
 
 class _RulesMixin(object):
 
-    def _normalize_data(self, data):
-        if isinstance(data, Country):
-            return data.code
-        if isinstance(data, bool):
-            return 'true' if data else 'false'
-        return unicode(data)
-
-    def _validate_conditions(self, rule):
-        for condition in rule.conditions.all():
-            values = [unicode(i.value) for i in condition.values.all()]
-            field = self._fields.get(condition.field.slug)
-            if field and self._normalize_data(field.data) not in values:
-                return False
-        return True
-
     def _validate_actions(self, rule):
         success = True
-        for action in rule.actions.all():
-            field = self._fields.get(action.field.slug)
+        for action in rule.actions:
+            field = self._fields.get(action.slug)
             if not field:
                 return success
             if action.is_required:
-                field.validators.insert(0, DataRequired())
+                # the validators list is shared with the form class
+                field.validators = [DataRequired()] + list(field.validators)
                 success = field.validate(self, [DataRequired()]) and success
 
             if action.disable_form:
@@ -58,11 +43,12 @@ class _RulesMixin(object):
 
     def validate(self, **kwargs):
         success = super(_RulesMixin, self).validate(**kwargs)
-        if not success:
+        if not success or not self.rules:
             return success
+        data = dict((name, normalize_rule_value(field.data))
+                    for name, field in self._fields.items())
         for rule in self.rules:
-            conditions_validated = self._validate_conditions(rule)
-            if conditions_validated and not self._validate_actions(rule):
+            if rule.matches(data) and not self._validate_actions(rule):
                 return False
         return success
 
@@ -70,27 +56,18 @@ class _RulesMixin(object):
 class _RulesMeta(DefaultMeta):
 
     def render_field(self, field, render_kw):
-        actions = Action.query.filter(
-            and_(
-                Action.field.has(slug=field.name),
-                Action.rule.has(meeting=g.meeting),
-                Action.rule.has(rule_type=g.rule_type)
-            ))
+        rule_type = getattr(g, 'rule_type', Rule.PARTICIPANT)
+        actions = get_rule_set(g.meeting, rule_type).actions.get(
+            field.name, [])
 
         context = {}
-        if any([a.is_visible for a in actions]):
+        if any([a.is_visible for a, rule in actions]):
             context['data-visible'] = 'true'
-        if any([a.disable_form for a in actions]):
+        if any([a.disable_form for a, rule in actions]):
             context['data-disable-form'] = 'true'
 
-        rules = []
-        for action in actions:
-            conditions = Condition.query.filter_by(rule=action.rule).all()
-            if conditions:
-                data = {}
-                for c in conditions:
-                    data[c.field.slug] = [i.value for i in c.values.all()]
-                rules.append(data)
+        rules = [dict((c.slug, list(c.values)) for c in rule.conditions)
+                 for a, rule in actions if rule.conditions]
         if rules:
             context['data-rules'] = json.dumps(rules)
             render_kw.update(context)
@@ -154,6 +131,7 @@ class BaseParticipantForm(BaseForm):
             crop_file(field_value, 'custom', (x1, y1, x2, y2))
 
     def save(self, participant=None, commit=True):
+        custom_fields = self._custom_fields
         participant = participant or Participant()
         participant.meeting_id = g.meeting.id
 
@@ -166,14 +144,14 @@ class BaseParticipantForm(BaseForm):
             if field_name.endswith('_'):
                 continue
 
-            cf = self._custom_fields[field.name]
+            cf = custom_fields[field.name]
             if cf.is_primary:
                 setattr(participant, field_name, field.data)
             elif field.data is not None:
                 saveable_added_custom_fields.append(field)
 
         for field in saveable_added_custom_fields:
-            cf = self._custom_fields[field.name]
+            cf = custom_fields[field.name]
 
             field_value = field.save(cf, participant)
             if field.type == "RegistrationImageField" and field_value and field.render_kw.get("data-photoSize"):
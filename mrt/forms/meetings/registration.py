@@ -48,8 +48,11 @@ class RegistrationForm(_RulesMixin, BaseParticipantForm):
     def __init__(self, *args, **kwargs):
         super(RegistrationForm, self).__init__(*args, **kwargs)
         if not self.ts_.data:
-            ts = int(time.time())
-            self.ts_.process_data(b64encode(str(ts)))
+            self.ts_.process_data(self.get_ts())
+
+    @staticmethod
+    def get_ts():
+        return b64encode(str(int(time.time())))
 
     def validate_ts_(self, field):
         # skip validation on debug
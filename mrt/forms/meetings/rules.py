@@ -0,0 +1,115 @@
+from collections import namedtuple, OrderedDict
+
+from flask import current_app as app
+
+from mrt.custom_country import Country
+from mrt.models import db, Action, Condition, ConditionValue, CustomField
+from mrt.models import Rule
+
+
+RuleCondition = namedtuple('RuleCondition', ['slug', 'values', 'accepted'])
+RuleAction = namedtuple('RuleAction', ['slug', 'is_visible', 'is_required',
+                                       'disable_form'])
+
+
+def normalize_rule_value(data):
+    """Convert field data to the representation used by condition values."""
+    if isinstance(data, Country):
+        return data.code
+    if isinstance(data, bool):
+        return 'true' if data else 'false'
+    return unicode(data)
+
+
+class CompiledRule(object):
+
+    def __init__(self, rule_id):
+        self.id = rule_id
+        self.field_ids = set()
+        self.conditions = []
+        self.actions = []
+
+    def matches(self, data):
+        """Check the conditions against a dict of field slugs to normalized
+        values. Conditions on fields missing from `data` are ignored.
+        """
+        for condition in self.conditions:
+            if (condition.slug in data and
+                    data[condition.slug] not in condition.accepted):
+                return False
+        return True
+
+
+class RuleSet(object):
+    """The rules of a meeting compiled to plain Python objects, so forms can
+    be rendered and validated without querying the rule graph again.
+    """
+
+    def __init__(self, meeting_id, rule_type):
+        self.rules = OrderedDict()
+        self.actions = {}
+
+        actions = (
+            db.session.query(Action.rule_id, Action.field_id,
+                             CustomField.slug, Action.is_visible,
+                             Action.is_required, Action.disable_form)
+            .join(Rule, Action.rule_id == Rule.id)
+            .join(CustomField, Action.field_id == CustomField.id)
+            .filter(Rule.meeting_id == meeting_id,
+                    Rule.rule_type == rule_type)
+            .order_by(Action.rule_id, Action.id))
+        for row in actions:
+            rule = self.rules.get(row.rule_id)
+            if rule is None:
+                rule = self.rules[row.rule_id] = CompiledRule(row.rule_id)
+            action = RuleAction(row.slug, bool(row.is_visible),
+                                bool(row.is_required), bool(row.disable_form))
+            rule.field_ids.add(row.field_id)
+            rule.actions.append(action)
+            self.actions.setdefault(row.slug, []).append((action, rule))
+
+        if not self.rules:
+            return
+
+        conditions = OrderedDict()
+        query = (
+            db.session.query(Condition.id, Condition.rule_id,
+                             Condition.field_id, CustomField.slug,
+                             ConditionValue.value)
+            .join(CustomField, Condition.field_id == CustomField.id)
+            .outerjoin(ConditionValue,
+                       ConditionValue.condition_id == Condition.id)
+            .filter(Condition.rule_id.in_(self.rules.keys()))
+            .order_by(Condition.id, ConditionValue.id))
+        for row in query:
+            key = (row.rule_id, row.field_id, row.slug)
+            values = conditions.setdefault(key, [])
+            if row.value is not None:
+                values.append(row.value)
+
+        for (rule_id, field_id, slug), values in conditions.items():
+            rule = self.rules[rule_id]
+            rule.field_ids.add(field_id)
+            rule.conditions.append(RuleCondition(
+                slug, tuple(values), frozenset(unicode(v) for v in values)))
+
+    def for_fields(self, field_ids):
+        """The rules having conditions that involve any of the fields."""
+        field_ids = set(field_ids)
+        return [rule for rule in self.rules.values()
+                if rule.conditions and rule.field_ids & field_ids]
+
+
+def get_rule_set(meeting, rule_type):
+    """Return the compiled rules of the meeting, cached until the form
+    schema version of the meeting changes.
+    """
+    cache = app.extensions.setdefault('rule_sets', {})
+    key = (meeting.id, rule_type)
+    version = meeting.form_schema_version
+    cached = cache.get(key)
+    if cached and cached[0] == version:
+        return cached[1]
+    rule_set = RuleSet(meeting.id, rule_type)
+    cache[key] = (version, rule_set)
+    return rule_set
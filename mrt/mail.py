@@ -1,10 +1,14 @@
+import time
+
 from flask import current_app as app, request, flash, g, url_for
 from flask_mail import Mail, Message
 
 from datetime import datetime
 from blinker import ANY
 
-from mrt.models import db, Participant, MailLog, Phrase
+from mrt.cache import get_meeting_phrase
+from mrt.common.printouts import _add_to_queue, _set_job_progress
+from mrt.models import db, Job, Meeting, Participant, MailLog, Phrase
 from mrt.models import UserNotification
 from mrt.signals import notification_signal, registration_signal
 from mrt.utils import set_language
@@ -71,20 +75,89 @@ def send_activation_mail(email, token):
 
 
 def send_bulk_message(recipients, subject, message):
-    sent = 0
+    """Queue the message for the `recipients` on the mail queue and return
+    the number of recipients it will be sent to.
+    """
     s = get_meeting_sender()
     if not s:
         flash('No email for sender.', 'error')
-        return sent
+        return 0
 
+    participant_ids = []
     for participant in recipients:
-        email = participant.email
-        if not email:
+        if not participant.email:
             flash('No email for {0}'.format(participant), 'error')
             continue
-        send_single_message(email, subject=subject, message=message, sender=s)
-        sent += 1
-    return sent
+        participant_ids.append(participant.id)
+    if participant_ids:
+        _add_to_queue(Job.MAIL_QUEUE, _process_bulk_message, 'bulk email',
+                      participant_ids, subject, message)
+    return len(participant_ids)
+
+
+class _Throttle(object):
+    """Wait between calls so they are not made more than `rate` times per
+    second. A `rate` of zero does not wait at all.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.last = None
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.time()
+        if self.last is not None and now - self.last < self.interval:
+            time.sleep(self.interval - (now - self.last))
+        self.last = time.time()
+
+
+def _process_bulk_message(meeting_id, participant_ids, subject, message):
+    """Send the message in batches of `MAIL_BATCH_SIZE` participants.
+
+    Each batch loads its recipients with one query, sends them over a
+    single SMTP connection and logs them with one insert. `MAIL_RATE_LIMIT`
+    caps the number of messages sent per second.
+    """
+    g.meeting = Meeting.query.get(meeting_id)
+    sender = get_meeting_sender()
+    batch_size = app.config.get('MAIL_BATCH_SIZE', 100)
+    throttle = _Throttle(app.config.get('MAIL_RATE_LIMIT', 0))
+    sent = 0
+
+    for start in range(0, len(participant_ids), batch_size):
+        batch = participant_ids[start:start + batch_size]
+        recipients = (
+            db.session.query(Participant.id, Participant.email)
+            .filter(Participant.id.in_(batch))
+            .filter(Participant.email != None)
+            .order_by(Participant.id))
+        logs = []
+        try:
+            with mail.connect() as connection:
+                for participant_id, email in recipients:
+                    throttle.wait()
+                    connection.send(Message(subject=subject, body=message,
+                                            sender=sender,
+                                            recipients=[email]))
+                    logs.append({'meeting_id': meeting_id,
+                                 'to_id': participant_id,
+                                 'to_email': email,
+                                 'subject': subject,
+                                 'message': message,
+                                 'date_sent': datetime.now()})
+        finally:
+            # Log the messages already sent even if the connection failed.
+            if logs:
+                db.session.execute(MailLog.__table__.insert(), logs)
+                db.session.commit()
+        sent += len(logs)
+        _set_job_progress(
+            100 * min(start + batch_size, len(participant_ids)) //
+            len(participant_ids))
+
+    return 'Sent %d message%s' % (sent, '' if sent == 1 else 's')
 
 
 @notification_signal.connect_via(ANY)
@@ -140,10 +213,9 @@ def send_registration_message(sender, participant):
         flash('No email for sender.', 'error')
         return
     subject = "%s registration confirmation" % (participant.meeting.acronym,)
-    phrase = Phrase.query.filter_by(
-        meeting=participant.meeting,
-        group=Phrase.EMAIL_CONFIRMATION,
-        name=Phrase.FOR_PARTICIPANTS).first()
+    phrase = get_meeting_phrase(participant.meeting,
+                                Phrase.EMAIL_CONFIRMATION,
+                                Phrase.FOR_PARTICIPANTS)
 
     if participant.language:
         set_language(participant.lang)
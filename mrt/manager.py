@@ -12,16 +12,19 @@ from sqlalchemy import or_
 import requests
 from flask import g
 from alembic.config import CommandLine
-from rq import Queue, Connection, Worker
+from rq import Queue, Connection
 from rq import get_failed_queue
 
 from mrt.models import CustomFieldValue, redis_store, db
 from mrt.models import User, Staff, Job
 from mrt.models import CustomField, Translation, Participant, Meeting, MeetingType
-from mrt.pdf import _clean_printouts
+from mrt.models import ParticipantRecords
+from mrt.pdf import PdfRenderer, benchmark_pdf_engines, _clean_printouts
+from mrt.profiling import ProfilingWorker
 from mrt.scripts.informea import get_meetings
 from mrt.utils import slugify, unlink_participant_custom_file, validate_email
 from collections import defaultdict
+from itertools import cycle
 from mrt.forms.meetings.meeting import _add_choice_values_for_custom_field
 
 logger = logging.getLogger("mrt")
@@ -129,7 +132,7 @@ def workers(ctx, queues):
     app = ctx.obj['app']
     with Connection(redis_store._redis_client), app.test_request_context():
         qs = map(Queue, queues) or [Queue()]
-        worker = Worker(qs)
+        worker = ProfilingWorker(qs, app=app)
         g.is_rq_process = True
 
         sentry = app.extensions.get('sentry')
@@ -173,6 +176,37 @@ def cleanup(ctx, hook):
                        (cleanup_count, hook))
 
 
+@cli.command(name='benchmark_pdf')
+@click.option('--meeting', 'meeting_id', type=int, required=True,
+              help='Meeting whose participants are used for the badges')
+@click.option('--count', type=int, default=500, help='Number of badges')
+@click.option('--concurrency', type=int, help='Number of wkhtmltopdf processes')
+@click.pass_context
+def benchmark_pdf(ctx, meeting_id, count, concurrency):
+    """Compare the one-shot and batch pdf engines on single badges."""
+    app = ctx.obj['app']
+    with app.test_request_context():
+        g.meeting = Meeting.query.get(meeting_id)
+        records = ParticipantRecords(g.meeting, field_slugs=()).page(1, count)
+        if not records:
+            click.echo('The meeting has no participants')
+            return
+        records = cycle(records)
+
+        def make_renderer():
+            context = {'participants': [next(records)],
+                       'printout_size': 'default'}
+            return PdfRenderer('meetings/printouts/badges_pdf.html',
+                               width='3.4in', height='2.15in',
+                               orientation='portrait', footer=False,
+                               context=context)
+
+        timings = benchmark_pdf_engines(make_renderer, count, concurrency)
+        for name, seconds in sorted(timings.items()):
+            click.echo('%s: %.2fs for %d badges (%.1fms per badge)' %
+                       (name, seconds, count, seconds * 1000 / count))
+
+
 @cli.command()
 @click.pass_context
 def meetings(ctx):
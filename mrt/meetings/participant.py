@@ -10,6 +10,7 @@ from flask_login import current_user as user
 from flask.views import MethodView
 from flask_thumbnails import Thumbnail
 
+from sqlalchemy import func
 from sqlalchemy.sql.functions import coalesce
 from sqlalchemy.sql.expression import asc, desc
 
@@ -25,7 +26,8 @@ from mrt.mixins import FilterView
 
 from mrt.mail import send_single_message
 from mrt.models import db, Participant, CustomField, Category, Phrase, Rule
-from mrt.models import search_for_participant
+from mrt.models import search_for_participant, get_custom_field_values
+from mrt.models import get_participants_total
 
 from mrt.definitions import (
     BADGE_W, BADGE_H, BADGE_A6_W, BADGE_A6_H, LABEL_W, LABEL_H, ENVEL_W
@@ -113,41 +115,108 @@ class ParticipantsFilter(PermissionRequiredMixin, MethodView, FilterView):
         if participant.registration_date:
             return participant.registration_date.strftime('%-d %b %Y')
 
+    @staticmethod
+    def _seek(key, descending):
+        """The participants from `key` on in the (registration date, id)
+        order; missing registration dates sort last, as in PostgreSQL.
+        """
+        registration_date, participant_id = key
+        if descending:
+            if registration_date is None:
+                return ((Participant.registration_date != None) |
+                        ((Participant.registration_date == None) &
+                         (Participant.id <= participant_id)))
+            return ((Participant.registration_date < registration_date) |
+                    ((Participant.registration_date == registration_date) &
+                     (Participant.id <= participant_id)))
+        if registration_date is None:
+            return ((Participant.registration_date == None) &
+                    (Participant.id >= participant_id))
+        return ((Participant.registration_date > registration_date) |
+                ((Participant.registration_date == registration_date) &
+                 (Participant.id >= participant_id)) |
+                (Participant.registration_date == None))
+
+    def _get_page(self, participants, total, start, limit, descending):
+        """The page of the participants numbered by registration date.
+
+        Only the key of the first participant of the page is read past the
+        previous pages, from the registration index; the page itself is
+        selected with a seek on (registration date, id).
+        """
+        direction = desc if descending else asc
+        participants = participants.order_by(
+            direction(Participant.registration_date),
+            direction(Participant.id))
+        key = (participants
+               .with_entities(Participant.registration_date, Participant.id)
+               .offset(start)
+               .first())
+        if key is None:
+            return []
+        participants = participants.filter(self._seek(key, descending))
+        if limit >= 0:
+            participants = participants.limit(limit)
+
+        rows = []
+        for i, participant in enumerate(participants):
+            participant.order = total - start - i if descending \
+                else start + i + 1
+            rows.append(participant)
+        return rows
+
     def get_queryset(self, **opt):
         participants = Participant.query.current_meeting().participants()
+        total = get_participants_total(g.meeting, Participant.PARTICIPANT)
+        start, limit = int(opt['start']), int(opt['limit'])
+        orders = [(item['column'], item['dir']) for item in opt['order']]
+
+        if not opt['search'] and len(orders) == 1 and orders[0][0] == 'order':
+            rows = self._get_page(participants, total, start, limit,
+                                  orders[0][1] == 'desc')
+            return rows, total, total
+
+        # the order column numbers the participants by registration date
+        ordering = participants.with_entities(
+            Participant.id.label('id'),
+            func.row_number().over(order_by=(Participant.registration_date,
+                                             Participant.id))
+            .label('order')).subquery()
 
-        ordering = {
-            key[0]: order
-            for key, order in zip(
-                participants.order_by(asc('registration_date')).values(Participant.id),
-                range(1, participants.count() + 1))
-        }
-
-        total = participants.count()
-        for item in opt['order']:
-            # Special case for column order - sorting by order is identical to sorting
-            #  by registration_date
-            direction = {'asc': asc, 'desc': desc}.get(item['dir'])
-            if item['column'] == 'order':
-                participants = participants.order_by(direction('registration_date'))
-            # Special case for registration_date -> NULL values are turned into
-            # datetime.min
-            elif item['column'] == 'registration_date':
+        if opt['search']:
+            participants = search_for_participant(opt['search'], participants)
+            filtered_total = participants.count()
+        else:
+            filtered_total = total
+
+        participants = (participants
+                        .join(ordering, ordering.c.id == Participant.id)
+                        .add_columns(ordering.c.order))
+
+        for column, direction in orders:
+            direction = {'asc': asc, 'desc': desc}.get(direction)
+            if column == 'order':
+                participants = participants.order_by(
+                    direction(ordering.c.order))
+            # Special case for registration_date -> NULL values are
+            # turned into datetime.min
+            elif column == 'registration_date':
                 participants = participants.order_by(direction(coalesce(
                     Participant.registration_date, datetime.min)))
             else:
-                participants = participants.order_by(direction(item['column']))
-
-        if opt['search']:
-            participants = search_for_participant(opt['search'], participants)
-
-        filtered_total = participants.count()
-        participants = list(participants.limit(opt['limit']).offset(opt['start']))
+                participants = participants.order_by(
+                    direction(getattr(Participant, column, column)))
 
-        for i in range(len(participants)):
-            participants[i].order = ordering[participants[i].id]
+        if start:
+            participants = participants.offset(start)
+        if limit >= 0:
+            participants = participants.limit(limit)
 
-        return participants, total, filtered_total
+        rows = []
+        for participant, order in participants:
+            participant.order = order
+            rows.append(participant)
+        return rows, total, filtered_total
 
 
 class MediaParticipantsFilter(PermissionRequiredMixin, MethodView, FilterView):
@@ -205,7 +274,8 @@ class ParticipantSearch(PermissionRequiredMixin, MethodView):
                            'manage_participant')
 
     def get(self):
-        participants = search_for_participant(request.args['search'])
+        participants = search_for_participant(request.args['search'],
+                                              ranked=True)
         results = []
         for p in participants:
             if p.photo:
@@ -233,11 +303,13 @@ class BaseParticipantSearch(PermissionRequiredMixin, MethodView):
 
     def get(self):
         queryset = self.get_queryset()
-        participants = search_for_participant(request.args['search'], queryset)
+        participants = search_for_participant(
+            request.args['search'], queryset, ranked=True).all()
+        values = get_custom_field_values([p.id for p in participants])
         results = []
         Form = custom_form_factory(self.form_class)
         for p in participants:
-            Object = custom_object_factory(p)
+            Object = custom_object_factory(p, values=values)
             form = Form(obj=Object())
             info = self.serialize_participant(form)
             info['value'] = p.name
@@ -538,7 +610,8 @@ class ParticipantBadge(PermissionRequiredMixin, MethodView):
             height=BADGE_A6_H if template_name == 'default_a6' else BADGE_H,
             footer=False,
             orientation='portrait',
-            context=context
+            context=context,
+            cache=True
         ).as_response()
 
 
@@ -557,7 +630,7 @@ class ParticipantLabel(PermissionRequiredMixin, MethodView):
         return PdfRenderer('meetings/participant/label.html',
                            width=LABEL_W, height=LABEL_H,
                            orientation="landscape", footer=False,
-                           context=context).as_response()
+                           context=context, cache=True).as_response()
 
 
 class ParticipantEnvelope(PermissionRequiredMixin, MethodView):
@@ -579,7 +652,7 @@ class ParticipantEnvelope(PermissionRequiredMixin, MethodView):
         return PdfRenderer('meetings/participant/envelope.html',
                            width=ENVEL_W, height=ENVEL_H,
                            orientation="portrait", footer=False,
-                           context=context).as_response()
+                           context=context, cache=True).as_response()
 
 
 class ParticipantAcknowledgeEmail(PermissionRequiredMixin, MethodView):
@@ -658,4 +731,4 @@ class ParticipantAcknowledgePDF(PermissionRequiredMixin, MethodView):
         return PdfRenderer('meetings/printouts/acknowledge_detail.html',
                            width=ACK_W, height=ACK_H,
                            orientation='portrait', footer=False,
-                           context=context).as_response()
+                           context=context, cache=True).as_response()
@@ -1,9 +1,7 @@
 from __future__ import division
 
-import io
 import logging
 import math
-import mimetypes
 import time
 import uuid
 
@@ -13,13 +11,11 @@ import zipfile
 import collections
 from dateutil.parser import parse
 from datetime import datetime
-from itertools import groupby
+from itertools import groupby, islice
 from operator import attrgetter
 
-import requests
 from flask import flash
 from path import Path
-from werkzeug.datastructures import FileStorage
 from werkzeug.datastructures import ImmutableMultiDict
 
 from flask import current_app as app
@@ -28,31 +24,36 @@ from flask import request, render_template, jsonify, abort, redirect, Response
 from flask import send_from_directory
 from flask_login import login_required, current_user
 from flask.views import MethodView
+from flask_sqlalchemy import Pagination
 
 from rq import Connection
 from rq.job import Job as JobRedis
 from rq.job import NoSuchJobError
-from sqlalchemy import desc
+from sqlalchemy import case, desc, func
 from sqlalchemy.orm import joinedload
 
-from mrt.custom_country import Country, get_all_countries
+from mrt.custom_country import get_all_countries
+from mrt.custom_country import get_country_catalogue
+from mrt.fetch import FetchError, FileFetcher
 from mrt.forms.meetings import BadgeCategories, EventsForm
 from mrt.forms.meetings import FlagForm, CategoryTagForm
 from mrt.forms.meetings import ParticipantEditForm
 from mrt.forms.meetings import custom_form_factory
 from mrt.forms.meetings import custom_object_factory
+from mrt.forms.meetings import ParticipantRenderer
 from mrt.models import Participant, Category, CategoryTag, Meeting, Job
 from mrt.models import redis_store, db, CustomFieldValue, CustomField, CustomFieldChoice
-from mrt.models import get_participants_full
+from mrt.models import ParticipantRecords
 from mrt.models import Action
-from mrt.pdf import PdfRenderer
+from mrt.pdf import PdfRenderer, get_pdf_engine, merge_pdfs
 from mrt.template import pluralize, url_external
 from mrt.meetings.mixins import PermissionRequiredMixin
-from mrt.common.printouts import _add_to_printout_queue
+from mrt.common.printouts import _add_to_printout_queue, _set_job_progress
 from mrt.common.printouts import _PRINTOUT_MARGIN
 
-from mrt.utils import parse_rfc6266_header, get_xlsx_header
+from mrt.utils import get_xlsx_header
 from mrt.utils import read_sheet, generate_export_excel, generate_import_excel
+from mrt.utils import ImportFile
 from openpyxl.utils.exceptions import InvalidFileException
 from mrt.forms.meetings import ParticipantEditForm, MediaParticipantEditForm
 from mrt.forms.meetings import custom_form_factory
@@ -90,14 +91,9 @@ class Badges(PermissionRequiredMixin, MethodView):
         category_ids = request.args.getlist('categories')
         page = request.args.get('page', 1, type=int)
         flag = request.args.get('flag')
-        participants = Participant.query.current_meeting().participants()
-        if category_ids:
-            participants = participants.filter(
-                Participant.category.has(Category.id.in_(category_ids))
-            )
-        if flag:
-            attr = getattr(Participant, flag)
-            participants = participants.filter(attr == True)
+        participants = ParticipantRecords(g.meeting, flag=flag,
+                                          category_ids=category_ids,
+                                          field_slugs=())
         badge_categories_form = BadgeCategories(request.args)
         participants = participants.paginate(page, per_page=50)
         return render_template('meetings/printouts/badges.html',
@@ -117,20 +113,33 @@ class Badges(PermissionRequiredMixin, MethodView):
 
 
 def _process_badges(meeting_id, flag, size, category_ids):
+    """Render the badges in chunks of `BADGES_CHUNK_SIZE` participants,
+    `PDF_CONCURRENCY` chunks at a time, and concatenate them in order.
+    """
     g.meeting = Meeting.query.get(meeting_id)
-    participants = Participant.query.current_meeting().participants()
-    if category_ids:
-        participants = participants.filter(
-            Participant.category.has(Category.id.in_(category_ids))
-        )
-    if flag:
-        attr = getattr(Participant, flag)
-        participants = participants.filter(attr == True)
-    context = {'participants': participants, 'printout_size': size}
+    participants = ParticipantRecords(g.meeting, flag=flag,
+                                      category_ids=category_ids,
+                                      field_slugs=()).all()
+    chunk_size = app.config.get('BADGES_CHUNK_SIZE', 100)
+    chunks = [participants[i:i + chunk_size]
+              for i in range(0, len(participants), chunk_size)] or [[]]
     w, h = ('8.3in', '11.7in') if size == 'A4' else ('3.4in', '2.15in')
-    return PdfRenderer('meetings/printouts/badges_pdf.html',
-                       width=w, height=h, orientation='portrait',
-                       footer=False, context=context).as_rq()
+    renderers = [
+        PdfRenderer('meetings/printouts/badges_pdf.html',
+                    width=w, height=h, orientation='portrait',
+                    footer=False,
+                    context={'participants': chunk, 'printout_size': size})
+        for chunk in chunks]
+
+    def _on_chunk_done(count):
+        _set_job_progress(count * 100 // len(renderers))
+
+    pdf_paths = PdfRenderer.generate_many(
+        renderers, get_pdf_engine('oneshot'), on_done=_on_chunk_done)
+    pdf_path = merge_pdfs(pdf_paths, (app.config['UPLOADED_PRINTOUTS_DEST'] /
+                                      (str(uuid.uuid4()) + '.pdf')))
+    return url_for('meetings.printouts_download',
+                   filename=str(pdf_path.name))
 
 
 class JobStatus(MethodView):
@@ -154,7 +163,8 @@ class JobStatus(MethodView):
                 result = {'status': job_redis.get_status(),
                           'result': job_redis.result}
             else:
-                result = {'status': job_redis.get_status()}
+                result = {'status': job_redis.get_status(),
+                          'progress': job.progress}
 
             job.status = job_redis.get_status()
             job.result = job_redis.result
@@ -193,21 +203,13 @@ class ShortList(PermissionRequiredMixin, MethodView):
 
     @staticmethod
     def _get_query(flag):
-        query = (
-            Participant.query.current_meeting().participants()
-            .join(Participant.category, Category.title)
-            .options(joinedload(Participant.category)
-                     .joinedload(Category.title))
-            .order_by(Category.sort, Category.id,
-                      Participant.last_name, Participant.id)
+        return (
+            ParticipantRecords(g.meeting, flag=flag, field_slugs=(),
+                               order_by=[Category.sort, Category.id,
+                                         Participant.last_name])
+            .filter(Participant.category_id != None)
         )
 
-        if flag:
-            attr = getattr(Participant, flag)
-            query = query.filter(attr == True)
-
-        return query
-
     def get(self):
         flag = request.args.get('flag')
         page = request.args.get('page', 1, type=int)
@@ -289,14 +291,20 @@ class ProvisionalList(PermissionRequiredMixin, MethodView):
 
     @classmethod
     def get_participants(cls, flag=None, categories_ids=None, selected_field_ids=None, page=1, page_size=PAGE_SIZE):
-        participants, total = cls._get_participants(
+        records = cls._get_participants(
             flag=flag,
             categories_ids=categories_ids,
-            page=page,
-            page_size=page_size
+            selected_field_ids=selected_field_ids,
         )
-        cls.set_participant_values(participants, selected_field_ids=selected_field_ids)
-        grouped_participants = cls.group_participants(participants)
+        total = records.count()
+        if page and page_size:
+            page, page_size = int(page), int(page_size)
+            assert page >= 1, "Page needs to be larger than 1"
+            assert page_size >= 0, "Page size need to be larger than 0"
+            participants = records.page(page, page_size)
+        else:
+            participants = records
+        grouped_participants = cls.group_participants(participants, selected_field_ids)
         return grouped_participants, total
 
     def get(self):
@@ -341,101 +349,9 @@ class ProvisionalList(PermissionRequiredMixin, MethodView):
             )
 
     @staticmethod
-    def _get_participants(flag=None, categories_ids=None, page=1, page_size=PAGE_SIZE):
-        categories = {c.id: c for c in g.meeting.categories.options(joinedload(Category.title)).all()}
-        query = """
-        SELECT participant.*,
-               CASE
-                   WHEN category."group" = 'region' THEN COALESCE(participant.represented_region, '---')
-                   WHEN category."group" = 'country' THEN COALESCE(participant.represented_country, '---')
-                   WHEN category."group" = 'organization' THEN COALESCE(participant.represented_organization, '---')
-                   ELSE '---'
-                   END        AS group_value,
-               CASE
-                   WHEN category.sort_field = 'first_name' THEN participant.first_name
-                   WHEN category.sort_field = 'last_name' THEN participant.last_name
-                   WHEN category.sort_field = 'badge_name' THEN participant.badge_name
-                   ELSE '---'
-                   END        AS sort_value
-        FROM participant
-                 JOIN category on participant.category_id = category.id
-        WHERE participant.meeting_id = %s
-            AND participant.deleted = false
-            AND participant.participant_type = %s
-        """
-
-        args = (g.meeting.id, Participant.PARTICIPANT)
-        if flag and flag in ("attended", "verified", "credentials"):
-            query += " AND participant.%s = true" % flag
-
-        if categories_ids:
-            query += " AND category.id IN (%s)" % (
-                ",".join("%s" for ignored in range(len(categories_ids)))
-            )
-            args += tuple(categories_ids)
-
-        query += " ORDER BY category.sort, category.id, group_value, sort_value"
-
-        paginated_query = query
-        paginated_args = tuple(args)
-        if page and page_size:
-            paginated_query += " LIMIT %s OFFSET %s"
-            page, page_size = int(page), int(page_size)
-            assert page >= 1, "Page needs to be larger than 1"
-            assert page_size >= 0, "Page size need to be larger than 0"
-            paginated_args += (page_size, (page - 1) * page_size)
-
-        participants = []
-        with db.engine.connect() as conn:
-            total = list(conn.execute("SELECT COUNT(*) AS total FROM (%s) AS anon" % query, args))[0].total
-            for row in conn.execute(paginated_query, paginated_args):
-                values = dict(row)
-                del values["group_value"]
-                del values["sort_value"]
-                participant = Participant(**values)
-                participant.meeting = g.meeting
-                participant.group_value = row.group_value
-                participant.sort_value = row.sort_value
-                participant.category = categories[participant.category_id]
-                participants.append(participant)
-
-        return participants, total
-
-    @classmethod
-    def set_participant_values(cls, participants, selected_field_ids=None, flag=None, categories_ids=None):
-        """Loads all the value for these participants in a single query,
-        to prevent numerous round trips to the db.
-
-        Set the values directly to the participants
-        """
-        participants = {p.id: p for p in participants}
-
-        # XXX Doing this in the ORM takes way too much memory!
-        query = """
-        SELECT custom_field_value.participant_id                              AS participant_id,
-               COALESCE(choice_translation.english, custom_field_value.value) AS value,
-               custom_field.slug                                              AS slug,
-               custom_field.field_type                                        AS field_type
-        FROM custom_field_value
-                 JOIN custom_field ON custom_field_value.custom_field_id = custom_field.id
-                 JOIN participant ON custom_field_value.participant_id = participant.id
-                 LEFT OUTER JOIN custom_field_choice ON custom_field_value.choice_id = custom_field_choice.id
-                 LEFT OUTER JOIN translation choice_translation ON custom_field_choice.value_id = choice_translation.id
-        WHERE participant.meeting_id = %s
-            AND participant.deleted = false
-            AND participant.participant_type = %s
-        """
-        args = (g.meeting.id, Participant.PARTICIPANT)
-
-        if flag and flag in ("attended", "verified", "credentials"):
-            query += " AND participant.%s = true" % flag
-
-        if categories_ids:
-            query += " AND category.id IN (%s)" % (
-                ",".join("%s" for ignored in range(len(categories_ids)))
-            )
-            args += tuple(categories_ids)
-
+    def _get_participants(flag=None, categories_ids=None, selected_field_ids=None):
+        if flag not in ("attended", "verified", "credentials"):
+            flag = None
         if selected_field_ids:
             # Force include the group and sort fields, even if they are not set to
             # be displayed.
@@ -444,52 +360,49 @@ class ProvisionalList(PermissionRequiredMixin, MethodView):
                     .union(Category.GROUP_FIELD.values())
                     .union(code for code, label in Category.CATEGORY_SORTING)
             )
-
-            query += " AND custom_field.slug IN (%s)" % (
-                ",".join("%s" for ignored in range(len(selected_field_ids)))
-            )
-            args += tuple(selected_field_ids)
-
-        with db.engine.connect() as conn:
-            for value in conn.execute(query, args):
-                try:
-                    participant = participants[value.participant_id]
-                except KeyError:
-                    continue
-
-                if value.field_type == CustomField.MULTI_CHECKBOX:
-                    try:
-                        getattr(participant, value.slug).append(value.value)
-                    except AttributeError:
-                        setattr(participant, value.slug, [value.value])
-                else:
-                    setattr(participant, value.slug, value.value or None)
+        group_value = case(
+            [(Category.group == Category.REGION,
+              func.coalesce(Participant.represented_region, '---')),
+             (Category.group == Category.COUNTRY,
+              func.coalesce(Participant.represented_country, '---')),
+             (Category.group == Category.ORGANIZATION,
+              func.coalesce(Participant.represented_organization, '---'))],
+            else_='---')
+        sort_value = case(
+            [(Category.sort_field == Category.FIRST_NAME, Participant.first_name),
+             (Category.sort_field == Category.LAST_NAME, Participant.last_name),
+             (Category.sort_field == Category.BADGE_NAME, Participant.badge_name)],
+            else_='---')
+        return (
+            ParticipantRecords(
+                g.meeting, flag=flag, category_ids=categories_ids,
+                field_slugs=selected_field_ids,
+                order_by=[Category.sort, Category.id, group_value, sort_value])
+            .filter(Participant.category_id != None)
+        )
 
     @classmethod
-    def group_participants(cls, participants):
+    def group_participants(cls, participants, selected_field_ids=None):
         start = time.time()
-        participant_form = custom_form_factory(ParticipantEditForm)
+        renderer = ParticipantRenderer(g.meeting)
+        selected_field_ids = selected_field_ids or cls._get_default_field_ids()
 
-        logger.info("Set participant values, time elapsed: %s", time.time() - start)
         # Group the participants on two levels:
         #  - the category
         #  - the specified group field of each category.
         grouped_participants = collections.OrderedDict()
 
         for participant in participants:
-            # XXX DO NOT use the custom_object_factory here, as that will trigger
-            #  and individual query for each value for each field for each participant
-            #  scaling extremely poorly!
-            obj = participant_form(obj=participant)
-
-            category = participant.category, obj.category_id.render_data() or "---"
-            group_key = Category.GROUP_FIELD[participant.category.group.code]
-            try:
+            category = (participant.category,
+                        renderer.render(participant, "category_id") or "---")
+            group = participant.category.group
+            group_key = Category.GROUP_FIELD.get(group.code) if group else None
+            if group_key in renderer.labels:
                 group_value = (
-                    getattr(obj, group_key).label.text,
-                    getattr(obj, group_key).render_data() or "---"
+                    renderer.labels[group_key],
+                    renderer.render(participant, group_key) or "---"
                 )
-            except AttributeError:
+            else:
                 group_value = ("", "---")
 
             if category not in grouped_participants:
@@ -498,16 +411,13 @@ class ProvisionalList(PermissionRequiredMixin, MethodView):
             if group_value not in grouped_participants[category]:
                 grouped_participants[category][group_value] = []
 
-            try:
-                # Include the sort field to ensure the sorting order is respected.
-                grouped_participants[category][group_value].append(
-                    (
-                        getattr(obj, participant.category.sort_field.code).render_data() or "---",
-                        obj
-                    )
+            # Include the sort field to ensure the sorting order is respected.
+            grouped_participants[category][group_value].append(
+                (
+                    renderer.render(participant, participant.category.sort_field.code) or "---",
+                    renderer.fields(participant, selected_field_ids)
                 )
-            except AttributeError:
-                grouped_participants[category][group_value].append(("---", obj))
+            )
 
         logger.info("Grouped participants, time elapsed: %s", time.time() - start)
         return grouped_participants
@@ -535,21 +445,13 @@ class DelegationsList(PermissionRequiredMixin, MethodView):
 
     @staticmethod
     def _get_query(flag):
-        query = (
-            Participant.query.current_meeting().participants()
-            .join(Participant.category, Category.title)
-            .options(joinedload(Participant.category)
-                     .joinedload(Category.title))
-            .order_by(Category.sort, Category.id,
-                      Participant.last_name, Participant.id)
+        return (
+            ParticipantRecords(g.meeting, flag=flag, field_slugs=(),
+                               order_by=[Category.sort, Category.id,
+                                         Participant.last_name])
+            .filter(Participant.category_id != None)
         )
 
-        if flag:
-            attr = getattr(Participant, flag)
-            query = query.filter(attr == True)
-
-        return query
-
     def get(self):
         flag = request.args.get('flag')
         query = self._get_query(flag)
@@ -628,20 +530,12 @@ class BaseDistribution(PermissionRequiredMixin, MethodView):
 
     @staticmethod
     def _get_query(flag):
-        query = (
-            Participant.query.current_meeting().participants()
-            .join(Participant.category, Category.title)
-            .options(joinedload(Participant.category)
-                     .joinedload(Category.title))
-            .order_by(Participant.language, Category.sort)
+        return (
+            ParticipantRecords(g.meeting, flag=flag, field_slugs=(),
+                               order_by=[Participant.language, Category.sort])
+            .filter(Participant.category_id != None)
         )
 
-        if flag:
-            attr = getattr(Participant, flag)
-            query = query.filter(attr == True)
-
-        return query
-
     def get(self):
         flag = request.args.get('flag')
         query = self._get_query(flag)
@@ -698,28 +592,17 @@ class Admission(PermissionRequiredMixin, MethodView):
 
     @staticmethod
     def _get_query(flag, category_tags):
-        query = (
-            Participant.query.current_meeting().participants()
-            .join(Participant.category, Category.title)
-            .options(joinedload(Participant.category)
-                     .joinedload(Category.title))
-            .order_by(Category.sort)
-            .order_by(Category.id)
-        )
-
         category_ids = []
         for tag in category_tags:
             category_ids += [category.id for category in
                              tag.categories.filter_by(meeting_id=g.meeting.id)]
 
-        if category_ids:
-            query = query.filter(Participant.category_id.in_(category_ids))
-
-        if flag:
-            attr = getattr(Participant, flag)
-            query = query.filter(attr == True)
-
-        return query
+        return (
+            ParticipantRecords(g.meeting, flag=flag, category_ids=category_ids,
+                               field_slugs=(),
+                               order_by=[Category.sort, Category.id])
+            .filter(Participant.category_id != None)
+        )
 
     def get(self):
         flag = request.args.get('flag')
@@ -996,90 +879,112 @@ class DataImport(PermissionRequiredMixin, MethodView):
     permission_required = ('manage_meeting', 'view_participant',
                            'manage_participant')
 
-    def get(self):
-        context = {
-            "participant_type": self.participant_type,
-        }
-        return render_template('meetings/participant/import/list.html', **context)
-
-    def post(self):
-        if request.files.get("import_file"):
-            try:
-                xlsx = openpyxl.load_workbook(request.files["import_file"], read_only=True)
-            except (zipfile.BadZipfile, InvalidFileException) as e:
-                flash("Invalid XLSX file: %s" % e, 'danger')
-                context = {
-                    "participant_type": self.participant_type,
-                }
-                return render_template('meetings/participant/import/list.html', **context)
-
-            request.files["import_file"].seek(0)
-            file_name = str(uuid.uuid4()) + '.xlsx'
-            # Save the file so we only upload it once.
-            request.files["import_file"].save(app.config['UPLOADED_PRINTOUTS_DEST'] / file_name)
+    PAGE_SIZE = 50
 
-        else:
-            file_name = request.form["file_name"]
-            try:
-                xlsx = openpyxl.load_workbook(app.config['UPLOADED_PRINTOUTS_DEST'] / file_name, read_only=True)
-            except (zipfile.BadZipfile, InvalidFileException) as e:
-                flash("Invalid XLSX file: %s" % e, 'danger')
-                context = {
-                    "participant_type": self.participant_type,
-                }
-                return render_template('meetings/participant/import/list.html', **context)
+    def _render(self, **context):
+        context["participant_type"] = self.participant_type
+        return render_template('meetings/participant/import/list.html', **context)
 
+    def _get_custom_fields(self):
         custom_fields = (
             g.meeting.custom_fields
                 .filter_by(custom_field_type=self.participant_type)
                 .order_by(CustomField.sort))
-        custom_fields = [field for field in custom_fields if field.field_type.code != CustomField.EVENT]
+        return [field for field in custom_fields if field.field_type.code != CustomField.EVENT]
+
+    def _get_import_file(self, file_name):
+        try:
+            import_file = ImportFile(file_name)
+        except ValueError:
+            abort(404)
+        if not import_file.exists() or not import_file.belongs_to(
+                g.meeting.id, self.participant_type):
+            abort(404)
+        return import_file
+
+    def _render_preview(self, import_file, page=1, **context):
+        summary = import_file.summary
+        rows = import_file.page(page, self.PAGE_SIZE)
+        if not rows and page != 1:
+            abort(404)
+        all_fields = list(custom_form_factory(self.form_class)().exclude([
+            CustomField.EVENT,
+        ]))
+        return self._render(
+            rows=rows,
+            pagination=Pagination(None, page, self.PAGE_SIZE, summary["rows"], rows),
+            rows_count=summary["rows"],
+            has_errors=bool(summary["invalid"]),
+            all_fields=all_fields,
+            file_name=import_file.name,
+            **context)
+
+    def get(self):
+        file_name = request.args.get("file_name")
+        if not file_name:
+            return self._render()
+        page = request.args.get("page", 1, type=int)
+        return self._render_preview(self._get_import_file(file_name), page)
+
+    def post(self):
+        if request.files.get("import_file"):
+            return self._upload(request.files["import_file"])
+
+        import_file = self._get_import_file(request.form["file_name"])
+        if import_file.summary["invalid"] or request.form.get("action") != "import":
+            return self._render_preview(import_file)
 
-        has_errors = False
+        _add_to_printout_queue(_process_import_participants_excel, self.JOB_NAME,
+                               import_file.name, self.participant_type, self.form_class)
+        return self._render_preview(import_file, import_started=True)
 
+    def _upload(self, upload):
         try:
-            rows = list(read_sheet(xlsx, custom_fields))
-            assert rows, "file has no data"
-        except (AssertionError, ValueError) as e:
+            xlsx = openpyxl.load_workbook(upload, read_only=True)
+        except (zipfile.BadZipfile, InvalidFileException) as e:
             flash("Invalid XLSX file: %s" % e, 'danger')
-            context = {
-                "participant_type": self.participant_type,
-            }
-            return render_template('meetings/participant/import/list.html', **context)
+            return self._render()
 
-        forms = []
-        for form in read_participants_excel(custom_fields, rows, self.form_class):
-            has_errors = not form.validate() or has_errors
-            forms.append(form)
+        upload.seek(0)
+        import_file = ImportFile(str(uuid.uuid4()))
+        # Save the file so we only upload it once.
+        upload.save(import_file.xlsx_path)
 
-        all_fields = list(custom_form_factory(self.form_class)().exclude([
-            CustomField.EVENT,
-        ]))
-        context = {
-            "forms": forms,
-            "has_errors": has_errors,
-            "all_fields": all_fields,
-            "file_name": file_name,
-            "participant_type": self.participant_type,
-        }
+        custom_fields = self._get_custom_fields()
+        columns = [field.slug for field in custom_fields]
+        try:
+            # The rows are parsed and validated once, while they are read
+            import_file.write(columns, _validate_import_rows(
+                custom_fields, read_sheet(xlsx, custom_fields), self.form_class, columns),
+                g.meeting.id, self.participant_type)
+            assert import_file.summary["rows"], "file has no data"
+        except (AssertionError, ValueError) as e:
+            import_file.unlink()
+            flash("Invalid XLSX file: %s" % e, 'danger')
+            return self._render()
 
-        if has_errors:
+        if import_file.summary["invalid"]:
             flash(
                 'XLSX file has errors, please review and correct them and try again. '
                 'Hover over cells to find more about the errors.',
                 'danger'
             )
-        elif request.form["action"] == "import":
-            _add_to_printout_queue(_process_import_participants_excel, self.JOB_NAME,
-                                   rows, self.participant_type, self.form_class)
-            context["import_started"] = True
         else:
             flash(
                 'XLSX file is valid, please review and hit "Start import" after.',
                 'success',
             )
+        return self._render_preview(import_file)
 
-        return render_template('meetings/participant/import/list.html', **context)
+
+def _validate_import_rows(custom_fields, rows, form_class, columns):
+    """Yield the Excel row number, the values and the errors of each row."""
+    for form in read_participants_excel(custom_fields, rows, form_class):
+        form.validate()
+        values = [getattr(form[slug], "excel_value", "") for slug in columns]
+        errors = dict((slug, [unicode(message) for message in messages])
+                      for slug, messages in form.errors.items())
+        yield form.excel_row, values, errors
 
 
 class ParticipantsImport(DataImport):
@@ -1097,25 +1002,15 @@ class MediaParticipantsImport(DataImport):
 
 
 
-def _process_export_participants_excel(meeting_id, participant_type):
-    g.meeting = Meeting.query.get(meeting_id)
-    participants = get_participants_full(g.meeting.id, participant_type)
-
-    custom_fields = (
-        g.meeting.custom_fields
-        .filter_by(custom_field_type=participant_type)
-        .order_by(CustomField.sort))
-
-    columns = [cf.slug for cf in custom_fields]
-    columns.append('registration_date')
-    header = get_xlsx_header(custom_fields)
-    header['Date of Registration'] = None
-
-    added_custom_fields = custom_fields.filter_by(is_primary=False)
-
-    rows = []
+def _iter_export_rows(participant_type, custom_fields, columns):
+    """Yield the export rows of the meeting participants."""
+    added_custom_fields = [cf for cf in custom_fields if not cf.is_primary]
+    records = ParticipantRecords(
+        g.meeting, participant_type,
+        field_slugs=[cf.slug for cf in added_custom_fields],
+        order_by=[Participant.id.desc()])
 
-    for p in participants:
+    for p in records:
         data = {}
         data['title'] = p.title.value
         data['first_name'] = p.first_name
@@ -1125,7 +1020,7 @@ def _process_export_participants_excel(meeting_id, participant_type):
         data['country'] = p.country.name if p.country else None
         data['email'] = p.email
         data['language'] = getattr(p.language, 'value', '-')
-        data['category_id'] = p.category.title
+        data['category_id'] = p.category.title.english if p.category else None
         data['represented_country'] = (
             p.represented_country.name if p.represented_country else None)
         data['represented_region'] = (
@@ -1139,34 +1034,37 @@ def _process_export_participants_excel(meeting_id, participant_type):
             if p.registration_date else None)
 
         for custom_field in added_custom_fields:
-
-            if custom_field.field_type == CustomField.MULTI_CHECKBOX:
-                custom_value = custom_field.custom_field_values.filter_by(
-                    participant=p).all()
-            else:
-                custom_value = custom_field.custom_field_values.filter_by(
-                    participant=p).first()
-
+            custom_value = getattr(p, custom_field.slug)
             if not custom_value:
                 continue
+            if custom_field.field_type == CustomField.MULTI_CHECKBOX:
+                custom_value = ', '.join(custom_value)
+            elif custom_field.field_type == CustomField.COUNTRY:
+                custom_value = custom_value.name
+            elif custom_field.field_type in (CustomField.IMAGE,
+                                             CustomField.DOCUMENT):
+                file_path = Path(app.config['PATH_CUSTOM_KEY']) / custom_value
+                custom_value = url_external('files', filename=file_path)
+            data[custom_field.slug] = custom_value
 
-            if custom_field.field_type == CustomField.COUNTRY:
-                custom_value = Country(custom_value.value).name
-            elif custom_field.field_type == CustomField.MULTI_CHECKBOX:
-                custom_value = ', '.join([unicode(v.choice)
-                                          for v in custom_value])
-            else:
-                custom_value = custom_value.value
+        yield [data.get(k) or '' for k in columns]
 
-            if custom_field.field_type in (CustomField.IMAGE,
-                                           CustomField.DOCUMENT):
-                file_path = Path(app.config['PATH_CUSTOM_KEY']) / custom_value
-                file_url = url_external('files', filename=file_path)
-                custom_value = file_url
 
-            data[custom_field.slug] = custom_value
+def _process_export_participants_excel(meeting_id, participant_type):
+    g.meeting = Meeting.query.get(meeting_id)
 
-        rows.append([data.get(k) or '' for k in columns])
+    custom_fields = (
+        g.meeting.custom_fields
+        .filter_by(custom_field_type=participant_type)
+        .order_by(CustomField.sort)
+        .all())
+
+    columns = [cf.slug for cf in custom_fields]
+    columns.append('registration_date')
+    header = get_xlsx_header(custom_fields)
+    header['Date of Registration'] = None
+
+    rows = _iter_export_rows(participant_type, custom_fields, columns)
 
     filename = '{}_list_{}.xlsx'.format(participant_type, g.meeting.acronym)
     file_path = app.config['UPLOADED_PRINTOUTS_DEST'] / filename
@@ -1174,7 +1072,10 @@ def _process_export_participants_excel(meeting_id, participant_type):
     return url_for('meetings.printouts_download', filename=filename)
 
 
-def _process_import_participants_excel(meeting_id, participants_rows, participants_type, form_class):
+IMPORT_CHUNK_SIZE = 500
+
+
+def _process_import_participants_excel(meeting_id, file_name, participants_type, form_class):
     g.meeting = Meeting.query.get(meeting_id)
 
     custom_fields = (
@@ -1185,24 +1086,111 @@ def _process_import_participants_excel(meeting_id, participants_rows, participan
         field for field in custom_fields
         if field.field_type.code != CustomField.EVENT
     ]
-    for form in read_participants_excel(custom_fields, participants_rows, form_class, read_files=True):
-        # Paranoid validation
-        if form.validate():
-            form.save()
-        else:
-            raise AssertionError("".join(form.errors))
-
+    import_file = ImportFile(file_name)
+    fetcher = FileFetcher()
+    try:
+        if not import_file.belongs_to(meeting_id, participants_type):
+            raise ValueError("Import file %r is not for this meeting" % file_name)
+        _import_participants(custom_fields, import_file, form_class, fetcher)
+    finally:
+        fetcher.cleanup()
+        import_file.unlink()
     return 'Successfully added'
 
 
-def read_participants_excel(custom_fields, rows, form_class, read_files=False):
+def _import_participants(custom_fields, import_file, form_class, fetcher):
+    """Import the rows of `import_file`, read lazily from the file.
+
+    The rows are read three times: to collect the urls of their files, to
+    validate all of them before anything is written and to save them in
+    chunks of IMPORT_CHUNK_SIZE.
+    """
+    file_slugs = [
+        field.slug for field in custom_fields
+        if field.field_type.code in (CustomField.IMAGE, CustomField.DOCUMENT)
+    ]
+    files = fetcher.fetch_all(
+        row[slug].strip() for row in import_file.rows() for slug in file_slugs
+        if row.get(slug, "").strip()
+    )
+
+    # Paranoid validation, of every row before anything is written
+    errors = []
+    for form in read_participants_excel(custom_fields, import_file.rows(), form_class, files=files):
+        if not form.validate():
+            errors.append("Row %d: %s" % (form.excel_row, "; ".join(
+                "%s: %s" % (slug, " ".join(messages))
+                for slug, messages in form.errors.items())))
+    if errors:
+        raise AssertionError("\n".join(errors))
+
+    choice_ids = collections.defaultdict(dict)
+    for choice in (CustomFieldChoice.query
+                   .filter(CustomFieldChoice.custom_field_id.in_(
+                       [cf.id for cf in custom_fields] or [None]))
+                   .options(joinedload(CustomFieldChoice.value))):
+        choice_ids[choice.custom_field_id][choice.value.english] = choice.id
+
+    total = import_file.summary["rows"]
+    forms = read_participants_excel(custom_fields, import_file.rows(), form_class, files=files)
+    for start in range(0, total, IMPORT_CHUNK_SIZE):
+        chunk = list(islice(forms, IMPORT_CHUNK_SIZE))
+        for form in chunk:
+            form.validate()
+        _save_imported_participants(chunk, choice_ids)
+        _set_job_progress(min(100, 100 * (start + len(chunk)) // total))
+
+
+def _save_imported_participants(forms, choice_ids):
+    """Insert the participants of validated import forms and their custom
+    field values in a single transaction.
+
+    The participants are flushed together to get their ids, the values are
+    written with one executemany insert.
+    """
+    participants = []
+    for form in forms:
+        participant = Participant(meeting_id=g.meeting.id,
+                                  participant_type=form.CUSTOM_FIELDS_TYPE)
+        for field_name, field in form._fields.items():
+            if field_name.endswith('_'):
+                continue
+            if form._custom_fields[field.name].is_primary:
+                setattr(participant, field_name, field.data)
+        participants.append(participant)
+
+    Participant.set_representing_many(participants)
+    db.session.add_all(participants)
+    db.session.flush()
+
+    value_rows = []
+    for form, participant in zip(forms, participants):
+        for field_name, field in form._fields.items():
+            if field_name.endswith('_') or field.data is None:
+                continue
+            cf = form._custom_fields[field.name]
+            if cf.is_primary:
+                continue
+            for row in field.value_rows(cf, choice_ids[cf.id]):
+                row['participant_id'] = participant.id
+                value_rows.append(row)
+    if value_rows:
+        db.session.execute(CustomFieldValue.__table__.insert(), value_rows)
+    db.session.commit()
+
+
+def read_participants_excel(custom_fields, rows, form_class, files=None):
+    """Yield a form for each row of a participants Excel file.
+
+    With `files`, the files downloaded by a `FileFetcher` for the urls of
+    the image and document columns, the urls are replaced by their files,
+    otherwise they are left as they are.
+    """
     meeting_categories = {}
     for c in Category.get_categories_for_meeting(form_class.CUSTOM_FIELDS_TYPE):
         meeting_categories[c.title.english.lower()] = c.id
 
-    countries = {}
-    for code, name in get_all_countries():
-        countries[name.lower()] = code
+    countries = get_country_catalogue().codes_by_name
 
     custom_fields = {
         custom_field.slug: custom_field for custom_field in custom_fields
@@ -1232,27 +1220,10 @@ def read_participants_excel(custom_fields, rows, form_class, read_files=False):
                 except:
                     value = None
             elif field_type in (CustomField.IMAGE, CustomField.DOCUMENT):
-                if read_files:
-                    resp = requests.get(value, stream=True)
-                    resp.raise_for_status()
-
-                    content_type = resp.headers.get('content-type', 'application/octet-stream')
-                    content_length = resp.headers.get('content-length', None)
-                    filename = parse_rfc6266_header(resp.headers.get("content-disposition", "")).get("filename")
-
-                    if not filename:
-                        # Attempt to guess the extension of the file
-                        ext = mimetypes.guess_extension(content_type)
-                        if ext:
-                            filename = str(uuid.uuid4()) + ext
-
-                    value = FileStorage(
-                        stream=io.BytesIO(resp.content),
-                        filename=filename,
-                        content_type=content_type,
-                        content_length=content_length,
-                        headers=resp.headers,
-                    )
+                if files is not None:
+                    value = files[value]
+                    if isinstance(value, FetchError):
+                        raise ValueError("Row %d: %s" % (row_num, value))
                 else:
                     # TODO: Add some form of validation to check the URLs are valid
                     #  A HEAD request could also be done in theory fast enough.
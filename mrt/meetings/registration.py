@@ -4,6 +4,8 @@ from flask import g, render_template, request, session, abort, Response
 from flask import redirect, url_for
 from flask_login import login_user, logout_user, current_user
 
+from mrt.cache import get_meeting_phrase
+from mrt.cache import get_registration_page, set_registration_page
 from mrt.forms.auth import LoginForm
 from mrt.forms.meetings import custom_form_factory, custom_object_factory
 from mrt.forms.meetings import RegistrationForm, RegistrationUserForm
@@ -16,6 +18,9 @@ from mrt.signals import registration_signal
 from mrt.utils import set_language, clean_email
 
 
+_TS_PLACEHOLDER = 'registration-ts-placeholder'
+
+
 def _render_if_closed(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
@@ -51,9 +56,8 @@ class BaseRegistration(MethodView):
         raise NotImplementedError
 
     def get_user_phrase(self):
-        return g.meeting.phrases.filter_by(
-            group=Phrase.ONLINE_REGISTRATION,
-            name=Phrase.USER_REGISTRATION).scalar()
+        return get_meeting_phrase(g.meeting, Phrase.ONLINE_REGISTRATION,
+                                  Phrase.USER_REGISTRATION)
 
     def dispatch_request(self, *args, **kwargs):
         g.rule_type = self.rule_type
@@ -63,6 +67,8 @@ class BaseRegistration(MethodView):
         return super(BaseRegistration, self).dispatch_request(*args, **kwargs)
 
     def get(self):
+        if self._is_page_cacheable():
+            return self._get_cached_page()
         Form = custom_form_factory(self.form_class, registration_fields=True)
         form = Form()
         header_phrase = self.get_header_phrase()
@@ -76,6 +82,29 @@ class BaseRegistration(MethodView):
                                header_phrase=header_phrase,
                                footer_phrase=footer_phrase)
 
+    def _is_page_cacheable(self):
+        # The page of anonymous visitors only depends on the meeting, the
+        # form and the language, unless there are messages to flash.
+        return (not current_user.is_authenticated and
+                '_flashes' not in session and
+                set(request.args) <= {'lang'})
+
+    def _get_cached_page(self):
+        """Render the page once with a placeholder for the time-trap
+        token and fill in a fresh token on every request.
+        """
+        language = g.get('language', 'en')
+        page = get_registration_page(g.meeting, self.rule_type, language)
+        if page is None:
+            Form = custom_form_factory(self.form_class,
+                                       registration_fields=True)
+            page = render_template(self.template_name,
+                                   form=Form(ts_=_TS_PLACEHOLDER),
+                                   header_phrase=self.get_header_phrase(),
+                                   footer_phrase=self.get_footer_phrase())
+            set_registration_page(g.meeting, self.rule_type, language, page)
+        return page.replace(_TS_PLACEHOLDER, RegistrationForm.get_ts())
+
     def post(self):
         Form = custom_form_factory(self.form_class, registration_fields=True)
         form = Form(request.form)
@@ -127,20 +156,20 @@ class Registration(BaseRegistration):
         return user.get_default(Participant.DEFAULT)
 
     def get_success_phrase(self):
-        return g.meeting.phrases.filter(
-            ((Phrase.group == Phrase.ONLINE_REGISTRATION) &
-             (Phrase.name == Phrase.PARTICIPANT)) |
-            ((Phrase.group == Phrase.ONLINE_REGISTRATION_CONFIRMATION) &
-             (Phrase.name == Phrase.FOR_PARTICIPANTS))
-        ).scalar()
+        return (
+            get_meeting_phrase(g.meeting, Phrase.ONLINE_REGISTRATION,
+                               Phrase.PARTICIPANT) or
+            get_meeting_phrase(g.meeting,
+                               Phrase.ONLINE_REGISTRATION_CONFIRMATION,
+                               Phrase.FOR_PARTICIPANTS))
 
     def get_header_phrase(self):
-        return g.meeting.phrases.filter_by(group=Phrase.ONLINE_REGISTRATION,
-                                           name=Phrase.HEADER_PARTICIPANTS).scalar()
+        return get_meeting_phrase(g.meeting, Phrase.ONLINE_REGISTRATION,
+                                  Phrase.HEADER_PARTICIPANTS)
 
     def get_footer_phrase(self):
-        return g.meeting.phrases.filter_by(group=Phrase.ONLINE_REGISTRATION,
-                                           name=Phrase.FOOTER_PARTICIPANTS).scalar()
+        return get_meeting_phrase(g.meeting, Phrase.ONLINE_REGISTRATION,
+                                  Phrase.FOOTER_PARTICIPANTS)
 
 
 class MediaRegistration(BaseRegistration):
@@ -153,16 +182,16 @@ class MediaRegistration(BaseRegistration):
         return user.get_default(Participant.DEFAULT_MEDIA)
 
     def get_success_phrase(self):
-        return g.meeting.phrases.filter_by(group=Phrase.ONLINE_REGISTRATION,
-                                           name=Phrase.MEDIA).scalar()
+        return get_meeting_phrase(g.meeting, Phrase.ONLINE_REGISTRATION,
+                                  Phrase.MEDIA)
 
     def get_header_phrase(self):
-        return g.meeting.phrases.filter_by(group=Phrase.ONLINE_REGISTRATION,
-                                           name=Phrase.HEADER_MEDIA).scalar()
+        return get_meeting_phrase(g.meeting, Phrase.ONLINE_REGISTRATION,
+                                  Phrase.HEADER_MEDIA)
 
     def get_footer_phrase(self):
-        return g.meeting.phrases.filter_by(group=Phrase.ONLINE_REGISTRATION,
-                                           name=Phrase.FOOTER_MEDIA).scalar()
+        return get_meeting_phrase(g.meeting, Phrase.ONLINE_REGISTRATION,
+                                  Phrase.FOOTER_MEDIA)
 
 
 class UserRegistration(MethodView):
@@ -202,12 +231,12 @@ class UserRegistration(MethodView):
                                form=form)
 
     def get_success_phrase(self):
-        return g.meeting.phrases.filter_by(group=Phrase.ONLINE_REGISTRATION,
-                                           name=Phrase.MEDIA).scalar()
+        return get_meeting_phrase(g.meeting, Phrase.ONLINE_REGISTRATION,
+                                  Phrase.MEDIA)
 
     def get_user_phrase(self):
-        return g.meeting.phrases.filter_by(group=Phrase.ONLINE_REGISTRATION,
-                                           name=Phrase.MEDIA).scalar()
+        return get_meeting_phrase(g.meeting, Phrase.ONLINE_REGISTRATION,
+                                  Phrase.MEDIA)
 
 
 class UserRegistrationSuccess(MethodView):
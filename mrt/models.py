@@ -1,20 +1,26 @@
 from datetime import datetime
+from itertools import groupby
+from operator import attrgetter
 import json
 import random
 import string
 
 from werkzeug.security import generate_password_hash, check_password_hash
 
+from flask import _request_ctx_stack
 from flask import g, render_template, current_app as app, url_for
+from flask import abort
 from flask_babel import get_locale, Locale
 from flask_babel import gettext as _
 from flask_babel import lazy_gettext
-from flask_sqlalchemy import SQLAlchemy, BaseQuery
+from flask_sqlalchemy import SQLAlchemy, BaseQuery, Pagination
 from flask_redis import FlaskRedis
 from jinja2.exceptions import TemplateNotFound
+from redis import RedisError
 
-from sqlalchemy import cast, or_
-from sqlalchemy import event
+from sqlalchemy import and_, func, literal, literal_column, or_
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import aliased, joinedload
 
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.types import TypeDecorator, String
@@ -22,7 +28,7 @@ from sqlalchemy_utils import ChoiceType, EmailType
 from sqlalchemy_utils import Choice
 from wtforms.fields import DateField
 
-from mrt.custom_country import CountryType
+from mrt.custom_country import Country, CountryType
 from mrt.definitions import (
     PERMISSIONS, NOTIFICATION_TYPES, REPRESENTING_REGIONS,
     CATEGORY_REPRESENTING, LANGUAGES_ISO_MAP)
@@ -129,12 +135,8 @@ class User(db.Model):
         return (datetime.now() - self.recover_time).total_seconds() < 86400
 
     def has_perms(self, perms, meeting_id):
-        user_roles = RoleUser.query.filter_by(
-            user_id=self.id, meeting_id=meeting_id)
-        for user_role in user_roles:
-            if set(user_role.role.permissions).intersection(perms):
-                return True
-        return False
+        return bool(get_user_permissions(self.id, meeting_id)
+                    .intersection(perms))
 
     def get_default(self, participant_type):
         return (
@@ -243,10 +245,74 @@ class RoleUser(db.Model):
         return '%s %s' % (self.user, self.role)
 
 
+_PERMISSIONS_KEY = 'mrt:permissions:%s:%s:%s'
+_PERMISSIONS_GENERATION_KEY = 'mrt:permissions:generation'
+
+
+def _load_user_permissions(user_id, meeting_id):
+    roles = (
+        db.session.query(Role.permissions)
+        .join(RoleUser, RoleUser.role_id == Role.id)
+        .filter(RoleUser.user_id == user_id,
+                RoleUser.meeting_id == meeting_id))
+    permissions = set()
+    for role_permissions, in roles:
+        permissions.update(role_permissions)
+    return frozenset(permissions)
+
+
+def _get_cached_user_permissions(user_id, meeting_id):
+    """Load the permissions through redis when `PERMISSIONS_CACHE_TTL` is
+    set. The keys hold a generation number that is incremented whenever
+    roles change, so stale entries are never read and just expire.
+    """
+    ttl = app.config.get('PERMISSIONS_CACHE_TTL', 0)
+    if not ttl:
+        return _load_user_permissions(user_id, meeting_id)
+    try:
+        generation = redis_store.get(_PERMISSIONS_GENERATION_KEY) or 0
+        key = _PERMISSIONS_KEY % (int(generation), user_id, meeting_id)
+        cached = redis_store.get(key)
+        if cached is not None:
+            return frozenset(json.loads(cached))
+        permissions = _load_user_permissions(user_id, meeting_id)
+        redis_store.set(key, json.dumps(sorted(permissions)), ex=ttl)
+        return permissions
+    except RedisError:
+        return _load_user_permissions(user_id, meeting_id)
+
+
+def get_user_permissions(user_id, meeting_id):
+    """The permissions the roles of the user grant on the meeting.
+
+    They are resolved with a single query and kept on the request context,
+    so the permission checks of a page only load them once.
+    """
+    ctx = _request_ctx_stack.top
+    if ctx is None:
+        return _get_cached_user_permissions(user_id, meeting_id)
+    if not hasattr(ctx, 'user_permissions'):
+        ctx.user_permissions = {}
+    key = (user_id, meeting_id)
+    if key not in ctx.user_permissions:
+        ctx.user_permissions[key] = _get_cached_user_permissions(
+            user_id, meeting_id)
+    return ctx.user_permissions[key]
+
+
 class Participant(db.Model):
 
     __table_args__ = (
-        db.UniqueConstraint('registration_token'),)
+        db.UniqueConstraint('registration_token'),
+        # the active participants of a meeting, by type and category
+        db.Index('ix_participant_meeting_type_category',
+                 'meeting_id', 'participant_type', 'category_id',
+                 postgresql_where=text('deleted = false')),
+        # numbering by registration date in the participants filter
+        db.Index('ix_participant_meeting_type_registration',
+                 'meeting_id', 'participant_type', 'registration_date', 'id',
+                 postgresql_where=text('deleted = false')),
+    )
 
     query_class = ParticipantQuery
 
@@ -393,18 +459,49 @@ class Participant(db.Model):
     def lang(self):
         return self.language.code.lower()
 
-    def set_representing(self):
-        self.representing = ''
-        if not self.category or not self.category.representing:
-            return
+    @staticmethod
+    def _get_representing_template(category):
+        if not category or not category.representing:
+            return None
         template_name = str(
             app.config['REPRESENTING_TEMPLATES'] /
-            self.category.representing.code)
+            category.representing.code)
         try:
-            template = app.jinja_env.get_template(template_name)
+            return app.jinja_env.get_template(template_name)
         except TemplateNotFound:
-            return
-        self.representing = render_template(template, participant=self)
+            return None
+
+    def _render_representing(self, template):
+        self.representing = ''
+        if template is not None:
+            self.representing = render_template(template, participant=self)
+
+    def set_representing(self):
+        self._render_representing(
+            self._get_representing_template(self.category))
+
+    @classmethod
+    def set_representing_many(cls, participants):
+        """Set the representing value of many participants, loading their
+        categories and representing templates once.
+        """
+        category_ids = set(p.category_id for p in participants
+                           if p.category_id)
+        categories = dict(
+            (c.id, c) for c in
+            Category.query.filter(Category.id.in_(category_ids))
+            .options(joinedload(Category.title))) if category_ids else {}
+        templates = {}
+        for participant in participants:
+            category = categories.get(participant.category_id)
+            if category is None:
+                category = participant.category
+            else:
+                participant.category = category
+            if category not in templates:
+                templates[category] = cls._get_representing_template(
+                    category)
+            participant._render_representing(templates[category])
 
     @property
     def photo(self):
@@ -665,6 +762,10 @@ def generate_slug(mapper, connection, target):
 
 class CustomFieldValue(db.Model):
 
+    __table_args__ = (
+        db.Index('ix_custom_field_value_custom_field_participant',
+                 'custom_field_id', 'participant_id'),)
+
     id = db.Column(db.Integer, primary_key=True)
 
     custom_field_id = db.Column(
@@ -775,6 +876,12 @@ class Meeting(db.Model):
 
     settings = db.Column(JSONEncodedDict, default={})
 
+    form_schema_version = db.Column(db.Integer, nullable=False, default=0,
+                                    server_default='0')
+
+    participants_version = db.Column(db.Integer, nullable=False, default=0,
+                                     server_default='0')
+
     photo_field_id = db.Column(
         db.Integer, db.ForeignKey('custom_field.id',
                                   ondelete="SET NULL",
@@ -1160,6 +1267,7 @@ class Job(db.Model):
     )
 
     PRINTOUTS_QUEUE = 'printouts'
+    MAIL_QUEUE = 'mail'
 
     id = db.Column(db.String(64), primary_key=True)
     name = db.Column(db.String(32))
@@ -1173,6 +1281,7 @@ class Job(db.Model):
     status = db.Column(ChoiceType(STATUS), nullable=False)
     queue = db.Column(db.String(32))
     result = db.Column(db.String(512))
+    progress = db.Column(db.Integer)
 
     @property
     def is_finished(self):
@@ -1273,6 +1382,145 @@ class Action(db.Model):
         backref=db.backref('actions', lazy='dynamic'))
 
 
+def _get_schema_meeting(obj):
+    if isinstance(obj, (CustomField, Category, Rule)):
+        return obj.meeting
+    if isinstance(obj, CustomFieldChoice):
+        return obj.custom_field and obj.custom_field.meeting
+    if isinstance(obj, (Condition, Action)):
+        return obj.rule and obj.rule.meeting
+    if isinstance(obj, ConditionValue):
+        return obj.condition and obj.condition.rule and \
+            obj.condition.rule.meeting
+    return None
+
+
+def _get_translations_meetings(session, translation_ids):
+    """The meetings of the custom field labels and hints, choices and
+    category titles among the given translations.
+    """
+    with session.no_autoflush:
+        meeting_ids = (
+            session.query(CustomField.meeting_id)
+            .filter(or_(CustomField.label_id.in_(translation_ids),
+                        CustomField.hint_id.in_(translation_ids)))
+            .union(
+                session.query(CustomField.meeting_id)
+                .join(CustomFieldChoice,
+                      CustomFieldChoice.custom_field_id == CustomField.id)
+                .filter(CustomFieldChoice.value_id.in_(translation_ids)),
+                session.query(Category.meeting_id)
+                .filter(Category.title_id.in_(translation_ids)))
+            .all())
+        # the default custom fields and categories have no meeting
+        return [session.query(Meeting).get(meeting_id)
+                for (meeting_id,) in meeting_ids if meeting_id is not None]
+
+
+@event.listens_for(db.session, 'before_flush')
+def bump_form_schema_version(session, flush_context, instances):
+    """Increment the form schema version of the meetings whose custom
+    fields, choices, categories or rules are changed by this flush.
+    """
+    changed = list(session.new) + list(session.deleted) + [
+        obj for obj in session.dirty
+        if session.is_modified(obj, include_collections=False)]
+    candidates = [_get_schema_meeting(obj) for obj in changed]
+    # translations do not know their owner, new and deleted ones come
+    # with a change of their owner
+    translation_ids = [obj.id for obj in changed
+                       if isinstance(obj, Translation) and
+                       obj.id is not None and obj not in session.deleted]
+    if translation_ids:
+        candidates += _get_translations_meetings(session, translation_ids)
+    meetings = set()
+    for meeting in candidates:
+        if meeting is not None and meeting not in session.deleted and \
+                inspect(meeting).persistent:
+            meetings.add(meeting)
+    for meeting in meetings:
+        meeting.form_schema_version = Meeting.form_schema_version + 1
+
+
+def _participant_moved(participant):
+    state = inspect(participant)
+    return any(state.attrs[key].history.has_changes()
+               for key in ('deleted', 'participant_type', 'meeting_id'))
+
+
+@event.listens_for(db.session, 'before_flush')
+def collect_participants_changes(session, flush_context, instances):
+    """Remember the meetings that gain or lose participants with this
+    flush, their participants version is incremented after the commit.
+    """
+    participants = [
+        obj for obj in list(session.new) + list(session.deleted)
+        if isinstance(obj, Participant)]
+    participants += [obj for obj in session.dirty
+                     if isinstance(obj, Participant) and
+                     _participant_moved(obj)]
+    meeting_ids = set()
+    for participant in participants:
+        meeting_ids.add(participant.meeting_id or
+                        (participant.meeting and participant.meeting.id))
+        history = inspect(participant).attrs.meeting_id.history
+        meeting_ids.update(history.deleted or ())
+    meeting_ids.discard(None)
+    session.info.setdefault('participants_changed', set()).update(
+        meeting_ids)
+
+
+@event.listens_for(db.session, 'after_commit')
+def bump_participants_version(session):
+    """Increment the participants version in its own short transaction;
+    updating the meeting row within the flush would lock it until the
+    commit and serialize the concurrent registrations of the meeting.
+    """
+    meeting_ids = session.info.pop('participants_changed', None)
+    if not meeting_ids:
+        return
+    meetings = Meeting.__table__
+    db.engine.execute(
+        meetings.update()
+        .where(meetings.c.id.in_(meeting_ids))
+        .values(participants_version=meetings.c.participants_version + 1))
+
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_participants_changes(session):
+    session.info.pop('participants_changed', None)
+
+
+@event.listens_for(db.session, 'before_flush')
+def invalidate_user_permissions(session, flush_context, instances):
+    """Forget the permissions resolved so far when roles or role
+    assignments are changed by this flush.
+    """
+    changed = list(session.new) + list(session.deleted) + list(session.dirty)
+    if not any(isinstance(obj, (Role, RoleUser)) for obj in changed):
+        return
+    ctx = _request_ctx_stack.top
+    if ctx is not None:
+        ctx.user_permissions = {}
+    session.info['permissions_changed'] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def expire_cached_user_permissions(session):
+    if not session.info.pop('permissions_changed', False):
+        return
+    if app.config.get('PERMISSIONS_CACHE_TTL', 0):
+        try:
+            redis_store.incr(_PERMISSIONS_GENERATION_KEY)
+        except RedisError:
+            pass
+
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_user_permissions_change(session):
+    session.info.pop('permissions_changed', None)
+
+
 def get_or_create_role(name):
     role = Role.query.filter_by(name=name).first()
     if not role:
@@ -1281,40 +1529,308 @@ def get_or_create_role(name):
     return role
 
 
-def search_for_participant(search, queryset=None):
+def _unaccent(expression):
+    """Strip the accents with the immutable unaccent wrapper installed by
+    the participant search migration; other databases compare as is.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        return func.f_unaccent(expression)
+    return expression
+
+
+def participant_search_text():
+    """The participant names and representing, lowercased, as indexed by
+    the trigram index of the participant search migration.
+    """
+    empty, space = literal_column("''"), literal_column("' '")
+    return func.lower(
+        func.coalesce(Participant.first_name, empty) + space +
+        func.coalesce(Participant.last_name, empty) + space +
+        func.coalesce(Participant.representing, empty))
+
+
+def search_for_participant(search, queryset=None, ranked=False):
+    """Filter the participants whose names, representing or category title
+    contain the search, ignoring case and accents. Ranked results are
+    ordered by their similarity to the search.
+
+    Each criterion is looked up with its own index, the trigram index of
+    the search text, the primary key and the category of the participants,
+    within the participants of `queryset`, and the matching ids are
+    combined with a union.
+    """
     queryset = queryset or Participant.query.current_meeting().participants()
     if not isinstance(search, basestring):
         search = str(search)
-    search = '%%%s%%' % (search, )
-    return queryset.filter(
-        (cast(Participant.id, String) == search) |
-        Participant.representing.ilike(search) |
-        Participant.first_name.ilike(search) |
-        Participant.last_name.ilike(search) |
-        Participant.category.has(
-            Category.title.has(Translation.english.ilike(search))
-        )
-    )
+    search = search.strip()
+    pattern = _unaccent(literal('%%%s%%' % search.lower()))
+    search_text = _unaccent(participant_search_text())
+    participant_ids = queryset.with_entities(Participant.id).order_by(None)
+    matches = [participant_ids.filter(search_text.like(pattern))]
+    if search.isdigit():
+        matches.append(participant_ids.filter(Participant.id == int(search)))
+    meeting = g.get('meeting')
+    if meeting is not None:
+        category_ids = [
+            category_id for (category_id,) in
+            db.session.query(Category.id)
+            .join(Translation, Category.title_id == Translation.id)
+            .filter(Category.meeting_id == meeting.id)
+            .filter(_unaccent(func.lower(Translation.english)).like(pattern))]
+        if category_ids:
+            matches.append(participant_ids.filter(
+                Participant.category_id.in_(category_ids)))
+    matches = matches[0].union(*matches[1:])
+    queryset = queryset.filter(Participant.id.in_(matches.subquery()))
+    if ranked and db.engine.dialect.name == 'postgresql':
+        similarity = func.similarity(search_text,
+                                     _unaccent(literal(search.lower())))
+        queryset = queryset.order_by(similarity.desc(), Participant.id)
+    return queryset
+
+
+def get_participants_total(meeting, participant_type):
+    """Return the number of active participants of the given type in the
+    meeting, cached until the participants version of the meeting changes.
+    """
+    cache = app.extensions.setdefault('participants_totals', {})
+    key = (meeting.id, participant_type)
+    version = meeting.participants_version
+    cached = cache.get(key)
+    if cached and cached[0] == version:
+        return cached[1]
+    total = (Participant.query.active()
+             .filter_by(meeting_id=meeting.id,
+                        participant_type=participant_type)
+             .count())
+    cache[key] = (version, total)
+    return total
 
 
 def get_participants_full(meeting_id, participant_type):
+    meeting = Meeting.query.get(meeting_id)
+    return iter(ParticipantRecords(meeting, participant_type,
+                                   order_by=[Participant.id.desc()]))
+
+
+PARTICIPANT_COLUMNS = tuple(attr.key for attr in
+                            inspect(Participant).column_attrs)
+
+
+class ParticipantRecord(object):
+    """A read-only participant row with its custom field values resolved.
+
+    Primary fields are plain attributes, the values of the added custom
+    fields are looked up by slug: choices are translated, multi checkboxes
+    are lists and countries are `Country` instances. Records are not bound
+    to the session, so printouts can hold thousands of them cheaply.
+    """
+
+    __slots__ = PARTICIPANT_COLUMNS + ('category', 'meeting', '_values',
+                                       '_records')
+
+    def __init__(self, row, category, values, records):
+        set_attr = super(ParticipantRecord, self).__setattr__
+        for key in PARTICIPANT_COLUMNS:
+            set_attr(key, getattr(row, key))
+        set_attr('category', category)
+        set_attr('meeting', records.meeting)
+        set_attr('_values', values)
+        set_attr('_records', records)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('%s is read-only' % type(self).__name__)
+
+    def __repr__(self):
+        return self.name
+
+    name = Participant.name
+    name_on_badge = Participant.name_on_badge
+    lang = Participant.lang
+
+    @property
+    def photo(self):
+        return self._get_printout_field_value('photo')
+
+    @property
+    def address_value(self):
+        return self._get_printout_field_value('address')
+
+    @property
+    def telephone_value(self):
+        return self._get_printout_field_value('telephone')
+
+    def _get_printout_field_value(self, field_name):
+        field = getattr(self.meeting, '%s_field' % field_name, None)
+        if not field:
+            return None
+        return self._values.get(field.slug)
+
+    def attended_event(self, event_field_id):
+        field = self._records.fields_by_id.get(event_field_id)
+        return self._values.get(field.slug) == 'true' if field else False
+
+    def hardcoded_field_value(self, field_name):
+        return self._values.get(field_name)
+
+
+class ParticipantRecords(object):
+    """Load the participants of a meeting as `ParticipantRecord` objects.
+
+    The participants are read together with their category and the values
+    of the added custom fields in a single query, streamed from the
+    database and pivoted in Python, one participant at a time. It behaves
+    like a query: it can be counted, iterated and paginated.
+    """
+
+    def __init__(self, meeting, participant_type=Participant.PARTICIPANT,
+                 flag=None, category_ids=None, field_slugs=None,
+                 order_by=None):
+        self.meeting = meeting
+        self.participant_type = participant_type
+        self._order_by = list(order_by or []) + [Participant.id]
+        self._criterion = [Participant.meeting_id == meeting.id,
+                           Participant.participant_type == participant_type,
+                           Participant.deleted == False]
+        if flag:
+            self._criterion.append(getattr(Participant, flag) == True)
+        if category_ids:
+            self._criterion.append(Participant.category_id.in_(category_ids))
+
+        fields = (
+            CustomField.query
+            .filter_by(meeting_id=meeting.id, is_primary=False,
+                       custom_field_type=participant_type)
+            .order_by(CustomField.sort))
+        if field_slugs is not None:
+            # The printout fields are needed by the photo, address and
+            # telephone values of the records.
+            field_ids = [getattr(meeting, '%s_id' % name)
+                         for name in Meeting.PRINTOUT_FIELDS]
+            fields = fields.filter(or_(
+                CustomField.slug.in_(list(field_slugs) or [None]),
+                CustomField.id.in_([i for i in field_ids if i] or [None])))
+        self.fields_by_id = dict((cf.id, cf) for cf in fields)
+        self.categories = dict(
+            (c.id, c) for c in
+            Category.query.filter_by(meeting_id=meeting.id)
+            .options(joinedload(Category.title)))
+
+    def filter(self, *criterion):
+        self._criterion.extend(criterion)
+        return self
+
+    def _query(self, *entities):
+        return (
+            db.session.query(*entities)
+            .outerjoin(Category, Participant.category_id == Category.id)
+            .filter(*self._criterion))
+
+    def count(self):
+        return self._query(Participant.id).count()
+
+    def _records(self, participant_ids=None):
+        choice_value = aliased(Translation)
+        columns = [getattr(Participant, key) for key in PARTICIPANT_COLUMNS]
+        query = (
+            self._query(*columns + [
+                CustomFieldValue.custom_field_id.label('cf_id'),
+                CustomFieldValue.value.label('cf_value'),
+                choice_value.english.label('cf_choice')])
+            .outerjoin(CustomFieldValue, and_(
+                CustomFieldValue.participant_id == Participant.id,
+                CustomFieldValue.custom_field_id.in_(
+                    self.fields_by_id.keys() or [None])))
+            .outerjoin(CustomFieldChoice,
+                       CustomFieldValue.choice_id == CustomFieldChoice.id)
+            .outerjoin(choice_value,
+                       CustomFieldChoice.value_id == choice_value.id)
+            .order_by(*self._order_by + [CustomFieldValue.id]))
+        if participant_ids is not None:
+            query = query.filter(Participant.id.in_(participant_ids))
+        query = query.execution_options(stream_results=True).yield_per(1000)
+
+        for participant_id, rows in groupby(query, attrgetter('id')):
+            rows = list(rows)
+            yield ParticipantRecord(
+                rows[0], self.categories.get(rows[0].category_id),
+                self._resolve_values(rows), self)
+
+    def _resolve_values(self, rows):
+        values = {}
+        for cf in self.fields_by_id.values():
+            multi = cf.field_type == CustomField.MULTI_CHECKBOX
+            values[cf.slug] = [] if multi else None
+        for row in rows:
+            cf = self.fields_by_id.get(row.cf_id)
+            if not cf:
+                continue
+            value = row.cf_choice or row.cf_value
+            if cf.field_type == CustomField.MULTI_CHECKBOX:
+                values[cf.slug].append(value)
+            elif cf.field_type == CustomField.COUNTRY:
+                values[cf.slug] = Country(value) if value else None
+            else:
+                values[cf.slug] = value or None
+        return values
+
+    def __iter__(self):
+        return self._records()
+
+    def all(self):
+        return list(self)
+
+    def page(self, page, per_page):
+        """The records of one page, loaded by their ids."""
+        participant_ids = [
+            row.id for row in
+            self._query(Participant.id).order_by(*self._order_by)
+            .limit(per_page).offset((page - 1) * per_page)]
+        if not participant_ids:
+            return []
+        return list(self._records(participant_ids))
+
+    def paginate(self, page, per_page=20, error_out=True):
+        if error_out and page < 1:
+            abort(404)
+        items = self.page(page, per_page)
+        if not items and page != 1 and error_out:
+            abort(404)
+        if page == 1 and len(items) < per_page:
+            total = len(items)
+        else:
+            total = self.count()
+        return Pagination(self, page, per_page, total, items)
+
+
+def get_custom_field_values(participant_ids, custom_field_ids=None):
+    """Load the custom field values of several participants in a single
+    query, together with their choices and the choices translations.
+
+    Returns a dict mapping (participant_id, custom_field_id) to the list of
+    values, in the order they were added.
+    """
+    values = {}
+    if not participant_ids:
+        return values
     qs = (
-        Participant.query
-        .outerjoin(Participant.custom_field_values,
-                   CustomFieldValue.custom_field)
-        .filter(Participant.participant_type == participant_type)
-        .with_entities(Participant, CustomField.slug, CustomFieldValue.value)
-        .current_meeting()
-        .order_by(Participant.id.desc())
+        CustomFieldValue.query
+        .filter(CustomFieldValue.participant_id.in_(participant_ids))
+        .options(joinedload(CustomFieldValue.choice)
+                 .joinedload(CustomFieldChoice.value))
+        .order_by(CustomFieldValue.id)
     )
-
-    last_participant = None
-    for participant, slug, value in qs:
-        if last_participant and participant.id != last_participant.id:
-            yield last_participant
-            last_participant = None
-        last_participant = last_participant or participant
-        if slug:
-            setattr(last_participant, slug, value)
-    if last_participant:
-        yield last_participant
+    if custom_field_ids is not None:
+        qs = qs.filter(CustomFieldValue.custom_field_id.in_(custom_field_ids))
+    for cfv in qs:
+        key = (cfv.participant_id, cfv.custom_field_id)
+        values.setdefault(key, []).append(cfv)
+    return values
@@ -1,9 +1,17 @@
+import hashlib
 import logging
+import os
+import re
 import subprocess
+import threading
+import time
 import uuid
+from collections import namedtuple
 
 from flask import current_app as app
 from flask import Response, g, url_for
+from path import Path
+from PyPDF2 import PdfFileMerger
 from mrt.template import url_external
 
 from mrt.utils import read_file
@@ -12,6 +20,10 @@ logger = logging.getLogger("mrt")
 
 _PAGE_DEFAULT_MARGIN = {'top': '0', 'bottom': '0', 'left': '0', 'right': '0'}
 
+# The files embedded by their path in pdf processes: logos, photos and
+# category backgrounds.
+_ASSET_RE = re.compile(r'''(?:src=|url\()["']?(/[^"'()<>?]+)''')
+
 
 def stream_template(template_name, **context):
     app.update_template_context(context)
@@ -21,6 +33,109 @@ def stream_template(template_name, **context):
     return rv
 
 
+PdfJob = namedtuple('PdfJob', ['options', 'html_path', 'pdf_path'])
+
+
+def _quote_arg(arg):
+    return '"%s"' % unicode(arg).replace('\\', '\\\\').replace('"', '\\"')
+
+
+class OneShotPdfEngine(object):
+    """Start a wkhtmltopdf process for every document, running at most
+    `concurrency` processes at the same time.
+    """
+
+    def __init__(self, concurrency=1):
+        self.concurrency = max(int(concurrency), 1)
+
+    def render(self, jobs, on_done=None):
+        """Render the jobs, calling `on_done` with each generated job."""
+        pending = list(jobs)
+        running = []
+        failed = []
+        while pending or running:
+            while pending and len(running) < self.concurrency:
+                job = pending.pop(0)
+                command = (['wkhtmltopdf'] + job.options +
+                           [str(job.html_path), str(job.pdf_path)])
+                proc = subprocess.Popen(command, stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE)
+                running.append((proc, command, job))
+            proc, command, job = running.pop(0)
+            stdout, stderr = proc.communicate()
+            if proc.returncode:
+                logger.error("Unable to generate pdf %s: %s", stdout, stderr)
+                failed.append((proc.returncode, command))
+            elif on_done:
+                on_done(job)
+        if failed:
+            raise subprocess.CalledProcessError(*failed[0])
+
+
+class BatchPdfEngine(OneShotPdfEngine):
+    """Render several documents with each wkhtmltopdf process.
+
+    The documents are spread over `concurrency` processes started with
+    `--read-args-from-stdin`, each reading the arguments of one document per
+    line, so the start-up cost of wkhtmltopdf is paid once per process
+    instead of once per document. Documents that a batch did not produce
+    are rendered again in one-shot mode.
+    """
+
+    def render(self, jobs, on_done=None):
+        jobs = list(jobs)
+        if len(jobs) < 2:
+            return super(BatchPdfEngine, self).render(jobs, on_done)
+
+        batches = [jobs[i::self.concurrency] for i in
+                   range(min(self.concurrency, len(jobs)))]
+        threads = [threading.Thread(target=self._render_batch, args=(batch,))
+                   for batch in batches]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        missing = []
+        for job in jobs:
+            if job.pdf_path.exists() and job.pdf_path.getsize():
+                if on_done:
+                    on_done(job)
+            else:
+                missing.append(job)
+        if missing:
+            logger.warning("Rendering %d documents in one-shot mode",
+                           len(missing))
+            super(BatchPdfEngine, self).render(missing, on_done)
+
+    @staticmethod
+    def _render_batch(batch):
+        lines = [' '.join(_quote_arg(arg) for arg in
+                          job.options + [job.html_path, job.pdf_path])
+                 for job in batch]
+        proc = subprocess.Popen(['wkhtmltopdf', '--read-args-from-stdin'],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        stdout, stderr = proc.communicate(
+            ('\n'.join(lines) + '\n').encode('utf-8'))
+        if proc.returncode:
+            logger.warning("Batch pdf generation failed %s: %s",
+                           stdout, stderr)
+
+
+_PDF_ENGINES = {
+    'oneshot': OneShotPdfEngine,
+    'batch': BatchPdfEngine,
+}
+
+
+def get_pdf_engine(name=None, concurrency=None):
+    """The engine configured with `PDF_ENGINE` and `PDF_CONCURRENCY`."""
+    name = name or app.config.get('PDF_ENGINE', 'batch')
+    concurrency = concurrency or app.config.get('PDF_CONCURRENCY', 2)
+    return _PDF_ENGINES[name](concurrency)
+
+
 class PdfRenderer(object):
     def __init__(self, template_name, **kwargs):
         self.template_name = template_name
@@ -31,6 +146,7 @@ class PdfRenderer(object):
         self.orientation = kwargs.get('orientation', 'portrait')
         self.footer = kwargs.get('footer', True)
         self.context = kwargs.get('context', {})
+        self.cache = kwargs.get('cache', False)
 
         self.template_path = (app.config['UPLOADED_PRINTOUTS_DEST'] /
                               (str(uuid.uuid4()) + '.html'))
@@ -39,12 +155,34 @@ class PdfRenderer(object):
         g.is_pdf_process = True
 
     def _render_template(self):
+        """Write the html file and return its content-addressed key, the
+        hash of the html together with the wkhtmltopdf options and the
+        modification time and size of the files it embeds, which can be
+        replaced under the same name.
+        """
+        digest = hashlib.sha256()
+        assets = set()
+        tail = u''
         with open(self.template_path, 'w+') as f:
             for chunk in stream_template(self.template_name, **self.context):
-                f.write(chunk.encode('utf-8'))
+                # a path may be split between two chunks
+                assets.update(_ASSET_RE.findall(tail + chunk))
+                tail = chunk[-255:]
+                chunk = chunk.encode('utf-8')
+                digest.update(chunk)
+                f.write(chunk)
+        for option in self._options():
+            digest.update(b'\0' + unicode(option).encode('utf-8'))
+        for asset in sorted(assets):
+            asset_path = Path(asset)
+            if asset_path.isfile():
+                stat = asset_path.stat()
+                digest.update(b'\0' + (u'%s:%r:%d' % (
+                    asset, stat.st_mtime, stat.st_size)).encode('utf-8'))
+        return digest.hexdigest()
 
-    def _generate_pdf(self):
-        command = ['wkhtmltopdf', '-q',
+    def _options(self):
+        options = ['-q',
                    '--encoding', 'utf-8',
                    '--page-height', self.height,
                    '--page-width', self.width,
@@ -54,18 +192,18 @@ class PdfRenderer(object):
                    '-R', self.margin['right'],
                    '--orientation', self.orientation]
         if self.title:
-            command += ['--title', self.title]
+            options += ['--title', self.title]
 
         if self.footer and not app.config['DEBUG']:
             footer_url = url_external('meetings.printouts_footer')
-            command += ['--footer-html', footer_url]
-        command += [str(self.template_path), str(self.pdf_path)]
+            options += ['--footer-html', footer_url]
+        return options
 
-        proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        stdout, stderr = proc.communicate()
-        if proc.returncode:
-            logger.error("Unable to generate pdf %s: %s", stdout, stderr, exc_info=True)
-            raise subprocess.CalledProcessError(proc.returncode, command)
+    def _job(self):
+        return PdfJob(self._options(), self.template_path, self.pdf_path)
+
+    def _generate_pdf(self):
+        get_pdf_engine().render([self._job()])
 
     def _generate(self):
         self._render_template()
@@ -83,7 +221,32 @@ class PdfRenderer(object):
         return self._pdf_file()
 
     def as_response(self):
-        return Response(read_file(self._pdf_file()), mimetype='application/pdf')
+        pdf = self._cached_pdf_file() if self.cache else self._pdf_file()
+        return Response(read_file(pdf), mimetype='application/pdf')
+
+    @staticmethod
+    def generate_many(renderers, engine=None, on_done=None):
+        """Render the PDF files of several renderers with a single engine
+        call, so the batch engine can share wkhtmltopdf processes.
+        `on_done` is called with the number of generated files so far.
+        """
+        engine = engine or get_pdf_engine()
+        done = []
+
+        def _on_done(job):
+            done.append(job)
+            if on_done:
+                on_done(len(done))
+
+        try:
+            for renderer in renderers:
+                renderer._render_template()
+            engine.render([renderer._job() for renderer in renderers],
+                          _on_done)
+        finally:
+            for renderer in renderers:
+                renderer.template_path.unlink_p()
+        return [renderer.pdf_path for renderer in renderers]
 
     def _pdf_file(self):
         try:
@@ -93,6 +256,80 @@ class PdfRenderer(object):
             self.pdf_path.unlink_p()
         return pdf
 
+    def _cached_pdf_file(self):
+        """Return the stored pdf of identical html and options, generating
+        and storing it first if needed.
+        """
+        try:
+            key = self._render_template()
+            cached_path = _pdf_cache_dir() / (key + '.pdf')
+            if cached_path.exists():
+                # the modification time orders the files for eviction
+                cached_path.utime(None)
+            else:
+                self._generate_pdf()
+                os.rename(self.pdf_path, cached_path)
+        finally:
+            self.template_path.unlink_p()
+            self.pdf_path.unlink_p()
+        return open(cached_path, 'rb')
+
+
+def merge_pdfs(pdf_paths, output_path):
+    """Concatenate the pdf files in order, deleting them afterwards."""
+    merger = PdfFileMerger()
+    try:
+        for pdf_path in pdf_paths:
+            merger.append(str(pdf_path), import_bookmarks=False)
+        with open(output_path, 'wb') as f:
+            merger.write(f)
+    finally:
+        merger.close()
+        for pdf_path in pdf_paths:
+            pdf_path.unlink_p()
+    return output_path
+
+
+def benchmark_pdf_engines(make_renderer, count, concurrency=None):
+    """Time the rendering of `count` documents, built by `make_renderer`,
+    with each of the pdf engines.
+    """
+    timings = {}
+    for name in sorted(_PDF_ENGINES):
+        renderers = [make_renderer() for i in range(count)]
+        start = time.time()
+        try:
+            PdfRenderer.generate_many(renderers,
+                                      get_pdf_engine(name, concurrency))
+            timings[name] = time.time() - start
+        finally:
+            for renderer in renderers:
+                renderer.pdf_path.unlink_p()
+    return timings
+
+
+def _pdf_cache_dir():
+    cache_dir = app.config['UPLOADED_PRINTOUTS_DEST'] / 'cache'
+    cache_dir.makedirs_p()
+    return cache_dir
+
+
+def evict_pdf_cache(max_size=None):
+    """Delete the least recently used cached pdf files until the cache
+    fits in `max_size` bytes, `PDF_CACHE_MAX_SIZE` by default.
+    """
+    if max_size is None:
+        max_size = app.config.get('PDF_CACHE_MAX_SIZE', 512 * 1024 * 1024)
+    files = sorted(_pdf_cache_dir().files('*.pdf'), key=lambda f: f.mtime,
+                   reverse=True)
+    size, count = 0, 0
+    for pdf_path in files:
+        size += pdf_path.size
+        if size > max_size:
+            pdf_path.unlink_p()
+            count += 1
+    return count
+
 
 def _clean_printouts(results):
     count = 0
@@ -102,4 +339,4 @@ def _clean_printouts(results):
         if pdf_path.exists():
             pdf_path.unlink_p()
             count += 1
-    return count
+    return count + evict_pdf_cache()
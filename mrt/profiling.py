@@ -0,0 +1,168 @@
+import json
+import logging
+import threading
+import time
+
+from flask import g, request
+from rq import Worker
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+logger = logging.getLogger('mrt.profiling')
+
+_local = threading.local()
+
+
+class QueryStats(object):
+    """The SQL statements run by one request or rq job.
+
+    Statements are grouped by their text, which holds placeholders for the
+    parameters, so the same query run for each row of a list adds up under
+    a single entry.
+    """
+
+    def __init__(self):
+        self.start = time.time()
+        self.count = 0
+        self.db_time = 0.0
+        self.statements = {}
+
+    def add(self, statement, duration):
+        self.count += 1
+        self.db_time += duration
+        stats = self.statements.get(statement)
+        if stats is None:
+            self.statements[statement] = [1, duration]
+        else:
+            stats[0] += 1
+            stats[1] += duration
+
+    @property
+    def duration(self):
+        return time.time() - self.start
+
+    def repeated(self, threshold):
+        """The statements run at least `threshold` times, N+1 candidates."""
+        return [statement for statement, (count, duration)
+                in self.statements.items() if count >= threshold]
+
+    def top(self, limit=5):
+        """The statements that took the most time."""
+        statements = sorted(self.statements.items(),
+                            key=lambda item: item[1][1], reverse=True)
+        return [{'statement': statement[:500], 'count': count,
+                 'time': round(duration, 4)}
+                for statement, (count, duration) in statements[:limit]]
+
+
+def current_stats():
+    return getattr(_local, 'stats', None)
+
+
+def start_profiling():
+    _local.stats = QueryStats()
+    return _local.stats
+
+
+def stop_profiling():
+    stats, _local.stats = current_stats(), None
+    return stats
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    if current_stats() is not None:
+        conn.info.setdefault('query_start', []).append(time.time())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    stats = current_stats()
+    if stats is not None and conn.info.get('query_start'):
+        stats.add(statement, time.time() - conn.info['query_start'].pop())
+
+
+def _log_stats(app, stats, **details):
+    """Log the stats of a slow request or job, or of one that repeats
+    statements.
+    """
+    repeated = stats.repeated(app.config['SQL_REPEATED_THRESHOLD'])
+    duration = stats.duration
+    if duration < app.config['SLOW_REQUEST_THRESHOLD'] and not repeated:
+        return
+    details.update({
+        'duration': round(duration, 4),
+        'queries': stats.count,
+        'db_time': round(stats.db_time, 4),
+        'repeated': len(repeated),
+        'top_statements': stats.top(),
+    })
+    logger.warning(json.dumps(details, sort_keys=True))
+
+
+def _meeting_id():
+    meeting = getattr(g, 'meeting', None)
+    if meeting is not None:
+        return meeting.id
+    return (request.view_args or {}).get('meeting_id')
+
+
+def init_profiling(app):
+    """Count the SQL statements and the database time of every request.
+
+    The counts are sent as response headers in DEBUG. Slow requests and
+    requests that repeat a statement are logged as a JSON line.
+    """
+    app.config.setdefault('SQL_PROFILING', True)
+    app.config.setdefault('SLOW_REQUEST_THRESHOLD', 1.0)
+    app.config.setdefault('SQL_REPEATED_THRESHOLD', 10)
+    if not app.config['SQL_PROFILING']:
+        return
+
+    @app.before_request
+    def start_request_profiling():
+        start_profiling()
+
+    @app.after_request
+    def profile_request(response):
+        stats = stop_profiling()
+        if stats is None:
+            return response
+        if app.debug:
+            repeated = stats.repeated(app.config['SQL_REPEATED_THRESHOLD'])
+            response.headers['X-SQL-Queries'] = str(stats.count)
+            response.headers['X-SQL-Time'] = '%.4f' % stats.db_time
+            response.headers['X-SQL-Repeated'] = str(len(repeated))
+        _log_stats(app, stats, endpoint=request.endpoint,
+                   method=request.method, meeting_id=_meeting_id(),
+                   status=response.status_code)
+        return response
+
+    @app.teardown_request
+    def clear_request_profiling(exc):
+        stop_profiling()
+
+
+class ProfilingWorker(Worker):
+    """An rq worker that logs the SQL statements of slow jobs."""
+
+    def __init__(self, *args, **kwargs):
+        self.app = kwargs.pop('app')
+        super(ProfilingWorker, self).__init__(*args, **kwargs)
+
+    def perform_job(self, job, *args, **kwargs):
+        if not self.app.config['SQL_PROFILING']:
+            return super(ProfilingWorker, self).perform_job(
+                job, *args, **kwargs)
+        start_profiling()
+        try:
+            return super(ProfilingWorker, self).perform_job(
+                job, *args, **kwargs)
+        finally:
+            stats = stop_profiling()
+            meeting_id = job.args[0] if job.args else None
+            _log_stats(self.app, stats, job=job.func_name, job_id=job.id,
+                       meeting_id=meeting_id)
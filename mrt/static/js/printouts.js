@@ -31,6 +31,12 @@ $(function () {
         job_row.find('.result').html(html);
     };
 
+    Job.prototype.progress = function (progress) {
+        if (progress !== null && progress !== undefined) {
+            $('#' + this.id).find('.progress-value').text(progress + '%');
+        }
+    };
+
     Job.prototype.failed = function () {
         var job_row = $('#' + this.id);
         job_row.addClass('danger');
@@ -42,6 +48,7 @@ $(function () {
         $.doTimeout(job.id, 2000, function () {
             var req = $.getJSON(job_status_url, {'job_id': job.id});
             req.done(function (resp) {
+                job.progress(resp.progress);
                 if(resp.status == FINISHED) {
                     $.doTimeout(job.id);
                     job.finish(resp.result);
@@ -10,8 +10,10 @@ from flask_login import current_user
 from babel.dates import format_date
 from jinja2 import evalcontextfilter, Markup
 from path import Path
+from werkzeug.utils import cached_property
 
 from mrt.definitions import ACTIVITY_ACTIONS, PERMISSIONS_HIERARCHY
+from mrt.models import CustomFieldValue
 from mrt.utils import translate, Logo
 
 
@@ -112,27 +114,67 @@ def inject_static_file(filepath):
     return Markup(data)
 
 
+class _ResolvedLogo(Logo):
+
+    filename = cached_property(Logo.filename.fget, 'filename')
+
+
+class BadgeAssets(object):
+    """Resolve the files used by the badges of one render.
+
+    The logos are resolved once, the backgrounds once per category and the
+    photos of all the participants are loaded with a single query, their
+    crops being looked up in one listing of the crops directory.
+    """
+
+    LOGOS = ('product_logo', 'product_side_logo', 'badge_back_logo')
+
+    def __init__(self, participants):
+        self.logos = dict((slug, _ResolvedLogo(slug)) for slug in self.LOGOS)
+        self.backgrounds = {}
+        self.photos = {}
+        meeting = getattr(g, 'meeting', None)
+        photo_field_id = meeting.photo_field_id if meeting else None
+        participant_ids = [p.id for p in participants]
+        if photo_field_id and participant_ids:
+            self.photos = dict(
+                CustomFieldValue.query
+                .filter(CustomFieldValue.custom_field_id == photo_field_id,
+                        CustomFieldValue.participant_id.in_(participant_ids))
+                .with_entities(CustomFieldValue.participant_id,
+                               CustomFieldValue.value))
+
+    @cached_property
+    def crops(self):
+        crops_dir = (Path(app.config['UPLOADED_CROP_DEST']) /
+                     app.config['PATH_CUSTOM_KEY'])
+        return set(crops_dir.listdir()) if crops_dir.isdir() else set()
+
+    def photo(self, participant):
+        filename = self.photos.get(participant.id)
+        if not filename:
+            return None
+        photo = Path(app.config['PATH_CUSTOM_KEY']) / filename
+        if Path(app.config['UPLOADED_CROP_DEST']) / photo in self.crops:
+            photo = Path(app.config['PATH_CROP_KEY']) / photo
+        return app.config['FILES_PATH'] / photo
+
+    def background(self, category):
+        if category.id not in self.backgrounds:
+            self.backgrounds[category.id] = (
+                app.config['UPLOADED_BACKGROUNDS_DEST'] / category.background
+                if category.background else None)
+        return self.backgrounds[category.id]
+
+    def context(self, participant):
+        context = dict(self.logos)
+        context['participant_photo'] = self.photo(participant)
+        context['background'] = self.background(participant.category)
+        return context
+
+
 def inject_badge_context(participant):
-    product_logo = Logo('product_logo')
-    product_side_logo = Logo('product_side_logo')
-    badge_back_logo = Logo('badge_back_logo')
-
-    participant_photo, background, = None, None
-    if participant.photo:
-        crop_photo = crop(Path(app.config['PATH_CUSTOM_KEY']) /
-                          participant.photo)
-        participant_photo = app.config['FILES_PATH'] / crop_photo
-
-    if participant.category.background:
-        background = (app.config['UPLOADED_BACKGROUNDS_DEST'] /
-                      participant.category.background)
-    return {
-        'product_logo': product_logo,
-        'product_side_logo': product_side_logo,
-        'badge_back_logo': badge_back_logo,
-        'participant_photo': participant_photo,
-        'background': background,
-    }
+    return BadgeAssets([participant]).context(participant)
 
 
 def region_in(region, lang_code='en'):
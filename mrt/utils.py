@@ -1,20 +1,25 @@
+import json
 import os
 import re
+import threading
 import urllib
 
 import openpyxl
 import collections
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font
 from openpyxl.worksheet.datavalidation import DataValidation
 
 from datetime import date, datetime
+from itertools import islice
 from json import JSONEncoder as _JSONEncoder
 from PIL import Image
 from unicodedata import normalize
 from uuid import uuid4
 
-from flask import _request_ctx_stack, current_app as app, g, url_for
+from flask import current_app as app, g, url_for
+from flask import has_request_context, request
 from flask_babel import refresh
 from flask_uploads import IMAGES, UploadSet
 
@@ -181,19 +186,23 @@ def read_file(f):
 
 
 def generate_export_excel(header, rows, filename):
-    workbook = Workbook()
-    sheet = workbook.active
-    sheet.row_dimensions[1].font = Font(bold=True)
+    """Write the rows to an Excel file using a write-only workbook, so the
+    rows can be streamed from an iterator without keeping them in memory.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
 
+    header_cells = []
     for col_idx, name in enumerate(header, 1):
         cell_col_letter = openpyxl.utils.get_column_letter(col_idx)
-        sheet.cell(row=1, column=col_idx).value = name
         sheet.column_dimensions[cell_col_letter].width = len(name) + 1
+        cell = WriteOnlyCell(sheet, value=name)
+        cell.font = Font(bold=True)
+        header_cells.append(cell)
+    sheet.append(header_cells)
 
-    for row_idx, row in enumerate(rows, 2):
-        for col_idx, value in enumerate(row, 1):
-            cell_col_letter = openpyxl.utils.get_column_letter(col_idx)
-            sheet.cell(row=row_idx, column=col_idx).value = unicode(value).encode('utf-8')
+    for row in rows:
+        sheet.append([unicode(value).encode('utf-8') for value in row])
 
     workbook.save(filename)
 
@@ -344,24 +353,117 @@ def read_sheet(xlsx, fields, sheet_name=None):
         yield dict(zip(slug_headers, row))
 
 
+ImportRow = collections.namedtuple('ImportRow', 'excel_row values errors')
+
+
+class ImportFile(object):
+    """The rows of an uploaded import sheet, parsed once.
+
+    The rows are stored next to the uploaded file, in a JSON lines file
+    holding the column slugs on its first line and then, for each row, its
+    Excel row number, its cell values in column order and its validation
+    errors. The counts of rows and of invalid rows are kept in a small
+    summary file, along with the meeting and the participant type the
+    rows are imported for. Rows are read back lazily, one line at a time.
+    """
+
+    def __init__(self, name):
+        if not name or os.path.basename(name) != name:
+            raise ValueError("Invalid import file %r" % name)
+        self.name = name
+        folder = app.config['UPLOADED_PRINTOUTS_DEST']
+        self.xlsx_path = folder / (name + '.xlsx')
+        self.rows_path = folder / (name + '.rows')
+        self.summary_path = folder / (name + '.summary')
+
+    def write(self, columns, rows, meeting_id, participant_type):
+        """Store `rows`, (excel_row, values, errors) tuples with the values
+        in the order of `columns`, to be imported in the meeting.
+        """
+        count = invalid = 0
+        with open(self.rows_path, 'w') as f:
+            f.write(json.dumps(columns) + '\n')
+            for excel_row, values, errors in rows:
+                f.write(json.dumps([excel_row, values, errors]) + '\n')
+                count += 1
+                invalid += bool(errors)
+        self._summary = {'rows': count, 'invalid': invalid,
+                         'meeting_id': meeting_id,
+                         'participant_type': participant_type}
+        with open(self.summary_path, 'w') as f:
+            json.dump(self._summary, f)
+
+    @property
+    def summary(self):
+        if getattr(self, '_summary', None) is None:
+            with open(self.summary_path) as f:
+                self._summary = json.load(f)
+        return self._summary
+
+    def exists(self):
+        return self.rows_path.exists() and self.summary_path.exists()
+
+    def belongs_to(self, meeting_id, participant_type):
+        summary = self.summary
+        return (summary.get('meeting_id') == meeting_id and
+                summary.get('participant_type') == participant_type)
+
+    def _lines(self, start=0, stop=None):
+        with open(self.rows_path) as f:
+            columns = json.loads(next(f))
+            for line in islice(f, start, stop):
+                excel_row, values, errors = json.loads(line)
+                yield ImportRow(excel_row, dict(zip(columns, values)), errors)
+
+    def rows(self):
+        """The values of each row, as `read_sheet` yields them."""
+        for row in self._lines():
+            yield row.values
+
+    def page(self, page, per_page):
+        """The rows of one page, with their Excel row and errors."""
+        start = (page - 1) * per_page
+        return list(self._lines(start, start + per_page))
+
+    def unlink(self):
+        self.xlsx_path.unlink_p()
+        self.rows_path.unlink_p()
+        self.summary_path.unlink_p()
+
+
+_translations = {}
+_translations_lock = threading.Lock()
+_translated = {}
+_TRANSLATED_MAX_SIZE = 10000
+
+
 def get_translation(locale):
-    ctx = _request_ctx_stack.top
-    if ctx is None:
-        return None
-    translations = getattr(ctx, 'translation_%s' % locale.language, None)
+    """The translations catalogue of `locale`.
+
+    Catalogues are read from disk once per process and shared by every
+    request and rq job; they are not changed once loaded.
+    """
+    key = str(locale)
+    translations = _translations.get(key)
     if translations is None:
-        dirname = os.path.join(ctx.app.root_path, 'translations')
-        translations = support.Translations.load(dirname, [locale])
-        setattr(ctx, 'translation_%s' % locale.language, translations)
+        with _translations_lock:
+            translations = _translations.get(key)
+            if translations is None:
+                dirname = os.path.join(app.root_path, 'translations')
+                translations = support.Translations.load(dirname, [locale])
+                _translations[key] = translations
     return translations
 
 
 def translate(text, lang_code='en'):
-    locale = Locale(lang_code)
-    translations = get_translation(locale)
-    if translations:
-        return translations.gettext(text).decode('unicode-escape')
-    return text
+    key = (lang_code, text)
+    translated = _translated.get(key)
+    if translated is None:
+        translations = get_translation(Locale(lang_code))
+        translated = translations.gettext(text).decode('unicode-escape')
+        if len(_translated) < _TRANSLATED_MAX_SIZE:
+            _translated[key] = translated
+    return translated
 
 
 def set_language(lang='english'):
@@ -373,6 +475,10 @@ def set_language(lang='english'):
         g.language_verbose = LANGUAGES_ISO_MAP.get(lang, 'english')
     g.language = iso
     refresh()
+    # Switch the request to the shared catalogue instead of having
+    # Flask-Babel read it again from disk.
+    if has_request_context():
+        request.babel_translations = get_translation(Locale.parse(iso))
 
 
 def validate_email(email):
@@ -0,0 +1,5 @@
+"""Benchmarks of the participant printouts, exports, imports and filters
+against a generated meeting of production size.
+
+Run them with ``python -m testsuite.benchmarks --help``.
+"""
@@ -0,0 +1,80 @@
+import json
+import shutil
+import tempfile
+
+import click
+from path import Path
+
+from mrt.app import create_app
+from mrt.models import db
+
+from .generator import MeetingGenerator
+from .scenarios import SCENARIOS, run_scenarios
+
+
+def _create_app(database, media_folder):
+    folders = {}
+    for name in ('backgrounds', 'custom_uploads', 'thumbnails', 'crops',
+                 'printouts', 'logos'):
+        folders[name] = media_folder / name
+        folders[name].makedirs_p()
+    config = {
+        'SECRET_KEY': 'benchmark',
+        'SQLALCHEMY_DATABASE_URI': database,
+        'UPLOADED_BACKGROUNDS_DEST': folders['backgrounds'],
+        'UPLOADED_CUSTOM_DEST': folders['custom_uploads'],
+        'UPLOADED_PRINTOUTS_DEST': folders['printouts'],
+        'UPLOADED_THUMBNAIL_DEST': folders['thumbnails'],
+        'UPLOADED_CROP_DEST': folders['crops'],
+        'MEDIA_THUMBNAIL_FOLDER': folders['thumbnails'],
+        'UPLOADED_LOGOS_DEST': folders['logos'],
+        'MEDIA_FOLDER': media_folder,
+        'HOSTNAME': 'http://localhost/',
+        'MAIL_DEFAULT_SENDER': 'no-reply@localhost',
+        'MAIL_SUPPRESS_SEND': True,
+        'WTF_CSRF_ENABLED': False,
+    }
+    return create_app(config, skip_logging=True)
+
+
+@click.command()
+@click.option('--database', default='sqlite://',
+              help='Empty database to generate the meeting in')
+@click.option('--participants', type=int, default=1000)
+@click.option('--fields-per-type', type=int, default=1,
+              help='Added custom fields of each custom field type')
+@click.option('--choices', type=int, default=5)
+@click.option('--categories', type=int, default=10)
+@click.option('--rules', type=int, default=5)
+@click.option('--import-rows', type=int, default=500)
+@click.option('--registrations', type=int, default=20)
+@click.option('--seed', type=int, default=0)
+@click.option('--scenario', 'scenarios', multiple=True,
+              type=click.Choice(list(SCENARIOS)),
+              help='Scenarios to run, all of them by default')
+def main(database, participants, fields_per_type, choices, categories,
+         rules, import_rows, registrations, seed, scenarios):
+    """Generate a large meeting and time the participant scenarios on it."""
+    media_folder = Path(tempfile.mkdtemp())
+    app = _create_app(database, media_folder)
+    try:
+        with app.app_context():
+            db.create_all()
+            with app.test_request_context():
+                generator = MeetingGenerator(
+                    participants=participants,
+                    fields_per_type=fields_per_type, choices=choices,
+                    categories=categories, rules=rules,
+                    import_rows=import_rows, registrations=registrations,
+                    seed=seed)
+                meeting = generator.generate()
+            for result in run_scenarios(app, meeting, generator, scenarios):
+                click.echo(json.dumps(result))
+            db.session.remove()
+            db.drop_all()
+    finally:
+        shutil.rmtree(media_folder)
+
+
+if __name__ == '__main__':
+    main()
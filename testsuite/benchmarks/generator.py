@@ -0,0 +1,222 @@
+import random
+from datetime import date, datetime, timedelta
+
+from mrt.custom_country import get_all_countries
+from mrt.definitions import REPRESENTING_REGIONS
+from mrt.forms.meetings import add_custom_fields_for_meeting
+from mrt.forms.meetings import MediaParticipantDummyForm
+from mrt.models import db, CustomField, CustomFieldChoice, CustomFieldValue
+from mrt.models import Participant, Phrase, PhraseDefault, Translation
+from mrt.utils import copy_attributes
+
+from testsuite.factories import MeetingFactory, MeetingTypeFactory
+from testsuite.factories import MeetingCategoryFactory, CustomFieldFactory
+from testsuite.factories import ParticipantFactory, RuleFactory
+from testsuite.factories import ConditionFactory, ConditionValueFactory
+from testsuite.factories import ActionFactory
+
+
+# The category field of a meeting is its primary category_id field, the
+# added fields cover the other types.
+ADDED_FIELD_TYPES = [code for code, label in CustomField.CUSTOM_FIELDS
+                     if code != CustomField.CATEGORY]
+
+CHOICE_FIELD_TYPES = (CustomField.SELECT, CustomField.RADIO,
+                      CustomField.MULTI_CHECKBOX)
+
+WORDS = ('lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur',
+         'adipiscing', 'elit', 'sed', 'eiusmod', 'tempor', 'incididunt')
+
+
+class MeetingGenerator(object):
+    """Build a meeting of production size out of the test factories.
+
+    The meeting gets `participants` participants, `fields_per_type` added
+    custom fields of every custom field type, `choices` choices for each
+    select, radio and multi checkbox field, `categories` categories and
+    `rules` registration rules. The data is drawn from a random generator
+    seeded with `seed`, the same arguments build the same meeting.
+
+    `import_rows` and `registrations` size the import and registration
+    scenarios run against the meeting.
+    """
+
+    CHUNK_SIZE = 500
+
+    def __init__(self, participants=1000, fields_per_type=1, choices=5,
+                 categories=10, rules=5, import_rows=500, registrations=20,
+                 seed=0):
+        self.participants = participants
+        self.fields_per_type = fields_per_type
+        self.choices = choices
+        self.categories = categories
+        self.rules = rules
+        self.import_rows = import_rows
+        self.registrations = registrations
+        self.random = random.Random(seed)
+        self.countries = [code for code, name in get_all_countries()]
+
+    def generate(self):
+        meeting_type = MeetingTypeFactory()
+        meeting_type.load_default_phrases()
+        meeting = MeetingFactory(meeting_type=meeting_type,
+                                 online_registration=True)
+        self._add_phrases(meeting)
+        add_custom_fields_for_meeting(meeting)
+        add_custom_fields_for_meeting(meeting,
+                                      form_class=MediaParticipantDummyForm)
+
+        categories = [
+            MeetingCategoryFactory(meeting=meeting, sort=i,
+                                   title__english='Category %d' % i)
+            for i in range(self.categories)]
+        fields = self._add_custom_fields(meeting)
+        self._add_rules(meeting, fields)
+        self._add_participants(meeting, categories, fields)
+        return meeting
+
+    def _add_phrases(self, meeting):
+        phrases_default = PhraseDefault.query.filter_by(
+            meeting_type_slug=meeting.meeting_type_slug)
+        for phrase_default in phrases_default:
+            phrase = copy_attributes(Phrase(), phrase_default)
+            phrase.description = (
+                copy_attributes(Translation(), phrase_default.description)
+                if phrase_default.description else Translation(english=''))
+            phrase.meeting = meeting
+            db.session.add(phrase)
+        db.session.commit()
+
+    def _add_custom_fields(self, meeting):
+        fields = []
+        sort = meeting.custom_fields.count()
+        for field_type in ADDED_FIELD_TYPES:
+            for i in range(self.fields_per_type):
+                sort += 1
+                field = CustomFieldFactory(
+                    meeting=meeting, field_type=field_type, required=False,
+                    label__english='%s %d' % (field_type, i), sort=sort)
+                if field_type in CHOICE_FIELD_TYPES:
+                    for j in range(self.choices):
+                        db.session.add(CustomFieldChoice(
+                            custom_field=field,
+                            value=Translation(english='Choice %d' % j)))
+                    db.session.commit()
+                fields.append(field)
+        return fields
+
+    def _add_rules(self, meeting, fields):
+        selects = [f for f in fields if f.field_type == CustomField.SELECT]
+        texts = [f for f in fields if f.field_type == CustomField.TEXT]
+        if not selects or not texts:
+            return
+        for i in range(self.rules):
+            rule = RuleFactory(meeting=meeting)
+            select = selects[i % len(selects)]
+            condition = ConditionFactory(rule=rule, field=select)
+            choice = self.random.choice(select.choices.all())
+            ConditionValueFactory(condition=condition, value=unicode(choice))
+            ActionFactory(rule=rule, field=texts[i % len(texts)],
+                          is_visible=True, is_required=bool(i % 2))
+
+    def _add_participants(self, meeting, categories, fields):
+        choices = dict((f.id, f.choices.all()) for f in fields
+                       if f.field_type in CHOICE_FIELD_TYPES)
+        registration_date = datetime(2020, 1, 1)
+        for start in range(0, self.participants, self.CHUNK_SIZE):
+            end = min(start + self.CHUNK_SIZE, self.participants)
+            for i in range(start, end):
+                participant = ParticipantFactory.build(
+                    meeting=meeting,
+                    category=self.random.choice(categories),
+                    first_name=self._words(1).title(),
+                    last_name=self._words(1).title(),
+                    email='participant%d@%s.com' % (i, meeting.acronym),
+                    country=self.random.choice(self.countries),
+                    represented_country=self.random.choice(self.countries),
+                    represented_region=self.random.choice(
+                        REPRESENTING_REGIONS)[0],
+                    registration_date=registration_date +
+                    timedelta(minutes=i),
+                    attended=self.random.random() < 0.5,
+                    verified=self.random.random() < 0.5,
+                    credentials=self.random.random() < 0.5)
+                db.session.add(participant)
+                for field in fields:
+                    db.session.add_all(self._values(
+                        field, participant, choices.get(field.id)))
+            db.session.commit()
+
+    def _values(self, field, participant, choices):
+        field_type = field.field_type.code
+        if field_type == CustomField.MULTI_CHECKBOX:
+            return [CustomFieldValue(custom_field=field,
+                                     participant=participant, choice=choice)
+                    for choice in self.random.sample(
+                        choices, min(2, len(choices)))]
+        value = CustomFieldValue(custom_field=field, participant=participant)
+        if field_type in (CustomField.SELECT, CustomField.RADIO):
+            value.choice = self.random.choice(choices)
+            value.value = value.choice.value.english
+        elif field_type in (CustomField.CHECKBOX, CustomField.EVENT):
+            value.value = self.random.choice(('true', 'false'))
+        elif field_type == CustomField.DATE:
+            value.value = str(date(2020, 1, 1) +
+                              timedelta(days=self.random.randint(0, 365)))
+        elif field_type == CustomField.EMAIL:
+            value.value = 'contact.%s' % participant.email
+        elif field_type == CustomField.COUNTRY:
+            value.value = self.random.choice(self.countries)
+        elif field_type == CustomField.LANGUAGE:
+            value.value = self.random.choice(
+                [code for code, label in Participant.LANGUAGE_CHOICES])
+        elif field_type in (CustomField.IMAGE, CustomField.DOCUMENT):
+            value.value = '%s_%s.png' % (field.slug, participant.email)
+        else:
+            value.value = self._words(8)
+        return [value]
+
+    def excel_rows(self, meeting, count):
+        """Rows as `read_sheet` yields them from the participants Excel
+        template of the meeting, for the import scenarios.
+        """
+        fields = (meeting.custom_fields
+                  .filter_by(custom_field_type=CustomField.PARTICIPANT)
+                  .filter(CustomField.field_type != CustomField.EVENT)
+                  .order_by(CustomField.sort).all())
+        categories = [c.title.english for c in meeting.categories]
+        countries = dict(get_all_countries())
+        rows = []
+        for i in range(count):
+            row = {}
+            for field in fields:
+                row[field.slug] = self._excel_value(
+                    field, i, categories, countries)
+            rows.append(row)
+        return fields, rows
+
+    def _excel_value(self, field, i, categories, countries):
+        field_type = field.field_type.code
+        if field_type == CustomField.CATEGORY:
+            return self.random.choice(categories)
+        if field_type == CustomField.COUNTRY:
+            return countries[self.random.choice(self.countries)]
+        if field_type in CHOICE_FIELD_TYPES:
+            choices = [unicode(c) for c in field.choices]
+            if field_type == CustomField.MULTI_CHECKBOX:
+                return ', '.join(
+                    self.random.sample(choices, min(2, len(choices))))
+            return self.random.choice(choices)
+        if field_type == CustomField.DATE:
+            return '15.06.2020'
+        if field_type == CustomField.EMAIL:
+            return 'imported%d@example.com' % i
+        if field_type == CustomField.LANGUAGE:
+            return 'English'
+        if field_type in (CustomField.CHECKBOX, CustomField.EVENT,
+                          CustomField.IMAGE, CustomField.DOCUMENT):
+            return ''
+        return self._words(2).title()
+
+    def _words(self, count):
+        return ' '.join(self.random.choice(WORDS) for i in range(count))
@@ -0,0 +1,161 @@
+import json
+import resource
+import time
+from collections import OrderedDict
+from urllib import urlencode
+
+from flask import g, render_template, url_for
+from sqlalchemy import event
+
+from mrt.forms.meetings import custom_form_factory, ParticipantEditForm
+from mrt.meetings.printouts import ProvisionalList
+from mrt.meetings.printouts import _process_export_participants_excel
+from mrt.meetings.printouts import read_participants_excel
+from mrt.models import db, Category, Participant
+
+from testsuite.factories import ParticipantFactory, StaffFactory
+from testsuite.factories import UserFactory
+from testsuite.utils import populate_participant_form
+
+
+class QueryCounter(object):
+    """Count the statements executed on `engine` while in the block."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+
+def _peak_memory():
+    """The peak resident memory of the process, in kilobytes."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(name, scenario, *args):
+    """Run `scenario` and report its duration, the number of SQL statements
+    it executed and the growth of the peak memory of the process.
+    """
+    db.session.expire_all()
+    peak = _peak_memory()
+    with QueryCounter(db.engine) as counter:
+        start = time.time()
+        scenario(*args)
+        duration = time.time() - start
+    return OrderedDict([
+        ('scenario', name),
+        ('seconds', round(duration, 3)),
+        ('queries', counter.count),
+        ('peak_memory_kb', _peak_memory()),
+        ('peak_memory_growth_kb', _peak_memory() - peak),
+    ])
+
+
+def provisional_list(app, meeting, generator):
+    with app.test_request_context():
+        g.meeting = meeting
+        fields = ProvisionalList._get_default_field_ids()
+        ProvisionalList.get_participants(selected_field_ids=fields,
+                                         page=None)
+
+
+def export_participants_excel(app, meeting, generator):
+    with app.test_request_context():
+        _process_export_participants_excel(meeting.id,
+                                           Participant.PARTICIPANT)
+
+
+def import_participants_excel(app, meeting, generator):
+    with app.test_request_context():
+        g.meeting = meeting
+        fields, rows = generator.excel_rows(meeting, generator.import_rows)
+        for form in read_participants_excel(fields, rows,
+                                            ParticipantEditForm):
+            form.validate()
+
+
+def translate_representing(app, meeting, generator):
+    """Render the translated region and country of every participant, as
+    done for the representing column of the printouts.
+    """
+    template = app.jinja_env.get_template(str(
+        app.config['REPRESENTING_TEMPLATES'] /
+        'region_country_translated.html'))
+    with app.test_request_context():
+        g.meeting = meeting
+        for participant in Participant.query.filter_by(meeting=meeting):
+            render_template(template, participant=participant)
+
+
+def build_custom_form(app, meeting, generator):
+    with app.test_request_context():
+        g.meeting = meeting
+        app.extensions.pop('custom_form_classes', None)
+        Form = custom_form_factory(ParticipantEditForm)
+        Form()
+
+
+def registration_post(app, meeting, generator):
+    category = Category.query.filter_by(
+        meeting=meeting, category_type=Category.PARTICIPANT).first()
+    client = app.test_client()
+    with app.test_request_context():
+        url = url_for('meetings.registration',
+                      meeting_acronym=meeting.acronym)
+        for i in range(generator.registrations):
+            data = ParticipantFactory.attributes()
+            data['category_id'] = category.id
+            data['email'] = 'registered%d@%s.com' % (i, meeting.acronym)
+            populate_participant_form(meeting, data)
+            resp = client.post(url, data=data)
+            assert resp.status_code == 200
+
+
+def participants_filter(app, meeting, generator):
+    user = UserFactory(is_superuser=True)
+    StaffFactory(user=user)
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user.id
+    pages = [
+        {'order[0][column]': 0, 'order[0][dir]': 'asc', 'start': 0},
+        {'order[0][column]': 0, 'order[0][dir]': 'desc', 'start': 500},
+        {'order[0][column]': 1, 'order[0][dir]': 'asc', 'start': 100},
+        {'order[0][column]': 0, 'order[0][dir]': 'asc', 'start': 0,
+         'search[value]': 'lorem'},
+    ]
+    with app.test_request_context():
+        url = url_for('meetings.participants_filter', meeting_id=meeting.id)
+        for params in pages:
+            data = {'columns[0][data]': 'order',
+                    'columns[1][data]': 'last_name',
+                    'length': 50}
+            data.update(params)
+            resp = client.get(url + '?' + urlencode(data))
+            assert resp.status_code == 200
+            json.loads(resp.data)
+
+
+SCENARIOS = OrderedDict([
+    ('provisional_list', provisional_list),
+    ('export_participants_excel', export_participants_excel),
+    ('import_participants_excel', import_participants_excel),
+    ('translate_representing', translate_representing),
+    ('custom_form_factory', build_custom_form),
+    ('registration_post', registration_post),
+    ('participants_filter', participants_filter),
+])
+
+
+def run_scenarios(app, meeting, generator, names=None):
+    return [measure(name, SCENARIOS[name], app, meeting, generator)
+            for name in (names or SCENARIOS)]
@@ -78,6 +78,23 @@ def test_default_custom_field_edit(app, user):
         assert field.required is False
 
 
+def test_default_custom_field_edit_label(app, user):
+    field = CustomFieldFactory(meeting=None)
+    data = CustomFieldFactory.attributes()
+    data.pop('meeting')
+    data['label-english'] = 'New label'
+    data['hint-english'] = 'New hint'
+    client = app.test_client()
+    with app.test_request_context():
+        with client.session_transaction() as sess:
+            sess['user_id'] = user.id
+        resp = client.post(url_for('admin.custom_field_edit',
+                                   custom_field_id=field.id), data=data)
+        assert resp.status_code == 302
+        assert field.label.english == 'New label'
+        assert field.hint.english == 'New hint'
+
+
 def test_default_custom_field_delete(app, user):
     field = CustomFieldFactory(meeting=None)
     client = app.test_client()
@@ -0,0 +1,32 @@
+from mrt.models import CustomField, CustomFieldValue, Participant
+
+from .benchmarks.generator import MeetingGenerator, ADDED_FIELD_TYPES
+from .benchmarks.scenarios import SCENARIOS, run_scenarios
+
+
+def test_generated_meeting(app):
+    with app.test_request_context():
+        generator = MeetingGenerator(participants=12, categories=3, rules=2)
+        meeting = generator.generate()
+        added_fields = meeting.custom_fields.filter_by(
+            is_primary=False, custom_field_type=CustomField.PARTICIPANT)
+        assert (sorted(f.field_type.code for f in added_fields) ==
+                sorted(ADDED_FIELD_TYPES))
+        assert meeting.categories.count() == 3
+        assert len(meeting.rules) == 2
+        participants = Participant.query.filter_by(meeting=meeting)
+        assert participants.count() == 12
+        assert CustomFieldValue.query.join(Participant).filter(
+            Participant.meeting == meeting).count() > 12 * len(
+                ADDED_FIELD_TYPES)
+
+
+def test_benchmark_scenarios(app):
+    with app.test_request_context():
+        generator = MeetingGenerator(participants=12, categories=3, rules=2,
+                                     import_rows=3, registrations=2)
+        meeting = generator.generate()
+    results = run_scenarios(app, meeting, generator)
+    assert [r['scenario'] for r in results] == list(SCENARIOS)
+    for result in results:
+        assert result['queries'] > 0
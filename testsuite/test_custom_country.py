@@ -0,0 +1,43 @@
+from wtforms import Form
+
+from mrt.custom_country import Country, country_in, get_all_countries
+from mrt.custom_country import get_country_catalogue
+from mrt.forms.fields import CountryField
+
+
+def test_country_catalogue(app):
+    with app.test_request_context():
+        catalogue = get_country_catalogue()
+        assert catalogue is get_country_catalogue('en')
+        assert Country('RO').name == u'Romania'
+        assert Country('XX').name == ''
+        assert catalogue.codes_by_name[u'romania'] == 'RO'
+        names = [name for code, name in get_all_countries()]
+        assert names == sorted(names)
+        assert 'ZZ' not in catalogue.names
+
+
+def test_country_catalogue_customized_countries(app):
+    app.config['CUSTOMIZED_COUNTRIES'] = {
+        'MK': {'en': u'North Macedonia', 'fr': u'Mac\xe9doine du Nord'},
+    }
+    with app.test_request_context():
+        assert Country('MK').name == u'North Macedonia'
+        assert country_in(Country('MK'), 'fr') == u'Mac\xe9doine du Nord'
+        assert country_in(Country('RO'), 'fr') == u'Roumanie'
+
+        app.config['CUSTOMIZED_COUNTRIES'] = {
+            'MK': {'en': u'Macedonia', 'fr': u'Mac\xe9doine'},
+        }
+        assert Country('MK').name == u'Macedonia'
+        assert get_country_catalogue().codes_by_name[u'macedonia'] == 'MK'
+
+
+def test_optional_country_field_choices(app):
+    class CountryForm(Form):
+        country = CountryField()
+
+    with app.test_request_context():
+        form = CountryForm()
+        assert form.country.concrete_choices[0] == ('', '---')
+        assert 'value="RO"' in form.country()
@@ -0,0 +1,96 @@
+import threading
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+import pytest
+from path import Path
+
+from mrt.fetch import FetchError, FetchedFile, FileFetcher
+
+
+PHOTO = b'\x89PNG' + b'0' * 1024
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    hits = {}
+
+    def do_GET(self):
+        self.hits[self.path] = self.hits.get(self.path, 0) + 1
+        if self.path.startswith('/photo'):
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(PHOTO)))
+            self.end_headers()
+            self.wfile.write(PHOTO)
+        elif self.path == '/big':
+            # no content length, the size is only known while reading
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.end_headers()
+            self.wfile.write(PHOTO * 4)
+        else:
+            self.send_response(404)
+            self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_server(request):
+    _Handler.hits = {}
+    server = _Server(('127.0.0.1', 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    request.addfinalizer(server.shutdown)
+    return 'http://127.0.0.1:%d' % server.server_address[1]
+
+
+def test_fetch_files(app, http_server):
+    urls = ['%s/photo%d.png' % (http_server, i) for i in range(10)]
+    with app.test_request_context():
+        fetcher = FileFetcher(concurrency=4, max_size=2 * len(PHOTO))
+        files = fetcher.fetch_all(urls + urls)
+        assert sorted(files) == sorted(urls)
+        for url in urls:
+            fetched = files[url]
+            assert isinstance(fetched, FetchedFile)
+            assert fetched.filename.endswith('.png')
+            assert Path(fetched.path).bytes() == PHOTO
+        # each url is downloaded once
+        assert set(_Handler.hits.values()) == {1}
+
+        fetcher.fetch_all(urls[:2])
+        assert set(_Handler.hits.values()) == {1}
+
+        paths = [files[url].path for url in urls]
+        fetcher.cleanup()
+        assert not any(Path(path).exists() for path in paths)
+
+
+def test_fetch_files_errors(app, http_server):
+    big, missing = http_server + '/big', http_server + '/missing'
+    with app.test_request_context():
+        fetcher = FileFetcher(concurrency=2, max_size=2 * len(PHOTO))
+        files = fetcher.fetch_all([big, missing])
+        assert isinstance(files[big], FetchError)
+        assert 'larger than' in str(files[big])
+        assert isinstance(files[missing], FetchError)
+        assert not fetcher.fetch_dir.files()
+
+
+def test_fetched_file_save(app, http_server, tmpdir):
+    url = http_server + '/photo.png'
+    with app.test_request_context():
+        fetcher = FileFetcher()
+        fetched = fetcher.fetch_all([url])[url]
+        target = str(tmpdir.join('saved.png'))
+        fetched.save(target)
+        assert Path(target).bytes() == PHOTO
+        fetcher.cleanup()
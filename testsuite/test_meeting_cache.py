@@ -0,0 +1,154 @@
+import os
+import re
+import time
+from base64 import b64decode
+
+import pytest
+from flask import g, url_for
+from pyquery import PyQuery
+from sqlalchemy import event
+
+from mrt import cache
+from mrt.forms.meetings import add_custom_fields_for_meeting
+from mrt.models import db, redis_store, Phrase
+from .factories import MeetingCategoryFactory, ParticipantFactory
+from .factories import PhraseMeetingFactory
+
+
+# Point this at a redis database that can be flushed to run the tests of
+# the cache itself, e.g. redis://localhost:6379/15
+REDIS_URL = os.environ.get('MRT_TEST_REDIS_URL')
+
+
+@pytest.fixture
+def invalidated(monkeypatch):
+    meeting_ids = []
+    monkeypatch.setattr(cache, 'invalidate_meeting_cache',
+                        meeting_ids.append)
+    return meeting_ids
+
+
+@pytest.yield_fixture
+def redis_app(app):
+    if not REDIS_URL:
+        pytest.skip('MRT_TEST_REDIS_URL is not set')
+    app.config['REDIS_URL'] = REDIS_URL
+    app.config['MEETING_CACHE_TTL'] = 60
+    redis_store.init_app(app)
+    redis_store.flushdb()
+    yield app
+    redis_store.flushdb()
+
+
+def _header_phrase(meeting, text):
+    return PhraseMeetingFactory(meeting=meeting,
+                                group=Phrase.ONLINE_REGISTRATION,
+                                name=Phrase.HEADER_PARTICIPANTS,
+                                description__english=text)
+
+
+def test_meeting_cache_invalidated_by_changes(app, invalidated):
+    category = MeetingCategoryFactory()
+    meeting = category.meeting
+    del invalidated[:]
+
+    ParticipantFactory(meeting=meeting, category=category)
+    assert invalidated == []
+
+    phrase = _header_phrase(meeting, 'Welcome')
+    assert invalidated == [meeting.id]
+
+    meeting.online_registration = not meeting.online_registration
+    db.session.commit()
+    assert invalidated == [meeting.id, meeting.id]
+
+    with app.test_request_context():
+        g.meeting = meeting
+        phrase.description.english = 'Welcome again'
+        db.session.commit()
+        assert invalidated == [meeting.id] * 3
+
+        meeting.title.english = 'Renamed meeting'
+        db.session.commit()
+        assert invalidated == [meeting.id] * 4
+
+
+def test_meeting_cache_serves_registration(redis_app, default_meeting):
+    category = MeetingCategoryFactory(meeting__online_registration=True)
+    meeting = category.meeting
+    phrase = _header_phrase(meeting, 'Welcome')
+
+    statements = []
+
+    def _record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    client = redis_app.test_client()
+    with redis_app.test_request_context():
+        add_custom_fields_for_meeting(meeting)
+        url = url_for('meetings.registration', meeting_acronym=meeting.acronym)
+        client.get(url)
+
+        event.listen(db.engine, 'before_cursor_execute', _record)
+        try:
+            resp = client.get(url)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', _record)
+        assert 'Welcome' in PyQuery(resp.data)('h4').text()
+        assert not [s for s in statements
+                    if re.search(r'FROM (meeting|phrase)\b', s)]
+
+        g.meeting = meeting
+        phrase.description.english = 'Welcome again'
+        db.session.commit()
+        resp = client.get(url)
+        assert 'Welcome again' in PyQuery(resp.data)('h4').text()
+
+
+def test_registration_page_time_trap_token(app, default_meeting):
+    category = MeetingCategoryFactory(meeting__online_registration=True)
+    meeting = category.meeting
+
+    client = app.test_client()
+    with app.test_request_context():
+        add_custom_fields_for_meeting(meeting)
+        resp = client.get(url_for('meetings.registration',
+                                  meeting_acronym=meeting.acronym))
+        ts = PyQuery(resp.data)('#ts_').val()
+        assert abs(int(b64decode(ts)) - time.time()) < 60
+
+
+def test_registration_page_cache(redis_app, default_meeting):
+    redis_app.config['REGISTRATION_PAGE_CACHE_TTL'] = 60
+    category = MeetingCategoryFactory(meeting__online_registration=True,
+                                      title__english='Observer')
+    meeting = category.meeting
+
+    statements = []
+
+    def _record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    client = redis_app.test_client()
+    with redis_app.test_request_context():
+        add_custom_fields_for_meeting(meeting)
+        url = url_for('meetings.registration', meeting_acronym=meeting.acronym)
+        client.get(url)
+
+        event.listen(db.engine, 'before_cursor_execute', _record)
+        try:
+            resp = client.get(url)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', _record)
+        html = PyQuery(resp.data)
+        assert 'Observer' in html('#category_id').text()
+        assert html('#ts_').val() != 'registration-ts-placeholder'
+        assert statements == []
+
+        g.meeting = meeting
+        category.title.english = 'Member'
+        db.session.commit()
+        resp = client.get(url)
+        html = PyQuery(resp.data)
+        assert 'Member' in html('#category_id').text()
+        assert 'Observer' not in html('#category_id').text()
@@ -2,12 +2,15 @@ from flask import url_for, g
 from pyquery import PyQuery
 from py.path import local
 from StringIO import StringIO
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload
 
-from mrt.models import Category, Participant
+from mrt.models import db, Category, Participant
 from mrt.pdf import PdfRenderer
+from mrt.template import BadgeAssets
 from mrt.utils import Logo
 from .factories import MeetingFactory, ParticipantFactory
-from .factories import MeetingCategoryFactory
+from .factories import MeetingCategoryFactory, ProfilePictureFactory
 
 
 def test_meeting_default_logos(app, user, brand_dir):
@@ -227,3 +230,55 @@ def upload_new_logo(app, user, meeting_id, logo_slug, new_logo):
                            data={'logo': new_logo})
         assert resp.status_code == 200
         return resp
+
+
+def test_pdf_badge_assets_resolved_once(app, brand_dir):
+    category = MeetingCategoryFactory(category_type=Category.PARTICIPANT,
+                                      background='background.png')
+    meeting = category.meeting
+    photo_field = ProfilePictureFactory(
+        participant__meeting=meeting,
+        participant__category=category,
+        custom_field__meeting=meeting, value='cropped.png').custom_field
+    meeting.photo_field = photo_field
+    for value in ('first.png', 'second.png'):
+        ProfilePictureFactory(participant__meeting=meeting,
+                              participant__category=category,
+                              custom_field=photo_field, value=value)
+    pictures = photo_field.custom_field_values.all()
+    crop_dir = local(app.config['UPLOADED_CROP_DEST']).join(
+        app.config['PATH_CUSTOM_KEY'])
+    crop_dir.ensure(pictures[0].value)
+
+    statements = []
+
+    def count_statements(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app.test_request_context():
+        g.meeting = meeting
+        participants = (Participant.query
+                        .options(joinedload(Participant.category)).all())
+        meeting.photo_field_id
+        event.listen(db.engine, 'before_cursor_execute', count_statements)
+        try:
+            assets = BadgeAssets(participants)
+            contexts = [assets.context(p) for p in participants]
+        finally:
+            event.remove(db.engine, 'before_cursor_execute',
+                         count_statements)
+
+    assert len(statements) == 1
+    photos = dict((p.id, c['participant_photo'])
+                  for p, c in zip(participants, contexts))
+    cropped = pictures[0]
+    assert photos[cropped.participant.id] == (
+        app.config['FILES_PATH'] / app.config['PATH_CROP_KEY'] /
+        app.config['PATH_CUSTOM_KEY'] / cropped.value)
+    for picture in pictures[1:]:
+        assert photos[picture.participant.id] == (
+            app.config['FILES_PATH'] / app.config['PATH_CUSTOM_KEY'] /
+            picture.value)
+    for context in contexts:
+        assert context['background'] == (
+            app.config['UPLOADED_BACKGROUNDS_DEST'] / 'background.png')
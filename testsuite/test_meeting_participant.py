@@ -1,4 +1,6 @@
-from flask import url_for
+from datetime import datetime, timedelta
+
+from flask import g, url_for
 from pyquery import PyQuery
 from py.path import local
 from jinja2 import FileSystemLoader
@@ -19,8 +21,8 @@ from mrt.forms.fields import EmailRequired
 from mrt.forms.meetings import (add_custom_fields_for_meeting,
                                 MediaParticipantDummyForm)
 from mrt.mail import mail
-from mrt.models import Participant, CustomField, Category, ActivityLog
-from mrt.models import CustomFieldValue
+from mrt.models import db, Participant, CustomField, Category, ActivityLog
+from mrt.models import CustomFieldValue, search_for_participant
 from mrt.utils import translate
 
 from testsuite.utils import populate_participant_form, add_multicheckbox_field
@@ -57,6 +59,66 @@ def test_meeting_participant_list(app, user):
                     == Participant.PARTICIPANT)
 
 
+def _filter_participants(app, meeting, **params):
+    data = {
+        'columns[0][data]': 'order',
+        'columns[1][data]': 'last_name',
+        'order[0][column]': 0,
+        'order[0][dir]': 'asc',
+    }
+    data.update(params)
+    url = url_for('meetings.participants_filter', meeting_id=meeting.id)
+    resp = app.client.get(url + '?' + urlencode(data))
+    assert resp.status_code == 200
+    return json.loads(resp.data)
+
+
+def test_meeting_participant_list_pages(app, user):
+    category = MeetingCategoryFactory()
+    meeting = category.meeting
+    first_date = datetime(2020, 1, 1)
+    # registered in the reverse order of their ids
+    for i in range(12):
+        ParticipantFactory(category=category, last_name='Doe%d' % i,
+                           registration_date=first_date - timedelta(days=i))
+    with app.test_request_context():
+        with app.client.session_transaction() as sess:
+            sess['user_id'] = user.id
+
+        resp_data = _filter_participants(app, meeting, start=5, length=5)
+        assert resp_data['recordsTotal'] == 12
+        assert resp_data['recordsFiltered'] == 12
+        assert [p['order'] for p in resp_data['data']] == [6, 7, 8, 9, 10]
+        assert [p['last_name'].count('Doe%d' % (12 - p['order']))
+                for p in resp_data['data']] == [1] * 5
+
+        resp_data = _filter_participants(app, meeting, start=10, length=5,
+                                         **{'order[0][dir]': 'desc'})
+        assert [p['order'] for p in resp_data['data']] == [2, 1]
+
+        resp_data = _filter_participants(app, meeting, start=0, length=5,
+                                         **{'order[0][column]': 1,
+                                            'search[value]': 'Doe1'})
+        assert resp_data['recordsTotal'] == 12
+        assert resp_data['recordsFiltered'] == 3
+        assert [p['order'] for p in resp_data['data']] == [11, 2, 1]
+
+        Participant.query.filter_by(last_name='Doe0').one().deleted = True
+        ParticipantFactory(category=category, last_name='Doe12',
+                           registration_date=first_date)
+        db.session.commit()
+        resp_data = _filter_participants(app, meeting, start=10, length=5)
+        assert resp_data['recordsTotal'] == 12
+        assert [p['order'] for p in resp_data['data']] == [11, 12]
+
+        Participant.query.filter_by(last_name='Doe12').one().deleted = True
+        db.session.commit()
+        resp_data = _filter_participants(app, meeting, start=0, length=5,
+                                         **{'order[0][dir]': 'desc'})
+        assert resp_data['recordsTotal'] == 11
+        assert [p['order'] for p in resp_data['data']] == [11, 10, 9, 8, 7]
+
+
 def test_meeting_participant_detail(app, user):
     MEDIA_ENABLED = {'media_participant_enabled': True}
     category = MeetingCategoryFactory(meeting__settings=MEDIA_ENABLED)
@@ -687,6 +749,31 @@ def test_meeting_default_participant_search_multiple_results(app, user,
         assert len(data) == 4
 
 
+def test_search_for_participant(app):
+    category = MeetingCategoryFactory(title__english='Observer')
+    meeting = category.meeting
+    jane = ParticipantFactory(category=category, first_name='Jane',
+                              last_name='Smith', represented_region='Europe')
+    john = ParticipantFactory(category=category, first_name='John',
+                              last_name='Brown', represented_region='Africa')
+    other = ParticipantFactory(
+        category=MeetingCategoryFactory(meeting=meeting),
+        first_name='Mary', last_name='Jones', represented_region='Asia')
+
+    def search(term):
+        return set(search_for_participant(term, ranked=True))
+
+    with app.test_request_context():
+        g.meeting = meeting
+        assert search('smi') == {jane}
+        assert search('JANE SMITH') == {jane}
+        assert search(' brown ') == {john}
+        assert search('europe') == {jane}
+        assert search('observ') == {jane, john}
+        assert search(other.id) == {other}
+        assert search('nobody') == set()
+
+
 def test_meeting_participant_detail_custom_fields_grouping(app, user):
     category = MeetingCategoryFactory()
     meeting = category.meeting
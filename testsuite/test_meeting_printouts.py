@@ -1,10 +1,29 @@
-from flask import url_for
+from StringIO import StringIO
+
+import openpyxl
+import pytest
+
+from flask import g, render_template, url_for
+from PyPDF2 import PdfFileReader, PdfFileWriter
 from pyquery import PyQuery
-from mrt.utils import slugify
+from mrt.forms.meetings import add_custom_fields_for_meeting
+from mrt.forms.meetings import ParticipantRenderer
+from mrt.meetings import printouts
+from contrib.cites_extra_views import printouts as cites_printouts
+from mrt.meetings.printouts import _process_export_participants_excel
+from mrt.meetings.printouts import _process_import_participants_excel
+from mrt.meetings.printouts import DataImport
+from mrt.forms.meetings import ParticipantEditForm
+from mrt.custom_country import Country
+from mrt.models import db, CustomField, CustomFieldChoice, Participant
+from mrt.models import ParticipantRecords, Translation
+from mrt.utils import slugify, get_xlsx_header, ImportFile
 from .utils import add_new_meeting
+from .benchmarks.generator import MeetingGenerator
 
 from .factories import ParticipantFactory, MeetingCategoryFactory
 from .factories import EventFactory, EventValueFactory
+from .factories import CustomFieldFactory, CustomFieldValueFactory
 
 
 def test_shortlist_printout(app, user):
@@ -190,3 +209,327 @@ def test_distribution_of_documents_printout(app, user):
                 assert slugify(category.title.english) in category_ids
 
             assert len(category_ids) is len(categories)
+
+
+def test_export_participants_excel(app, user):
+    cat = MeetingCategoryFactory()
+    meeting = cat.meeting
+    participants = ParticipantFactory.create_batch(3, meeting=meeting,
+                                                   category=cat)
+    with app.test_request_context():
+        add_custom_fields_for_meeting(meeting)
+        notes = CustomFieldFactory(meeting=meeting, label__english='notes',
+                                   field_type=CustomField.TEXT,
+                                   required=False)
+        CustomFieldValueFactory(participant=participants[0],
+                                custom_field=notes, value='first notes')
+        _process_export_participants_excel(meeting.id,
+                                           Participant.PARTICIPANT)
+
+    filename = 'participant_list_%s.xlsx' % meeting.acronym
+    workbook = openpyxl.load_workbook(
+        app.config['UPLOADED_PRINTOUTS_DEST'] / filename)
+    rows = list(workbook.active.values)
+    header = rows[0]
+    assert len(rows) == 4
+    assert header[-1] == 'Date of Registration'
+    assert rows[3][header.index('notes')] == 'first notes'
+    assert rows[1][header.index('notes')] is None
+    category_column = header.index('Category [required]')
+    assert [row[category_column] for row in rows[1:]] == [
+        cat.title.english] * 3
+
+
+def test_participant_records(app, user):
+    cat = MeetingCategoryFactory(sort=1)
+    other_cat = MeetingCategoryFactory(meeting=cat.meeting, sort=2)
+    meeting = cat.meeting
+    first, second = ParticipantFactory.create_batch(
+        2, meeting=meeting, category=cat)
+    third = ParticipantFactory(meeting=meeting, category=other_cat,
+                               attended=True)
+    with app.test_request_context():
+        notes = CustomFieldFactory(meeting=meeting, label__english='notes',
+                                   field_type=CustomField.TEXT)
+        nationality = CustomFieldFactory(meeting=meeting,
+                                         label__english='nationality',
+                                         field_type=CustomField.COUNTRY)
+        topics = CustomFieldFactory(meeting=meeting, label__english='topics',
+                                    field_type=CustomField.MULTI_CHECKBOX)
+        choices = []
+        for label in ('Trade', 'Fauna'):
+            choice = CustomFieldChoice(custom_field=topics,
+                                       value=Translation(english=label))
+            db.session.add(choice)
+            choices.append(choice)
+        db.session.flush()
+        CustomFieldValueFactory(participant=first, custom_field=notes,
+                                value='first notes')
+        CustomFieldValueFactory(participant=first, custom_field=nationality,
+                                value='RO')
+        for choice in choices:
+            CustomFieldValueFactory(participant=first, custom_field=topics,
+                                    choice=choice, value=None)
+
+        records = ParticipantRecords(meeting)
+        assert records.count() == 3
+        by_id = dict((record.id, record) for record in records)
+        record = by_id[first.id]
+        assert record.first_name == first.first_name
+        assert record.category.id == cat.id
+        assert record.notes == 'first notes'
+        assert isinstance(record.nationality, Country)
+        assert record.nationality.code == 'RO'
+        assert record.topics == ['Trade', 'Fauna']
+        assert by_id[second.id].notes is None
+        assert by_id[second.id].topics == []
+
+        records = ParticipantRecords(meeting, field_slugs=['notes'])
+        record = [r for r in records if r.id == first.id][0]
+        assert record.notes == 'first notes'
+        assert not hasattr(record, 'topics')
+
+        assert [r.id for r in ParticipantRecords(meeting, flag='attended')] \
+            == [third.id]
+        assert [r.id for r in ParticipantRecords(
+            meeting, category_ids=[other_cat.id])] == [third.id]
+        pagination = ParticipantRecords(meeting).paginate(2, per_page=2)
+        assert pagination.total == 3
+        assert [r.id for r in pagination.items] == [third.id]
+
+
+def test_provisional_list_printout(app, user):
+    cat = MeetingCategoryFactory(sort=1)
+    meeting = cat.meeting
+    ParticipantFactory.create_batch(3, meeting=meeting, category=cat)
+    ParticipantFactory(meeting=meeting, category=cat, attended=True,
+                       first_name='Jane')
+    client = app.test_client()
+    with app.test_request_context():
+        add_custom_fields_for_meeting(meeting)
+        with client.session_transaction() as sess:
+            sess['user_id'] = user.id
+
+        resp = client.get(url_for('meetings.printouts_provisional_list',
+                                  meeting_id=meeting.id))
+        assert resp.status_code == 200
+        html = PyQuery(resp.data)
+        assert len(html('.provisional-table tbody tr')) == 4
+
+        resp = client.get(url_for('meetings.printouts_provisional_list',
+                                  meeting_id=meeting.id, flag='attended'))
+        assert resp.status_code == 200
+        html = PyQuery(resp.data)
+        rows = html('.provisional-table tbody tr')
+        assert len(rows) == 1
+        assert 'Jane' in rows.text()
+
+
+def test_aewa_provisional_list_template(app, user):
+    cat = MeetingCategoryFactory(sort=1)
+    meeting = cat.meeting
+    ParticipantFactory(meeting=meeting, category=cat, first_name='Jane')
+    with app.test_request_context():
+        g.meeting = meeting
+        add_custom_fields_for_meeting(meeting)
+        field_ids = printouts.ProvisionalList._get_default_field_ids()
+        grouped_participants, count = (
+            printouts.ProvisionalList.get_participants(
+                selected_field_ids=field_ids, page=0, page_size=0))
+        html = render_template(
+            'printouts_aewa/_provisional_list_pdf.html',
+            grouped_participants=grouped_participants, count=count,
+            title='Provisional list', selected_field_ids=field_ids)
+        assert count == 1
+        assert 'Jane' in PyQuery(html)('.custom-fields-table').text()
+
+
+def test_cites_printouts_records(app, user):
+    cat = MeetingCategoryFactory(sort=1)
+    meeting = cat.meeting
+    participant = ParticipantFactory(meeting=meeting, category=cat,
+                                     attended=True, representing='Romania')
+    ParticipantFactory(meeting=meeting, category=cat)
+    event = EventFactory(meeting=meeting, label__english='Side event')
+    EventValueFactory(participant=participant, custom_field=event)
+    mobile = CustomFieldFactory(meeting=meeting, label__english='mobile',
+                                field_type=CustomField.TEXT, required=False)
+    CustomFieldValueFactory(participant=participant, custom_field=mobile,
+                            value='0740 000 000')
+    with app.test_request_context():
+        g.meeting = meeting
+        participants = cites_printouts.VerificationList._get_query([]).all()
+        assert [p.id for p in participants] == [participant.id]
+        html = render_template('printouts/_verification_table_pdf.html',
+                               participants=participants, count=1,
+                               title='Verification')
+        assert 'M: 0740 000 000' in PyQuery(html).text()
+
+        events = cites_printouts._get_events()
+        participants = cites_printouts.ObserversList._get_query(
+            None, [], [], events).all()
+        assert len(participants) == 2
+        attended = dict((p.id, p.attended_event(event.id))
+                        for p in participants)
+        assert attended[participant.id]
+        assert sum(attended.values()) == 1
+
+
+def test_participant_renderer(app, user):
+    cat = MeetingCategoryFactory(title__english='Observer')
+    meeting = cat.meeting
+    participant = ParticipantFactory(meeting=meeting, category=cat,
+                                     represented_country='RO')
+    with app.test_request_context():
+        add_custom_fields_for_meeting(meeting)
+        topics = CustomFieldFactory(meeting=meeting, label__english='topics',
+                                    field_type=CustomField.MULTI_CHECKBOX)
+        for label in ('Trade', 'Fauna'):
+            choice = CustomFieldChoice(custom_field=topics,
+                                       value=Translation(english=label))
+            CustomFieldValueFactory(participant=participant,
+                                    custom_field=topics, choice=choice,
+                                    value=None)
+
+        record, = ParticipantRecords(meeting)
+        with pytest.raises(AttributeError):
+            record.first_name = 'Jane'
+
+        renderer = ParticipantRenderer(meeting)
+        fields = renderer.fields(record, ['title', 'category_id',
+                                          'represented_country',
+                                          'represented_region', 'topics',
+                                          'missing'])
+        assert [f.id for f in fields] == ['title', 'category_id',
+                                          'represented_country',
+                                          'represented_region', 'topics']
+        values = dict((f.id, f.value) for f in fields)
+        assert values['title'] == 'Mr'
+        assert values['category_id'].id == cat.id
+        assert values['represented_country'] == 'Romania'
+        assert values['represented_region'] == 'Asia'
+        assert values['topics'] == 'Trade<br>Fauna'
+        assert dict((f.id, f.label) for f in fields)['topics'] == 'topics'
+
+
+def test_process_badges_in_chunks(app, user, brand_dir, monkeypatch):
+    cat = MeetingCategoryFactory()
+    ParticipantFactory.create_batch(5, meeting=cat.meeting, category=cat)
+
+    class FakeEngine(object):
+        def render(self, jobs, on_done=None):
+            for job in jobs:
+                writer = PdfFileWriter()
+                writer.addBlankPage(100, 100)
+                with open(job.pdf_path, 'wb') as f:
+                    writer.write(f)
+                on_done(job)
+
+    progress = []
+    monkeypatch.setattr(printouts, 'get_pdf_engine',
+                        lambda *args: FakeEngine())
+    monkeypatch.setattr(printouts, '_set_job_progress', progress.append)
+    app.config['BADGES_CHUNK_SIZE'] = 2
+    with app.test_request_context():
+        url = printouts._process_badges(cat.meeting.id, None, None, [])
+
+    pdf_path = app.config['UPLOADED_PRINTOUTS_DEST'] / url.split('/')[-1]
+    assert PdfFileReader(open(pdf_path, 'rb')).getNumPages() == 3
+    assert progress == [33, 66, 100]
+    assert len(app.config['UPLOADED_PRINTOUTS_DEST'].files('*.pdf')) == 1
+
+
+def _write_import_file(meeting, fields, rows):
+    import_file = ImportFile('import')
+    columns = [field.slug for field in fields]
+    import_file.write(columns, (
+        (i + 2, [row.get(slug, '') for slug in columns], {})
+        for i, row in enumerate(rows)), meeting.id, Participant.PARTICIPANT)
+    return import_file.name
+
+
+def test_import_participants_excel(app):
+    with app.test_request_context():
+        generator = MeetingGenerator(participants=0, categories=2, rules=0)
+        meeting = generator.generate()
+        fields, rows = generator.excel_rows(meeting, 5)
+        _process_import_participants_excel(
+            meeting.id, _write_import_file(meeting, fields, rows),
+            Participant.PARTICIPANT, ParticipantEditForm)
+
+        participants = Participant.query.filter_by(meeting=meeting).all()
+        assert sorted(p.email for p in participants) == sorted(
+            row['email'] for row in rows)
+        assert not ImportFile('import').exists()
+        multi_field = meeting.custom_fields.filter_by(
+            field_type=CustomField.MULTI_CHECKBOX).one()
+        assert multi_field.custom_field_values.count() == 5 * 2
+        text_field = meeting.custom_fields.filter_by(
+            field_type=CustomField.TEXT, is_primary=False).one()
+        assert sorted(v.value for v in text_field.custom_field_values) == \
+            sorted(row[text_field.slug] for row in rows)
+
+
+def test_import_participants_excel_reports_rows(app):
+    with app.test_request_context():
+        generator = MeetingGenerator(participants=0, categories=2, rules=0)
+        meeting = generator.generate()
+        fields, rows = generator.excel_rows(meeting, 3)
+        rows[1]['email'] = 'not an email'
+        with pytest.raises(AssertionError) as excinfo:
+            _process_import_participants_excel(
+                meeting.id, _write_import_file(meeting, fields, rows),
+                Participant.PARTICIPANT, ParticipantEditForm)
+        assert 'Row 3: email' in str(excinfo.value)
+        assert Participant.query.filter_by(meeting=meeting).count() == 0
+
+
+def test_import_participants_upload_preview(app, user):
+    with app.test_request_context():
+        generator = MeetingGenerator(participants=0, categories=2, rules=0)
+        meeting = generator.generate()
+        fields, rows = generator.excel_rows(meeting, 60)
+        rows[55]['email'] = 'not an email'
+
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        header = get_xlsx_header(fields)
+        sheet.append(list(header))
+        for row in rows:
+            sheet.append([row[field.slug] for field in header.values()])
+        upload = StringIO()
+        workbook.save(upload)
+        upload.seek(0)
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = user.id
+        url = url_for('meetings.participants_import', meeting_id=meeting.id)
+        resp = client.post(url, data={
+            'import_file': (upload, 'participants.xlsx'),
+            'action': 'upload'})
+        assert resp.status_code == 200
+        html = PyQuery(resp.data)
+        assert len(html('#results-table tbody tr')) == DataImport.PAGE_SIZE
+        file_name = html('input[name=file_name]').val()
+        import_file = ImportFile(file_name)
+        assert import_file.summary == {
+            'rows': 60, 'invalid': 1, 'meeting_id': meeting.id,
+            'participant_type': Participant.PARTICIPANT}
+        assert import_file.xlsx_path.exists()
+
+        resp = client.get(url, query_string={'file_name': file_name,
+                                             'page': 2})
+        html = PyQuery(resp.data)
+        assert len(html('#results-table tbody tr')) == 10
+        assert len(html('#results-table tbody tr.bg-warning')) == 1
+        assert Participant.query.filter_by(meeting=meeting).count() == 0
+
+        other = generator.generate()
+        other_url = url_for('meetings.participants_import',
+                            meeting_id=other.id)
+        resp = client.get(other_url, query_string={'file_name': file_name})
+        assert resp.status_code == 404
+        resp = client.post(other_url, data={'file_name': file_name,
+                                            'action': 'import'})
+        assert resp.status_code == 404
@@ -1,9 +1,13 @@
+import json
+import time
+
 from flask import url_for
 from pyquery import PyQuery
 from StringIO import StringIO
+from sqlalchemy import event
 
-from mrt.forms.meetings import add_custom_fields_for_meeting
-from mrt.models import Rule, Condition, ConditionValue, Action, CustomField
+from mrt.forms.meetings import add_custom_fields_for_meeting, get_rule_set
+from mrt.models import db, Rule, Condition, ConditionValue, Action, CustomField
 from .factories import ConditionValueFactory, ActionFactory, MeetingFactory
 from .factories import CustomFieldFactory, MeetingCategoryFactory
 from .factories import ParticipantFactory
@@ -242,6 +246,83 @@ def test_meeting_rule_disable_form_on_registration(app, user, default_meeting):
         assert meeting.participants.count() == 0
 
 
+def test_meeting_rule_rendered_on_registration_form(app, user,
+                                                    default_meeting):
+    category = MeetingCategoryFactory(meeting__online_registration=True)
+    meeting = category.meeting
+
+    client = app.test_client()
+    with app.test_request_context():
+        add_custom_fields_for_meeting(meeting)
+        fields = meeting.custom_fields
+        cond_field = fields.filter_by(slug='category_id').one()
+        action_field = fields.filter_by(slug='represented_organization').one()
+        action_field.visible_on_registration_form = True
+        cond_value = ConditionValueFactory(condition__rule__meeting=meeting,
+                                           condition__field=cond_field,
+                                           value=category.id)
+        ActionFactory(rule=cond_value.condition.rule, field=action_field,
+                      is_visible=True)
+
+        resp = client.get(url_for('meetings.registration',
+                                  meeting_acronym=meeting.acronym))
+        assert resp.status_code == 200
+        html = PyQuery(resp.data)
+        field = html('#represented_organization')
+        assert json.loads(field.attr('data-rules')) == [
+            {'category_id': [str(category.id)]}]
+        assert field.attr('data-visible') == 'true'
+        assert not field.attr('data-disable-form')
+        assert not html('#first_name').attr('data-rules')
+
+
+def test_rule_set_evaluation_benchmark(app, user, default_meeting):
+    category = MeetingCategoryFactory(meeting__online_registration=True)
+    meeting = category.meeting
+
+    with app.test_request_context():
+        add_custom_fields_for_meeting(meeting)
+
+    fields = meeting.custom_fields
+    cond_field = fields.filter_by(slug='category_id').one()
+    country_field = fields.filter_by(slug='country').one()
+    action_field = fields.filter_by(slug='represented_organization').one()
+    cond_value = ConditionValueFactory(condition__rule__meeting=meeting,
+                                       condition__field=cond_field,
+                                       value=category.id)
+    ConditionValueFactory(condition__rule=cond_value.condition.rule,
+                          condition__field=country_field,
+                          value='RO')
+    ActionFactory(rule=cond_value.condition.rule, field=action_field,
+                  is_required=True)
+
+    rule_set = get_rule_set(meeting, Rule.PARTICIPANT)
+    assert get_rule_set(meeting, Rule.PARTICIPANT) is rule_set
+    rules = rule_set.for_fields([f.id for f in fields])
+    assert len(rules) == 1
+
+    rows = [{'category_id': unicode(category.id if i % 2 else -1),
+             'country': u'RO' if i % 5 else u'FR'} for i in range(10000)]
+    queries = []
+
+    def count_queries(*args):
+        queries.append(args)
+
+    engine = db.get_engine()
+    event.listen(engine, 'before_cursor_execute', count_queries)
+    try:
+        start = time.time()
+        matched = sum(1 for row in rows for rule in rules if rule.matches(row))
+        elapsed = time.time() - start
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_queries)
+
+    assert matched == 4000
+    assert queries == []
+    # the rules are evaluated in memory, 10000 rows take a few milliseconds
+    assert elapsed < 1
+
+
 def _create_new_rule(meeting, field_id=0):
     field = CustomFieldFactory(label__english='field' + str(field_id))
     condition_value = ConditionValueFactory(condition__rule__meeting=meeting,
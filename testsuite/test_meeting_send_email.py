@@ -1,13 +1,27 @@
-from flask import url_for
+from flask import g, url_for
 from pyquery import PyQuery
+from pytest import fixture
 
-from mrt.mail import mail
-from mrt.models import MailLog, Participant
+from mrt.mail import mail, _process_bulk_message
+from mrt.models import Job, MailLog, Participant
 from .factories import MeetingCategoryFactory, ParticipantFactory
 from .factories import MailLogFactory
 
 
-def test_send_email_in_english(app, user):
+@fixture
+def mail_queue(monkeypatch):
+    """Run the jobs added to the mail queue right away."""
+    jobs = []
+
+    def _add_to_queue(queue, method, job_name, *args):
+        jobs.append((queue, job_name, args))
+        method(g.meeting.id, *args)
+
+    monkeypatch.setattr('mrt.mail._add_to_queue', _add_to_queue)
+    return jobs
+
+
+def test_send_email_in_english(app, user, mail_queue):
     cat = MeetingCategoryFactory()
     ParticipantFactory.create_batch(5, meeting=cat.meeting)
     ParticipantFactory.create_batch(5, meeting=cat.meeting, language='French')
@@ -28,7 +42,7 @@ def test_send_email_in_english(app, user):
         assert len(outbox) == 5
 
 
-def test_send_email_to_all_participants(app, user):
+def test_send_email_to_all_participants(app, user, mail_queue):
     cat = MeetingCategoryFactory()
     ParticipantFactory.create_batch(5, meeting=cat.meeting)
     ParticipantFactory.create_batch(5, meeting=cat.meeting, language='French')
@@ -49,7 +63,7 @@ def test_send_email_to_all_participants(app, user):
         assert len(outbox) == 10
 
 
-def test_send_email_to_categories(app, user):
+def test_send_email_to_categories(app, user, mail_queue):
     cat_member = MeetingCategoryFactory()
     cat_press = MeetingCategoryFactory(meeting=cat_member.meeting)
     ParticipantFactory.create_batch(7, meeting=cat_member.meeting,
@@ -113,7 +127,7 @@ def test_meeting_bulk_email_recipients(app, user):
         assert len(PyQuery(resp.data)('#recipients tbody tr')) == 4
 
 
-def test_send_bulk_email_logs(app, user):
+def test_send_bulk_email_logs(app, user, mail_queue):
     cat = MeetingCategoryFactory()
     ParticipantFactory.create_batch(5, meeting=cat.meeting)
     ParticipantFactory.create_batch(3, meeting=cat.meeting,
@@ -135,6 +149,8 @@ def test_send_bulk_email_logs(app, user):
         assert resp.status_code == 302
         assert len(outbox) == 5
         assert MailLog.query.filter_by(meeting=cat.meeting).count() == 5
+        assert [job[:2] for job in mail_queue] == [
+            (Job.MAIL_QUEUE, 'bulk email')]
 
         resp = client.get(url_for('meetings.mail_logs',
                                   meeting_id=cat.meeting.id))
@@ -180,3 +196,28 @@ def test_ack_email(app, user):
             'Field cannot be longer than 128 characters.'
         assert len(outbox) == 0
         assert MailLog.query.count() == 0
+
+
+def test_bulk_message_batches(app, monkeypatch):
+    cat = MeetingCategoryFactory()
+    participants = ParticipantFactory.create_batch(5, meeting=cat.meeting)
+    app.config['MAIL_BATCH_SIZE'] = 2
+
+    connections = []
+    connect = mail.connect
+
+    def _connect():
+        connections.append(1)
+        return connect()
+
+    monkeypatch.setattr(mail, 'connect', _connect)
+    with app.test_request_context(), mail.record_messages() as outbox:
+        result = _process_bulk_message(cat.meeting.id,
+                                       [p.id for p in participants],
+                                       'Test subject', 'Test')
+        assert result == 'Sent 5 messages'
+        assert len(outbox) == 5
+        assert len(connections) == 3
+        logs = MailLog.query.filter_by(meeting=cat.meeting).all()
+        assert ({(log.to, log.to_email) for log in logs} ==
+                {(p, p.email) for p in participants})
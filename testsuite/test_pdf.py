@@ -1,9 +1,13 @@
+import os
+import sys
+
 import pytest
 
 from flask import Response
 from flask import g
 
-from mrt.pdf import stream_template
+from mrt.pdf import stream_template, get_pdf_engine, PdfRenderer
+from mrt.pdf import evict_pdf_cache, _clean_printouts
 from .factories import MeetingFactory
 
 
@@ -84,3 +88,140 @@ def test_pdf_renderer_deletes_on_error(app, pdf_renderer, monkeypatch):
 
     assert not (app.config['UPLOADED_PRINTOUTS_DEST'] /
                 renderer.template_path).exists()
+
+
+_FAKE_WKHTMLTOPDF = """#!%s
+import shlex
+import shutil
+import sys
+
+def convert(args):
+    shutil.copy(args[-2], args[-1])
+
+if '--read-args-from-stdin' in sys.argv:
+    if %r:
+        sys.exit(1)
+    for line in sys.stdin:
+        convert(shlex.split(line))
+else:
+    with open(%r, 'a') as f:
+        f.write('x')
+    convert(sys.argv)
+"""
+
+
+@pytest.fixture
+def fake_wkhtmltopdf(tmpdir, monkeypatch):
+    def install(batch_fails=False):
+        calls = tmpdir.join('oneshot_calls')
+        script = tmpdir.join('wkhtmltopdf')
+        script.write(_FAKE_WKHTMLTOPDF % (sys.executable, batch_fails,
+                                          str(calls)))
+        script.chmod(0o755)
+        monkeypatch.setenv('PATH', '%s:%s' % (tmpdir, os.environ['PATH']))
+        return calls
+    return install
+
+
+@pytest.mark.parametrize('engine', ['oneshot', 'batch'])
+def test_pdf_engines_generate_many(app, fake_wkhtmltopdf, engine):
+    calls = fake_wkhtmltopdf()
+    path = app.config['TEMPLATES_PATH'] / 'template.html'
+    with path.open('w+') as f:
+        f.write('{{ number }}')
+
+    with app.test_request_context():
+        renderers = [PdfRenderer('template.html', title='Badge "%d"' % i,
+                                 width='3.4in', height='2.15in',
+                                 context={'number': i}) for i in range(5)]
+        pdf_paths = PdfRenderer.generate_many(
+            renderers, get_pdf_engine(engine, concurrency=2))
+
+    assert [p.text() for p in pdf_paths] == [str(i) for i in range(5)]
+    assert not any(r.template_path.exists() for r in renderers)
+    oneshot_calls = len(calls.read()) if calls.check() else 0
+    assert oneshot_calls == (5 if engine == 'oneshot' else 0)
+
+
+def test_batch_pdf_engine_falls_back_to_oneshot(app, fake_wkhtmltopdf):
+    calls = fake_wkhtmltopdf(batch_fails=True)
+    path = app.config['TEMPLATES_PATH'] / 'template.html'
+    with path.open('w+') as f:
+        f.write('{{ number }}')
+
+    with app.test_request_context():
+        renderers = [PdfRenderer('template.html', width='3.4in',
+                                 height='2.15in', context={'number': i})
+                     for i in range(3)]
+        pdf_paths = PdfRenderer.generate_many(renderers,
+                                              get_pdf_engine('batch', 2))
+
+    assert [p.text() for p in pdf_paths] == ['0', '1', '2']
+    assert len(calls.read()) == 3
+
+
+def test_pdf_renderer_cache(app, pdf_renderer, monkeypatch):
+    generated = []
+    original = pdf_renderer._generate_pdf
+
+    def _generate_pdf(self):
+        generated.append(self.pdf_path)
+        original(self)
+
+    monkeypatch.setattr(pdf_renderer, '_generate_pdf', _generate_pdf)
+    with app.test_request_context():
+        for i in range(2):
+            res = pdf_renderer('template.html', cache=True).as_response()
+            assert ''.join(res.response) == pdf_renderer.content
+        assert len(generated) == 1
+
+        pdf_renderer('template.html', orientation='landscape',
+                     cache=True).as_response()
+        assert len(generated) == 2
+
+    cache_dir = app.config['UPLOADED_PRINTOUTS_DEST'] / 'cache'
+    assert len(cache_dir.files('*.pdf')) == 2
+    assert not app.config['UPLOADED_PRINTOUTS_DEST'].files('*.pdf')
+
+
+def test_pdf_renderer_cache_assets(app, pdf_renderer, monkeypatch):
+    generated = []
+    original = pdf_renderer._generate_pdf
+
+    def _generate_pdf(self):
+        generated.append(self.pdf_path)
+        original(self)
+
+    monkeypatch.setattr(pdf_renderer, '_generate_pdf', _generate_pdf)
+    logo = app.config['UPLOADED_LOGOS_DEST'] / 'meeting_1_logo.png'
+    logo.write_bytes(b'logo')
+    with (app.config['TEMPLATES_PATH'] / 'asset.html').open('w+') as f:
+        f.write('<img src="{{ logo }}">')
+
+    with app.test_request_context():
+        for i in range(2):
+            pdf_renderer('asset.html', context={'logo': logo},
+                         cache=True).as_response()
+        assert len(generated) == 1
+
+        logo.write_bytes(b'new logo')
+        pdf_renderer('asset.html', context={'logo': logo},
+                     cache=True).as_response()
+        assert len(generated) == 2
+
+
+def test_evict_pdf_cache(app):
+    cache_dir = app.config['UPLOADED_PRINTOUTS_DEST'] / 'cache'
+    cache_dir.makedirs_p()
+    for i in range(4):
+        pdf_path = cache_dir / ('%d.pdf' % i)
+        pdf_path.write_bytes(b'x' * 10)
+        pdf_path.utime((1000 + i, 1000 + i))
+
+    with app.test_request_context():
+        assert evict_pdf_cache(max_size=25) == 2
+        assert sorted(f.name for f in cache_dir.files()) == ['2.pdf', '3.pdf']
+
+        app.config['PDF_CACHE_MAX_SIZE'] = 10
+        assert _clean_printouts([]) == 1
+    assert [f.name for f in cache_dir.files()] == ['3.pdf']
@@ -6,7 +6,8 @@ from testsuite.factories import CustomFieldFactory, UserNotificationFactory
 from testsuite.factories import PhraseMeetingFactory, StaffFactory
 from testsuite.utils import add_participant_custom_fields
 
-from mrt.models import Category
+from mrt.models import db, Category, get_user_permissions
+from mrt.profiling import start_profiling, stop_profiling
 from mrt.forms.meetings.meeting import MediaParticipantDummyForm
 
 STATUS_OK = 200
@@ -239,3 +240,33 @@ def test_permissions_meeting_owner(app, url_name, status, default_meeting,
 
 
 # TODO: printouts
+
+
+def test_user_permissions_loaded_once_per_request(app):
+    role_user = RoleUserMeetingFactory(
+        role__permissions=('view_participant', 'manage_participant'))
+    user, meeting = role_user.user, role_user.meeting
+
+    with app.test_request_context():
+        start_profiling()
+        assert user.has_perms(['view_participant'], meeting.id)
+        assert user.has_perms(['manage_participant'], meeting.id)
+        assert not user.has_perms(['manage_meeting'], meeting.id)
+        assert stop_profiling().count == 1
+        assert (get_user_permissions(user.id, meeting.id) ==
+                {'view_participant', 'manage_participant'})
+
+
+def test_user_permissions_follow_role_changes(app):
+    role_user = RoleUserMeetingFactory(role__permissions=('view_participant',))
+    user, meeting = role_user.user, role_user.meeting
+
+    with app.test_request_context():
+        assert not user.has_perms(['manage_meeting'], meeting.id)
+        RoleUserMeetingFactory(user=user, meeting=meeting, staff=user.staff,
+                               role__permissions=('manage_meeting',))
+        assert user.has_perms(['manage_meeting'], meeting.id)
+
+        db.session.delete(role_user)
+        db.session.commit()
+        assert not user.has_perms(['view_participant'], meeting.id)
@@ -0,0 +1,53 @@
+import json
+import logging
+
+from flask import url_for
+
+from mrt.forms.meetings import add_custom_fields_for_meeting
+from mrt.profiling import QueryStats
+
+from .factories import ParticipantFactory
+
+
+def test_profiling_headers_in_debug(app, user):
+    participant = ParticipantFactory()
+    with app.test_request_context():
+        add_custom_fields_for_meeting(participant.meeting)
+        with app.client.session_transaction() as sess:
+            sess['user_id'] = user.id
+        resp = app.client.get(url_for('meetings.participant_detail',
+                                      meeting_id=participant.meeting.id,
+                                      participant_id=participant.id))
+        assert resp.status_code == 200
+        assert int(resp.headers['X-SQL-Queries']) > 0
+        assert float(resp.headers['X-SQL-Time']) >= 0
+        assert 'X-SQL-Repeated' in resp.headers
+
+
+def test_profiling_logs_repeated_statements(app, user, caplog):
+    app.config['SQL_REPEATED_THRESHOLD'] = 1
+    participant = ParticipantFactory()
+    with app.test_request_context():
+        add_custom_fields_for_meeting(participant.meeting)
+        with app.client.session_transaction() as sess:
+            sess['user_id'] = user.id
+        with caplog.at_level(logging.WARNING, logger='mrt.profiling'):
+            app.client.get(url_for('meetings.participant_detail',
+                                   meeting_id=participant.meeting.id,
+                                   participant_id=participant.id))
+    records = [json.loads(r.getMessage()) for r in caplog.records
+               if r.name == 'mrt.profiling']
+    assert records[0]['endpoint'] == 'meetings.participant_detail'
+    assert records[0]['meeting_id'] == participant.meeting.id
+    assert records[0]['top_statements']
+
+
+def test_query_stats_repeated_statements():
+    stats = QueryStats()
+    for i in range(3):
+        stats.add('SELECT * FROM participant WHERE id = ?', 0.01)
+    stats.add('SELECT * FROM meeting WHERE id = ?', 0.5)
+    assert stats.count == 4
+    assert stats.repeated(3) == ['SELECT * FROM participant WHERE id = ?']
+    assert stats.top(1) == [{'statement': 'SELECT * FROM meeting WHERE id = ?',
+                             'count': 1, 'time': 0.5}]
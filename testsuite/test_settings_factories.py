@@ -3,8 +3,10 @@ from py.path import local
 
 from mrt.forms.meetings import custom_object_factory, custom_form_factory
 from mrt.forms.meetings import ParticipantEditForm
-from mrt.models import CustomField
+from mrt.models import db, CustomField, get_custom_field_values
 from .factories import ProfilePictureFactory, CustomFieldFactory
+from .factories import CustomFieldValueFactory, ParticipantFactory
+from .factories import MeetingCategoryFactory, PhraseMeetingFactory
 
 
 def test_custom_object_factory(app):
@@ -23,6 +25,29 @@ def test_custom_object_factory(app):
         assert attr in Obj.__dict__
 
 
+def test_custom_object_factory_with_prefetched_values(app):
+    pic = ProfilePictureFactory()
+    g.meeting = pic.custom_field.meeting
+    text_field = CustomFieldFactory(label__english='notes',
+                                    field_type=CustomField.TEXT,
+                                    meeting=g.meeting)
+    text = CustomFieldValueFactory(participant=pic.participant,
+                                   custom_field=text_field)
+    other = ParticipantFactory(meeting=g.meeting,
+                               category__meeting=g.meeting)
+    CustomFieldValueFactory(participant=other, custom_field=text_field,
+                            value='other text')
+
+    values = get_custom_field_values([pic.participant.id, other.id])
+    assert len(values) == 3
+    Obj = custom_object_factory(pic.participant, values=values)
+    assert Obj.picture == pic.value
+    assert Obj.notes == text.value
+    OtherObj = custom_object_factory(other, values=values)
+    assert OtherObj.picture is None
+    assert OtherObj.notes == 'other text'
+
+
 def test_custom_form_factory(app):
     pic = ProfilePictureFactory()
     upload_dir = local(app.config['UPLOADED_CUSTOM_DEST'])
@@ -35,3 +60,38 @@ def test_custom_form_factory(app):
     with app.test_request_context():
         form = Form(obj=Obj())
         assert pic.custom_field.label.english in form._fields
+
+
+def test_custom_form_factory_is_cached_per_schema_version(app):
+    pic = ProfilePictureFactory()
+    g.meeting = pic.participant.meeting
+    version = g.meeting.form_schema_version
+    Form = custom_form_factory(ParticipantEditForm)
+    assert custom_form_factory(ParticipantEditForm) is Form
+
+    CustomFieldFactory(label__english='notes', field_type=CustomField.TEXT,
+                       meeting=g.meeting)
+    db.session.flush()
+    assert g.meeting.form_schema_version > version
+    NewForm = custom_form_factory(ParticipantEditForm)
+    assert NewForm is not Form
+    with app.test_request_context():
+        assert 'notes' not in Form()._fields
+        assert 'notes' in NewForm()._fields
+
+
+def test_schema_version_bumped_by_form_translations(app):
+    category = MeetingCategoryFactory()
+    meeting = category.meeting
+    phrase = PhraseMeetingFactory(meeting=meeting)
+    db.session.commit()
+    version = meeting.form_schema_version
+
+    phrase.description.english = 'New email body'
+    meeting.title.english = 'New meeting title'
+    db.session.commit()
+    assert meeting.form_schema_version == version
+
+    category.title.english = 'Observer'
+    db.session.commit()
+    assert meeting.form_schema_version == version + 1
@@ -1,5 +1,7 @@
-from mrt.utils import get_translation
-from babel import Locale
+from babel import Locale, support
+from flask_babel import get_translations
+
+from mrt.utils import get_translation, set_language, translate
 
 
 def test_get_translation_for_languages(app):
@@ -18,3 +20,24 @@ def test_get_translation_for_languages(app):
     assert en_translation != fr_translation
     assert en_translation != es_translation
     assert fr_translation != es_translation
+
+
+def test_translations_loaded_once_per_process(app, monkeypatch):
+    loads = []
+    load = support.Translations.load
+
+    def _load(dirname, locales, *args, **kwargs):
+        loads.append(locales)
+        return load(dirname, locales, *args, **kwargs)
+
+    monkeypatch.setattr(support.Translations, 'load', staticmethod(_load))
+    monkeypatch.setattr('mrt.utils._translations', {})
+    monkeypatch.setattr('mrt.utils._translated', {})
+
+    for i in range(3):
+        with app.test_request_context():
+            set_language('french')
+            assert get_translation(Locale('fr')) is get_translations()
+            assert translate('Europe', 'fr') == translate('Europe', 'fr')
+            set_language('english')
+    assert len(loads) == 2